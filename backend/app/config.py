@@ -14,6 +14,22 @@ URL_CONSULTAS = os.path.join(DATA_DIR, 'pessoa_horario.csv') # Dados de consulta
 URL_CADASTROS = os.path.join(DATA_DIR, 'cadastros.csv')
 URL_AGENDAMENTOS_EXAMES = os.path.join(DATA_DIR, 'agendamentos_exames.json') # Horários disponíveis para exames
 URL_EXAMES_AGENDADOS = os.path.join(DATA_DIR, 'exames_agendados.json') # NOVO: Agendamentos de exames concluídos
+URL_LOG_EXAMES_AGENDADOS = os.path.join(DATA_DIR, 'exames_agendados.ndjson') # Log de reservas ainda não compactadas
+URL_MODELOS_AGENDA = os.path.join(DATA_DIR, 'modelos_agenda.json') # Regras recorrentes de horários (consultas e exames)
 
 CABECALHO_CONSULTAS = ['cpf', 'especialidade', 'doutor', 'horario']
-CABECALHO_CADASTROS = ['nome', 'idade', 'sexo', 'cpf', 'telefone', 'email']
\ No newline at end of file
+CABECALHO_CADASTROS = ['nome', 'idade', 'sexo', 'cpf', 'telefone', 'email']
+
+# --- Armazenamento ---
+# 'arquivos' usa os JSON/CSV acima; 'sqlite' usa o banco embutido em URL_SQLITE
+# (importe os dados existentes com: python -m app.storage.migracao)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'arquivos').lower()
+URL_SQLITE = os.getenv('URL_SQLITE', os.path.join(DATA_DIR, 'clinica.db'))
+
+# --- Compactação do log de exames agendados (backend 'arquivos') ---
+COMPACTACAO_INTERVALO_SEGUNDOS = float(os.getenv('COMPACTACAO_INTERVALO_SEGUNDOS', '60'))
+COMPACTACAO_MAX_REGISTROS = int(os.getenv('COMPACTACAO_MAX_REGISTROS', '500'))
+
+# --- Modelos de agenda recorrentes ---
+# Até quantos dias à frente os horários gerados pelos modelos são oferecidos
+HORIZONTE_MODELOS_DIAS = int(os.getenv('HORIZONTE_MODELOS_DIAS', '90'))
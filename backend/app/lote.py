@@ -0,0 +1,73 @@
+# app/lote.py
+"""
+Leitura de corpos de requisição em lote (NDJSON ou CSV), linha a linha, à medida
+que chegam: o corpo nunca é carregado inteiro como texto.
+
+- Content-Type text/csv: a primeira linha é o cabeçalho.
+- Qualquer outro: NDJSON, um objeto JSON por linha.
+Linhas em branco são ignoradas. Cada registro volta com o número da linha
+(contando o cabeçalho, para bater com o editor do usuário) e o erro de leitura, se houver.
+"""
+import csv
+import json
+from collections import Counter
+from collections.abc import AsyncIterator
+from fastapi import Request
+from pydantic import ValidationError
+
+
+async def _linhas(request: Request) -> AsyncIterator[str]:
+    pendente = b''
+    async for pedaco in request.stream():
+        pendente += pedaco
+        *completas, pendente = pendente.split(b'\n')
+        for linha in completas:
+            yield linha.decode('utf-8-sig').rstrip('\r')
+    if pendente:
+        yield pendente.decode('utf-8-sig').rstrip('\r')
+
+
+async def ler_registros(request: Request) -> list[tuple[int, dict | None, str | None]]:
+    """Lista de (número da linha, registro, erro); registro é None quando a linha não pôde ser lida."""
+    eh_csv = request.headers.get('content-type', '').split(';')[0].strip().lower() == 'text/csv'
+    registros, cabecalho, numero = [], None, 0
+    async for linha in _linhas(request):
+        numero += 1
+        if not linha.strip():
+            continue
+        if eh_csv:
+            campos = next(csv.reader([linha]))
+            if cabecalho is None:
+                cabecalho = [campo.strip() for campo in campos]
+                continue
+            if len(campos) != len(cabecalho):
+                registros.append((numero, None, f"Esperados {len(cabecalho)} campos, encontrados {len(campos)}."))
+                continue
+            registros.append((numero, dict(zip(cabecalho, campos)), None))
+        else:
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError as e:
+                registros.append((numero, None, f"JSON inválido: {e.msg}"))
+                continue
+            if not isinstance(registro, dict):
+                registros.append((numero, None, "Cada linha deve ser um objeto JSON."))
+                continue
+            registros.append((numero, registro, None))
+    return registros
+
+
+def descrever_erro(erro: Exception) -> str:
+    """Mensagem curta de uma linha para o relatório (os erros do pydantic viram 'campo: motivo')."""
+    if isinstance(erro, ValidationError):
+        return '; '.join(f"{'.'.join(map(str, e['loc'])) or 'linha'}: {e['msg']}" for e in erro.errors())
+    return str(erro)
+
+
+def relatorio(resultados: list[dict], omitir: str | None = None) -> dict:
+    """
+    Resumo do lote: total, contagem por status e o resultado de cada linha ({'linha', 'status', 'detalhe'?}).
+    Linhas com o status `omitir` (ex.: as aceitas) ficam só na contagem, para um relatório compacto.
+    """
+    return {'total': len(resultados), 'por_status': dict(Counter(r['status'] for r in resultados)),
+            'resultados': [r for r in resultados if r['status'] != omitir] if omitir else resultados}
@@ -0,0 +1,130 @@
+# app/prompts/registro.py
+"""
+Registro dos prompts com metadados, versão compacta e contagem de tokens.
+
+Os textos em prompts_cadastro.py têm banners (`####`, `# ----`) e comentários
+explicando cada seção para quem lê o código; nada disso ajuda o modelo, mas é
+cobrado e aumenta a latência. `renderizar` usa, por padrão, a versão compacta,
+sem esses comentários.
+
+Relatório de tamanho e uso de cada prompt (rodar dentro de backend/):
+    python -m app.prompts.registro [--metricas ../frontend/metricas_prompts.json]
+"""
+import argparse
+import json
+import math
+import os
+import re
+import string
+from dataclasses import dataclass, field
+from app.prompts.prompts_cadastro import prompt1, prompt2, prompt3, prompt4, prompt5, prompt6, prompt7
+
+_RE_BANNER = re.compile(r'^#[#\-=\s]*$')  # linhas só de '#', '-' ou '='
+_RE_COMENTARIO = re.compile(r'^# .*[a-zà-ÿ]')  # '# frase explicativa' (os títulos de seção são em maiúsculas)
+
+
+def compactar(texto: str) -> str:
+    """Remove banners e comentários de uma linha; mantém títulos de seção, exemplos e o conteúdo."""
+    linhas = []
+    for linha in texto.strip().splitlines():
+        linha = linha.rstrip()
+        if _RE_BANNER.match(linha) or _RE_COMENTARIO.match(linha):
+            continue
+        if not linha and (not linhas or not linhas[-1]):
+            continue  # uma linha em branco basta
+        linhas.append(linha)
+    return '\n'.join(linhas) + '\n'
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa local (~4 caracteres por token); a contagem exata vem do usage_metadata do Gemini."""
+    return math.ceil(len(texto) / 4)
+
+
+@dataclass
+class Prompt:
+    id: str
+    texto: str
+    descricao: str
+    em_uso: bool = True
+    compacto: str = field(init=False)
+    campos: list[str] = field(init=False)
+
+    def __post_init__(self):
+        self.compacto = compactar(self.texto)
+        self.campos = sorted({nome for _, nome, _, _ in string.Formatter().parse(self.texto) if nome})
+
+
+class RegistroPrompts:
+    def __init__(self):
+        self._prompts: dict[str, Prompt] = {}
+        self.renderizacoes: dict[str, int] = {}
+        self.tokens_renderizados: dict[str, int] = {}  # estimativa, somada a cada renderização
+
+    def registrar(self, prompt_id: str, texto: str, descricao: str, em_uso: bool = True):
+        self._prompts[prompt_id] = Prompt(prompt_id, texto, descricao, em_uso)
+
+    def __getitem__(self, prompt_id: str) -> Prompt:
+        return self._prompts[prompt_id]
+
+    def __iter__(self):
+        return iter(self._prompts.values())
+
+    def renderizar(self, prompt_id: str, compacto: bool = True, **campos) -> str:
+        """Prompt preenchido com `campos`. KeyError se o id não existir ou faltar algum campo."""
+        prompt = self._prompts[prompt_id]
+        texto = (prompt.compacto if compacto else prompt.texto).format(**campos)
+        self.renderizacoes[prompt_id] = self.renderizacoes.get(prompt_id, 0) + 1
+        self.tokens_renderizados[prompt_id] = self.tokens_renderizados.get(prompt_id, 0) + estimar_tokens(texto)
+        return texto
+
+
+registro = RegistroPrompts()
+registro.registrar('prompt1', prompt1, "Extração dos dados de cadastro (substituído pelo prompt7 no bot).", em_uso=False)
+registro.registrar('prompt2', prompt2, "Mensagem de sucesso personalizada.", em_uso=False)
+registro.registrar('prompt3', prompt3, "Tradução de erro técnico da API para o usuário.", em_uso=False)
+registro.registrar('prompt4', prompt4, "Extração de CPF (substituído pelo prompt7 no bot).", em_uso=False)
+registro.registrar('prompt5', prompt5, "Resposta amigável por situação.")
+registro.registrar('prompt6', prompt6, "Extração de data (substituído pelo prompt7 no bot).", em_uso=False)
+registro.registrar('prompt7', prompt7, "Intenção + CPF + data + cadastro numa chamada, em JSON.")
+
+
+def acumular_metricas(caminho: str, por_prompt: dict[str, dict]):
+    """Soma as métricas por prompt desta execução às já gravadas em `caminho` (JSON)."""
+    acumulado = {}
+    if os.path.exists(caminho):
+        with open(caminho, 'r', encoding='utf-8') as f:
+            acumulado = json.load(f)
+    for prompt_id, metricas in por_prompt.items():
+        atual = acumulado.setdefault(prompt_id, {})
+        for nome, valor in metricas.items():
+            atual[nome] = atual.get(nome, 0) + valor
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(acumulado, f, ensure_ascii=False, indent=2)
+
+
+def relatorio(metricas: dict[str, dict] | None = None) -> str:
+    """Tabela com tamanho (completo e compacto) de cada prompt e, se houver métricas gravadas, o uso."""
+    metricas = metricas or {}
+    linhas = [f"{'prompt':<10}{'em uso':<8}{'chars':>8}{'compacto':>10}{'tokens~':>9}{'chamadas':>10}"
+              f"{'tokens ent. méd.':>18}{'latência méd.':>15}"]
+    for prompt in sorted(registro, key=lambda p: p.id):
+        uso = metricas.get(prompt.id, {})
+        chamadas = uso.get('chamadas', 0)
+        media_tokens = f"{uso.get('tokens_entrada', 0) / chamadas:.0f}" if chamadas else '-'
+        media_latencia = f"{uso.get('latencia_total', 0) / chamadas:.2f}s" if chamadas else '-'
+        linhas.append(f"{prompt.id:<10}{'sim' if prompt.em_uso else 'não':<8}{len(prompt.texto):>8}"
+                      f"{len(prompt.compacto):>10}{estimar_tokens(prompt.compacto):>9}{chamadas:>10}"
+                      f"{media_tokens:>18}{media_latencia:>15}")
+    return '\n'.join(linhas)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tamanho e uso de cada prompt.")
+    parser.add_argument('--metricas', help="JSON gravado pelo bot ao encerrar (LLM_METRICAS_ARQUIVO).")
+    args = parser.parse_args()
+    metricas = None
+    if args.metricas and os.path.exists(args.metricas):
+        with open(args.metricas, 'r', encoding='utf-8') as f:
+            metricas = json.load(f)
+    print(relatorio(metricas))
@@ -1,30 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date, datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from app.lote import ler_registros
 from app.services.agenda_service import AgendaService, get_agenda_service
-from app.schemas import HorarioPostPayload, HorarioDeletePayload
+from app.schemas import HorarioPostPayload, HorarioDeletePayload, ModeloAgendaPayload, ModeloAgendaDeletePayload
+from app.versoes import CACHE_CATALOGO, CACHE_DISPONIBILIDADE, resposta_condicional
 
 router = APIRouter(prefix="/agendas", tags=["Gerenciamento de Agenda"])
 
 @router.get("/especialidades", response_model=list[str], summary="Lista todas as especialidades disponíveis")
-def obter_especialidades(service: AgendaService = Depends(get_agenda_service)):
-    return service.listar_especialidades()
+def obter_especialidades(request: Request, service: AgendaService = Depends(get_agenda_service)):
+    return resposta_condicional(request, service.etag_especialidades(), CACHE_CATALOGO, service.listar_especialidades)
 
 @router.get("/{especialidade}")
-def listar_horarios(especialidade: str, service: AgendaService = Depends(get_agenda_service)):
-    horarios = service.listar_por_especialidade(especialidade)
-    if horarios is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Especialidade não encontrada.")
-    return horarios
+def listar_horarios(
+    request: Request,
+    especialidade: str,
+    data: date | None = Query(None, description="Somente os horários deste dia (AAAA-MM-DD)."),
+    de: datetime | None = Query(None, description="Início do intervalo (inclusivo)."),
+    ate: datetime | None = Query(None, description="Fim do intervalo (inclusivo)."),
+    medico: str | None = Query(None, description="Somente os horários deste médico."),
+    limit: int | None = Query(None, ge=1, description="Máximo de horários por médico."),
+    service: AgendaService = Depends(get_agenda_service),
+):
+    """Com If-None-Match igual ao ETag atual, responde 304 sem montar a lista."""
+    def gerar():
+        horarios = service.listar_por_especialidade(especialidade, data=data, de=de, ate=ate, medico=medico, limite=limit)
+        if horarios is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Especialidade não encontrada.")
+        return horarios
+    return resposta_condicional(request, service.etag_horarios(especialidade), CACHE_DISPONIBILIDADE, gerar)
 
 @router.post("/horarios", status_code=status.HTTP_201_CREATED)
 def adicionar_horarios(payload: HorarioPostPayload, service: AgendaService = Depends(get_agenda_service)):
-    sucesso = service.adicionar_horario(payload)
+    try:
+        sucesso = service.adicionar_horario(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     if not sucesso:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Horário já existe.")
     return {"detail": "Horário adicionado com sucesso."}
 
+@router.post("/horarios/bulk", summary="Adiciona horários em lote (NDJSON ou CSV no corpo)")
+async def adicionar_horarios_em_lote(request: Request, service: AgendaService = Depends(get_agenda_service)):
+    """
+    Corpo em NDJSON (um {"especialidade", "medico", "horario"} por linha) ou, com
+    Content-Type text/csv, CSV com cabeçalho especialidade,medico,horario. O corpo é lido
+    à medida que chega e tudo é gravado de uma vez. Devolve o resultado de cada linha.
+    """
+    registros = await ler_registros(request)
+    return await run_in_threadpool(service.adicionar_horarios_em_lote, registros)
+
 @router.delete("/horarios")
 def deletar_horario_medico(payload: HorarioDeletePayload, service: AgendaService = Depends(get_agenda_service)):
-    sucesso = service.remover_horario_agendado(payload)
+    try:
+        sucesso = service.remover_horario_agendado(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     if not sucesso:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Especialidade ou médico não encontrado.")
     return {"detail": "Operação de deleção concluída."}
+
+@router.put("/modelos", summary="Cria ou substitui o modelo recorrente de horários de um médico")
+def definir_modelo_medico(payload: ModeloAgendaPayload, service: AgendaService = Depends(get_agenda_service)):
+    """
+    Regras por dia da semana (início, fim, duração do horário) e exceções (datas sem
+    atendimento ou horários bloqueados). Os horários são gerados na consulta, sem
+    precisar cadastrar um por um em /agendas/horarios.
+    """
+    try:
+        service.definir_modelo(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"detail": "Modelo de agenda salvo com sucesso."}
+
+@router.delete("/modelos")
+def deletar_modelo_medico(payload: ModeloAgendaDeletePayload, service: AgendaService = Depends(get_agenda_service)):
+    if not service.remover_modelo(payload):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Modelo de agenda não encontrado.")
+    return {"detail": "Modelo de agenda removido."}
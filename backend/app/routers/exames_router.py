@@ -1,30 +1,46 @@
 # app/routers/exames_router.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date, datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from app.lote import ler_registros
 from app.services.exames_service import ExamesService, get_exames_service
-from app.schemas import AgendarExamePayload # Importa o novo schema
+from app.schemas import AgendarExamePayload, ModeloExamePayload, ModeloExameDeletePayload
+from app.versoes import CACHE_CATALOGO, CACHE_DISPONIBILIDADE, resposta_condicional
 
 router = APIRouter(prefix="/exames", tags=["Gerenciamento de Exames"])
 
 @router.get("/tipos", response_model=list[str], summary="Lista todos os tipos de exames disponíveis")
-def obter_tipos_exames(service: ExamesService = Depends(get_exames_service)):
+def obter_tipos_exames(request: Request, service: ExamesService = Depends(get_exames_service)):
     """
     Retorna uma lista com todos os tipos de exames disponíveis no sistema.
     """
-    return service.listar_tipos_exames()
+    return resposta_condicional(request, service.etag_tipos_exames(), CACHE_CATALOGO, service.listar_tipos_exames)
 
 @router.get("/{tipo_exame}", summary="Lista horários disponíveis para um tipo de exame por local")
-def listar_horarios_exame(tipo_exame: str, service: ExamesService = Depends(get_exames_service)):
+def listar_horarios_exame(
+    request: Request,
+    tipo_exame: str,
+    data: date | None = Query(None, description="Somente os horários deste dia (AAAA-MM-DD)."),
+    de: datetime | None = Query(None, description="Início do intervalo (inclusivo)."),
+    ate: datetime | None = Query(None, description="Fim do intervalo (inclusivo)."),
+    local: str | None = Query(None, description="Somente os horários deste local."),
+    limit: int | None = Query(None, ge=1, description="Máximo de horários por local."),
+    service: ExamesService = Depends(get_exames_service),
+):
     """
     Retorna os horários disponíveis para um tipo de exame específico, agrupados por local.
-    Exclui horários que já passaram.
+    Exclui horários que já passaram. Os filtros opcionais restringem o resultado a um dia,
+    intervalo ou local. Com If-None-Match igual ao ETag atual, responde 304 sem montar a lista.
     """
-    horarios = service.listar_horarios_exame_por_local(tipo_exame)
-    if horarios is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Tipo de exame '{tipo_exame}' não encontrado ou sem horários disponíveis."
-        )
-    return horarios
+    def gerar():
+        horarios = service.listar_horarios_exame_por_local(tipo_exame, data=data, de=de, ate=ate, local=local, limite=limit)
+        if horarios is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Tipo de exame '{tipo_exame}' não encontrado ou sem horários disponíveis."
+            )
+        return horarios
+    return resposta_condicional(request, service.etag_horarios(tipo_exame), CACHE_DISPONIBILIDADE, gerar)
 
 @router.post("/agendar", status_code=status.HTTP_201_CREATED, summary="Agenda um novo exame")
 def agendar_exame(payload: AgendarExamePayload, service: ExamesService = Depends(get_exames_service)):
@@ -36,6 +52,34 @@ def agendar_exame(payload: AgendarExamePayload, service: ExamesService = Depends
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Não foi possível agendar o exame.")
     return {"detail": "Exame agendado com sucesso."}
 
+@router.post("/horarios/bulk", summary="Adiciona horários de exame em lote (NDJSON ou CSV no corpo)")
+async def adicionar_horarios_exame_em_lote(request: Request, service: ExamesService = Depends(get_exames_service)):
+    """
+    Corpo em NDJSON (um {"tipo_exame", "local_exame", "data_hora"} por linha) ou, com
+    Content-Type text/csv, CSV com cabeçalho tipo_exame,local_exame,data_hora. Tudo é
+    gravado de uma vez; devolve o resultado de cada linha.
+    """
+    registros = await ler_registros(request)
+    return await run_in_threadpool(service.adicionar_horarios_em_lote, registros)
+
+@router.put("/modelos", summary="Cria ou substitui o modelo recorrente de horários de um local de exame")
+def definir_modelo_exame(payload: ModeloExamePayload, service: ExamesService = Depends(get_exames_service)):
+    """
+    Regras por dia da semana e exceções para um tipo de exame em um local; os horários
+    são gerados na consulta.
+    """
+    try:
+        service.definir_modelo(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"detail": "Modelo de agenda do exame salvo com sucesso."}
+
+@router.delete("/modelos", summary="Remove o modelo recorrente de um local de exame")
+def deletar_modelo_exame(payload: ModeloExameDeletePayload, service: ExamesService = Depends(get_exames_service)):
+    if not service.remover_modelo(payload):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Modelo de agenda não encontrado.")
+    return {"detail": "Modelo de agenda do exame removido."}
+
 @router.get("/{cpf}/exames_agendados", summary="Lista exames agendados para um CPF específico")
 def listar_exames_agendados(cpf: str, service: ExamesService = Depends(get_exames_service)):
     """
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from app.lote import ler_registros
 from app.services.pessoas_service import PessoasService, get_pessoas_service
-from app.schemas import CadastroPessoaPayload, ConsultaPayload
+from app.schemas import CadastroPessoaPayload, ConsultaPayload, ResumoPessoaPayload
 
 router = APIRouter(tags=["Pessoas e Consultas"])
 
@@ -19,6 +21,21 @@ def obter_consultas_por_cpf(cpf: str, service: PessoasService = Depends(get_pess
     consultas = service.buscar_consultas_por_cpf(cpf)
     return consultas
 
+@router.get("/pessoas/{cpf}/resumo", response_model=ResumoPessoaPayload,
+            summary="Cadastro, próximas consultas e próximos exames de um CPF")
+def obter_resumo_por_cpf(cpf: str, service: PessoasService = Depends(get_pessoas_service)):
+    """
+    Tudo o que a tela "Meus Agendamentos" mostra, numa só chamada: o cadastro e as
+    consultas e exames a partir de agora, cada lista ordenada por data.
+    """
+    resumo = service.resumo(cpf)
+    if resumo is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Pessoa com CPF '{cpf}' não encontrada."
+        )
+    return resumo
+
 @router.post("/pessoas/cadastro", status_code=status.HTTP_201_CREATED)
 def cadastrar_pessoa(payload: CadastroPessoaPayload, service: PessoasService = Depends(get_pessoas_service)):
     sucesso = service.cadastrar(payload)
@@ -26,6 +43,16 @@ def cadastrar_pessoa(payload: CadastroPessoaPayload, service: PessoasService = D
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="CPF já cadastrado.")
     return {"detail": "Pessoa cadastrada com sucesso."}
 
+@router.post("/pessoas/bulk", summary="Importa cadastros em lote (NDJSON ou CSV no corpo)")
+async def cadastrar_pessoas_em_lote(request: Request, service: PessoasService = Depends(get_pessoas_service)):
+    """
+    Uma pessoa por linha, em NDJSON ou (Content-Type text/csv) CSV com o cabeçalho de
+    cadastros.csv: nome,idade,sexo,cpf,telefone,email. Devolve a contagem de aceitas e
+    rejeitadas e o motivo de cada rejeição.
+    """
+    registros = await ler_registros(request)
+    return await run_in_threadpool(service.cadastrar_em_lote, registros)
+
 @router.delete("/{cpf}")
 def deletar_pessoa(cpf: str, service: PessoasService = Depends(get_pessoas_service)):
     sucesso = service.deletar_por_cpf(cpf)
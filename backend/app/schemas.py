@@ -1,7 +1,7 @@
 
 # app/schemas.py
 
-from datetime import datetime as DatetimeClass, datetime 
+from datetime import date, datetime as DatetimeClass, datetime 
 
 from pydantic import BaseModel
 from typing import Optional
@@ -11,6 +11,11 @@ class HorarioPostPayload(BaseModel):
     medico: str
     horario: str
 
+class HorarioExamePostPayload(BaseModel):
+    tipo_exame: str
+    local_exame: str
+    data_hora: str
+
 class HorarioDeletePayload(BaseModel):
     especialidade: str
     medico: str
@@ -45,5 +50,37 @@ class AgendarExamePayload(BaseModel):
     local_exame: str
     data_hora:  datetime
 
-    
 
+class ResumoPessoaPayload(BaseModel):
+    pessoa: CadastroPessoaPayload
+    consultas: list[ConsultaPayload] # Próximas consultas, da mais cedo para a mais tarde
+    exames: list[AgendarExamePayload] # Próximos exames, da mais cedo para a mais tarde
+
+
+class RegraHorarioPayload(BaseModel):
+    dias_semana: list[int] # 0 = segunda ... 6 = domingo
+    inicio: str # "08:00"
+    fim: str # "12:00"
+    duracao_minutos: int
+    vigencia_inicio: Optional[date] = None
+    vigencia_fim: Optional[date] = None
+
+class ModeloAgendaPayload(BaseModel):
+    especialidade: str
+    medico: str
+    regras: list[RegraHorarioPayload]
+    excecoes: list[str] = [] # Datas (AAAA-MM-DD) sem atendimento ou horários ISO bloqueados
+
+class ModeloAgendaDeletePayload(BaseModel):
+    especialidade: str
+    medico: str
+
+class ModeloExamePayload(BaseModel):
+    tipo_exame: str
+    local_exame: str
+    regras: list[RegraHorarioPayload]
+    excecoes: list[str] = []
+
+class ModeloExameDeletePayload(BaseModel):
+    tipo_exame: str
+    local_exame: str
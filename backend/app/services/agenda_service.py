@@ -1,102 +1,312 @@
-import json
-import os
-import csv
-from fastapi import Depends
-from app.config import URL_AGENDAMENTOS, URL_CONSULTAS 
-from app.schemas import HorarioPostPayload 
+import threading
+from array import array
+from datetime import date, datetime
+from app.lote import descrever_erro, relatorio
+from app.schemas import HorarioPostPayload, HorarioDeletePayload, ModeloAgendaPayload, ModeloAgendaDeletePayload
+from app.services.horarios import (contem_ordenado, fatiar, inserir_ordenado, intervalo, janela, mesclar, mesclar_ordenado, nova_lista,
+                                   para_iso, para_minutos, remover_ordenado)
+from app.services.modelos_agenda import ModeloAgenda, janela_dos_modelos
+from app.storage import get_armazenamento
+from app.storage.base import Armazenamento
+from app.versoes import VersoesDados
+
+CATALOGO = 'especialidades'  # recurso do catálogo em VersoesDados; os demais são as especialidades em maiúsculas
+
 
 class AgendaService:
-    def __init__(self):
-        self.db_path = URL_AGENDAMENTOS
-        self.csv_path = URL_CONSULTAS
+    def __init__(self, armazenamento: Armazenamento | None = None):
+        self.armazenamento = armazenamento or get_armazenamento()
+        # Índice de disponibilidade: especialidade -> médico -> horários livres em minutos
+        # (array ordenado, ver app/services/horarios.py). Montado uma vez a partir do
+        # armazenamento e atualizado a cada alteração, então as leituras não tocam em
+        # arquivo nem recalculam nada.
+        self._livres: dict[str, dict[str, array]] | None = None
+        self._chaves: dict[str, str] = {}  # ESPECIALIDADE -> nome como está na agenda
+        self._ofertados: dict[tuple[str, str], int] = {}  # (especialidade, médico) -> nº de horários na agenda
+        self._ocupados: set[tuple[str, str, int]] = set()  # (ESPECIALIDADE, médico, minutos) já agendados
+        # Modelos recorrentes: especialidade -> médico -> modelo. Os horários deles não entram
+        # em _livres; são gerados só para a janela consultada e filtrados por _ocupados.
+        self._modelos: dict[str, dict[str, ModeloAgenda]] = {}
+        self._lock = threading.RLock()
+        # Versão do catálogo e da agenda de cada especialidade, para os ETags das leituras
+        self.versoes = VersoesDados()
 
-    def _carregar_dados(self):
-        try:
-            with open(self.db_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+    def _garantir_indice(self):
+        if self._livres is not None:
+            return
+        agenda = self.armazenamento.carregar_agenda_consultas()
+        ocupados = set()
+        for row in self.armazenamento.listar_consultas():
+            minutos = self._minutos_ou_none(row['horario'])
+            if minutos is not None:
+                ocupados.add((row['especialidade'].upper(), row['doutor'], minutos))
+
+        livres, chaves, ofertados = {}, {}, {}
+        for especialidade, medicos in agenda.items():
+            chaves.setdefault(especialidade.upper(), especialidade)
+            for medico, horarios in medicos.items():
+                ofertados[(especialidade, medico)] = len(horarios)
+                minutos_validos = (m for m in map(self._minutos_ou_none, horarios) if m is not None)
+                livres.setdefault(especialidade, {})[medico] = nova_lista(
+                    m for m in minutos_validos if (especialidade.upper(), medico, m) not in ocupados)
 
-    def _salvar_dados(self, dados: dict):
-        with open(self.db_path, "w", encoding="utf-8") as f:
-            json.dump(dados, f, indent=4, ensure_ascii=False)
+        modelos = {}
+        for especialidade, por_medico in self.armazenamento.carregar_modelos_agenda('consultas').items():
+            for medico, modelo in por_medico.items():
+                try:
+                    modelos.setdefault(especialidade, {})[medico] = ModeloAgenda(modelo)
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Aviso: modelo de agenda inválido ignorado ({especialidade}/{medico}): {e}")
+                    continue
+                chaves.setdefault(especialidade.upper(), especialidade)
 
-    def _carregar_consultas_agendadas(self):
-        agendados = set()
+        self._livres, self._chaves, self._ofertados, self._ocupados = livres, chaves, ofertados, ocupados
+        self._modelos = modelos
+
+    @staticmethod
+    def _minutos_ou_none(horario: str) -> int | None:
         try:
-            if not os.path.exists(self.csv_path):
-                with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['cpf', 'especialidade', 'doutor', 'horario'])
-                return agendados
-
-            with open(self.csv_path, mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    agendados.add((row['especialidade'], row['doutor'], row['horario']))
-        except Exception as e:
-            print(f"Erro ao carregar o arquivo CSV de agendamentos: {e}")
-            return set()
-        return agendados
+            return para_minutos(horario)
+        except (TypeError, ValueError):
+            print(f"Aviso: horário inválido ignorado na agenda: '{horario}'")
+            return None
+
+    def etag_especialidades(self) -> str:
+        return self.versoes.etag(CATALOGO)
+
+    def etag_horarios(self, especialidade: str) -> str:
+        return self.versoes.etag(especialidade.upper(), por_minuto=True)
 
     def listar_especialidades(self):
-        agendamentos = self._carregar_dados()
-        if agendamentos:
-            return list(agendamentos.keys())
-        return []
-
-    def listar_por_especialidade(self, especialidade: str):
-        todos_horarios = self._carregar_dados()
-        consultas_agendadas = self._carregar_consultas_agendadas()
-
-        especialidade_encontrada = next((k for k in todos_horarios if k.upper() == especialidade.upper()), None)
-        
-        if not especialidade_encontrada:
-            return None
+        with self._lock:
+            self._garantir_indice()
+            return list(self._livres) + [esp for esp in self._modelos if esp not in self._livres]
 
-        horarios_da_especialidade = todos_horarios[especialidade_encontrada]
-        horarios_disponiveis = {}
+    def listar_por_especialidade(self, especialidade: str, data: date | None = None, de: datetime | None = None,
+                                 ate: datetime | None = None, medico: str | None = None, limite: int | None = None):
+        """Horários livres por médico, opcionalmente só de um dia/intervalo, de um médico e até `limite` por médico."""
+        inicio, fim = janela(data=data, de=de, ate=ate)
+        with self._lock:
+            self._garantir_indice()
+            especialidade_encontrada = self._chaves.get(especialidade.upper())
+            if not especialidade_encontrada:
+                return None
 
-        for medico, horarios in horarios_da_especialidade.items():
-            horarios_livres_do_medico = []
-            for horario in horarios:
-                if (especialidade_encontrada, medico, horario) not in consultas_agendadas:
-                    horarios_livres_do_medico.append(horario)
-            
-            if horarios_livres_do_medico:
-                horarios_disponiveis[medico] = horarios_livres_do_medico
+            avulsos = self._livres.get(especialidade_encontrada, {})
+            modelos = self._modelos.get(especialidade_encontrada, {})
+            horarios_disponiveis = {}
+            for nome_medico in list(avulsos) + [m for m in modelos if m not in avulsos]:
+                if medico and nome_medico.upper() != medico.upper():
+                    continue
+                modelo = modelos.get(nome_medico)
+                if modelo is None:
+                    horarios_livres_do_medico = fatiar(avulsos[nome_medico], inicio, fim, limite)
+                else:
+                    horarios_livres_do_medico = mesclar(
+                        [intervalo(avulsos.get(nome_medico, nova_lista([])), inicio, fim),
+                         self._gerar_livres(especialidade_encontrada, nome_medico, modelo, inicio, fim)], limite)
+                if horarios_livres_do_medico:
+                    horarios_disponiveis[nome_medico] = horarios_livres_do_medico
+            return horarios_disponiveis if horarios_disponiveis else None
 
-        return horarios_disponiveis if horarios_disponiveis else None
+    def _gerar_livres(self, especialidade: str, medico: str, modelo: ModeloAgenda, inicio: int | None, fim: int | None):
+        """Horários do modelo na janela (limitada ao futuro e ao horizonte) que ainda não foram agendados."""
+        inicio, fim = janela_dos_modelos(inicio, fim)
+        chave = especialidade.upper()
+        return (m for m in modelo.gerar(inicio, fim) if (chave, medico, m) not in self._ocupados)
 
     def adicionar_horario(self, payload: HorarioPostPayload):
-        agendamentos = self._carregar_dados()
-        correct_key = next((k for k in agendamentos if k.upper() == payload.especialidade.upper()), payload.especialidade)
-        
-        agendamentos.setdefault(correct_key, {}).setdefault(payload.medico, [])
-
-        if payload.horario in agendamentos[correct_key][payload.medico]:
-            return False 
-        
-        agendamentos[correct_key][payload.medico].append(payload.horario)
-        agendamentos[correct_key][payload.medico].sort()
-        self._salvar_dados(agendamentos)
-        return True 
-
-    def remover_horario_agendado(self, especialidade: str, medico: str, horario: str):
-        agendamentos = self._carregar_dados()
-        correct_key = next((k for k in agendamentos if k.upper() == especialidade.upper()), None)
-
-        if not (correct_key and medico in agendamentos.get(correct_key, {}) and horario in agendamentos[correct_key][medico]):
-            return False
-
-        agendamentos[correct_key][medico].remove(horario)
-        if not agendamentos[correct_key][medico]:
-            del agendamentos[correct_key][medico]
-        if not agendamentos[correct_key]:
-            del agendamentos[correct_key]
-        
-        self._salvar_dados(agendamentos)
-        return True
+        minutos = para_minutos(payload.horario)  # ValueError se o horário for inválido
+        horario = para_iso(minutos)  # grava sempre no mesmo formato ISO
+        with self._lock:
+            self._garantir_indice()
+            correct_key = self._chaves.get(payload.especialidade.upper(), payload.especialidade)
+
+            if not self.armazenamento.adicionar_horario_consulta(correct_key, payload.medico, horario):
+                return False
+
+            self.versoes.tocar(correct_key.upper(), *(() if correct_key.upper() in self._chaves else (CATALOGO,)))
+            self._chaves.setdefault(correct_key.upper(), correct_key)
+            chave_medico = (correct_key, payload.medico)
+            self._ofertados[chave_medico] = self._ofertados.get(chave_medico, 0) + 1
+            livres = self._livres.setdefault(correct_key, {}).setdefault(payload.medico, nova_lista([]))
+            if (correct_key.upper(), payload.medico, minutos) not in self._ocupados:
+                inserir_ordenado(livres, minutos)
+            return True
+
+    def adicionar_horarios_em_lote(self, registros: list[tuple[int, dict | None, str | None]]) -> dict:
+        """
+        Valida e deduplica os horários de um lote (ver app/lote.py), grava todos numa única
+        operação do armazenamento e mescla os novos no índice, uma passada por médico.
+        """
+        resultados, pendentes = [], []  # pendentes: (resultado, especialidade, medico, minutos)
+        with self._lock:
+            self._garantir_indice()
+            novas, vistos = {}, set()  # novas: ESPECIALIDADE -> nome, para especialidades que surgem no lote
+            for numero, registro, erro in registros:
+                resultado = {'linha': numero}
+                resultados.append(resultado)
+                if erro is None:
+                    try:
+                        payload = HorarioPostPayload.model_validate(registro)
+                        minutos = para_minutos(payload.horario)
+                    except ValueError as e:
+                        erro = descrever_erro(e)
+                if erro is not None:
+                    resultado.update(status='invalido', detalhe=erro)
+                    continue
+
+                chave_especialidade = payload.especialidade.upper()
+                especialidade = self._chaves.get(chave_especialidade) or novas.setdefault(
+                    chave_especialidade, payload.especialidade)
+                chave = (chave_especialidade, payload.medico, minutos)
+                if chave in vistos:
+                    resultado.update(status='duplicado', detalhe="Horário repetido no lote.")
+                    continue
+                vistos.add(chave)
+                pendentes.append((resultado, especialidade, payload.medico, minutos))
+
+            gravados = self.armazenamento.adicionar_horarios_consulta(
+                [(especialidade, medico, para_iso(minutos)) for _, especialidade, medico, minutos in pendentes])
+
+            novos_por_medico: dict[tuple[str, str], list[int]] = {}
+            for (resultado, especialidade, medico, minutos), gravado in zip(pendentes, gravados):
+                if not gravado:
+                    resultado.update(status='duplicado', detalhe="Horário já existe.")
+                    continue
+                resultado['status'] = 'adicionado'
+                self.versoes.tocar(especialidade.upper(), *(() if especialidade.upper() in self._chaves else (CATALOGO,)))
+                self._chaves.setdefault(especialidade.upper(), especialidade)
+                chave_medico = (especialidade, medico)
+                self._ofertados[chave_medico] = self._ofertados.get(chave_medico, 0) + 1
+                if (especialidade.upper(), medico, minutos) not in self._ocupados:
+                    novos_por_medico.setdefault(chave_medico, []).append(minutos)
+                else:
+                    self._livres.setdefault(especialidade, {}).setdefault(medico, nova_lista([]))
+            for (especialidade, medico), novos in novos_por_medico.items():
+                livres = self._livres.setdefault(especialidade, {})
+                livres[medico] = mesclar_ordenado(livres.get(medico, nova_lista([])), novos)
+        return relatorio(resultados)
+
+    def remover_horario_agendado(self, payload: HorarioDeletePayload):
+        """
+        Remove um horário da agenda do médico; sem `horario`, remove todos os horários dele (e o modelo).
+        Um horário que vem do modelo recorrente vira uma exceção do modelo.
+        ValueError se `horario` for inválido.
+        """
+        # Mesmo formato gravado por adicionar_horario: '...T09:00' remove o horário '...T09:00:00'
+        horario_canonico = para_iso(para_minutos(payload.horario)) if payload.horario else None
+        with self._lock:
+            self._garantir_indice()
+            correct_key = self._chaves.get(payload.especialidade.upper())
+            modelo = self._modelos.get(correct_key, {}).get(payload.medico)
+            if not correct_key or ((correct_key, payload.medico) not in self._ofertados and modelo is None):
+                return False
+
+            if horario_canonico:
+                horarios = [horario_canonico]
+            else:
+                horarios = self.armazenamento.carregar_agenda_consultas().get(correct_key, {}).get(payload.medico, [])
+
+            removido = False
+            for horario in horarios:
+                if self.armazenamento.remover_horario_consulta(correct_key, payload.medico, horario):
+                    self._remover_do_indice(correct_key, payload.medico, horario)
+                    removido = True
+
+            if modelo is not None and not horario_canonico:
+                self._salvar_modelo(correct_key, payload.medico, None)
+                removido = True
+            elif modelo is not None and not removido:
+                if modelo.oferece(para_minutos(horario_canonico)):
+                    self._salvar_modelo(correct_key, payload.medico, modelo.com_excecao(horario_canonico))
+                    removido = True
+            if removido:
+                # A especialidade pode ter saído do catálogo junto com o último horário
+                self.versoes.tocar(correct_key.upper(), CATALOGO)
+            return removido
+
+    def _remover_do_indice(self, especialidade: str, medico: str, horario: str):
+        minutos = self._minutos_ou_none(horario)
+        if minutos is not None:
+            remover_ordenado(self._livres[especialidade][medico], minutos)
+        chave_medico = (especialidade, medico)
+        self._ofertados[chave_medico] -= 1
+        if self._ofertados[chave_medico] == 0:
+            # Espelha o armazenamento: médico sem horários sai da agenda, assim como a especialidade vazia
+            del self._ofertados[chave_medico]
+            del self._livres[especialidade][medico]
+            if not self._livres[especialidade]:
+                del self._livres[especialidade]
+                if especialidade not in self._modelos:
+                    del self._chaves[especialidade.upper()]
+
+    def definir_modelo(self, payload: ModeloAgendaPayload):
+        """Cria ou substitui o modelo recorrente do médico; ValueError se alguma regra for inválida."""
+        modelo = ModeloAgenda(payload.model_dump(mode='json', include={'regras', 'excecoes'}))
+        with self._lock:
+            self._garantir_indice()
+            correct_key = self._chaves.get(payload.especialidade.upper(), payload.especialidade)
+            self._salvar_modelo(correct_key, payload.medico, modelo)
+
+    def remover_modelo(self, payload: ModeloAgendaDeletePayload) -> bool:
+        with self._lock:
+            self._garantir_indice()
+            correct_key = self._chaves.get(payload.especialidade.upper())
+            if not correct_key or payload.medico not in self._modelos.get(correct_key, {}):
+                return False
+            self._salvar_modelo(correct_key, payload.medico, None)
+            return True
+
+    def _salvar_modelo(self, especialidade: str, medico: str, modelo: ModeloAgenda | None):
+        """Grava o modelo (ou o remove, com None) e atualiza o índice; chamado com self._lock."""
+        self.armazenamento.salvar_modelo_agenda('consultas', especialidade, medico, modelo.modelo if modelo else None)
+        self.versoes.tocar(especialidade.upper(), CATALOGO)
+        if modelo is not None:
+            self._modelos.setdefault(especialidade, {})[medico] = modelo
+            self._chaves.setdefault(especialidade.upper(), especialidade)
+            return
+        del self._modelos[especialidade][medico]
+        if not self._modelos[especialidade]:
+            del self._modelos[especialidade]
+            if especialidade not in self._livres:
+                del self._chaves[especialidade.upper()]
+
+    def chave_especialidade(self, especialidade: str) -> str | None:
+        """Nome da especialidade como está na agenda (ex.: 'cardiologia' -> 'Cardiologia'), ou None."""
+        with self._lock:
+            self._garantir_indice()
+            return self._chaves.get(especialidade.upper())
+
+    def horario_livre(self, especialidade: str, medico: str, minutos: int) -> bool:
+        """O médico oferece o horário (avulso ou pelo modelo, dentro do horizonte) e ele ainda não foi agendado."""
+        with self._lock:
+            self._garantir_indice()
+            correct_key = self._chaves.get(especialidade.upper())
+            if not correct_key:
+                return False
+            livres = self._livres.get(correct_key, {}).get(medico)
+            if livres is not None and contem_ordenado(livres, minutos):
+                return True
+            modelo = self._modelos.get(correct_key, {}).get(medico)
+            inicio, fim = janela_dos_modelos(None, None)
+            return (modelo is not None and inicio <= minutos < fim and modelo.oferece(minutos)
+                    and (correct_key.upper(), medico, minutos) not in self._ocupados)
+
+    def marcar_ocupado(self, especialidade: str, medico: str, horario: str):
+        """Chamado depois que uma consulta é gravada: o horário deixa de aparecer como livre."""
+        minutos = self._minutos_ou_none(horario)
+        if minutos is None:
+            return
+        with self._lock:
+            self.versoes.tocar(self._chaves.get(especialidade.upper(), especialidade).upper())
+            if self._livres is None:
+                return  # o índice ainda não existe; quando for montado já lerá a consulta gravada
+            correct_key = self._chaves.get(especialidade.upper(), especialidade)
+            self._ocupados.add((correct_key.upper(), medico, minutos))
+            livres = self._livres.get(correct_key, {}).get(medico)
+            if livres:
+                remover_ordenado(livres, minutos)
 
 agenda_service_instance = AgendaService()
 def get_agenda_service():
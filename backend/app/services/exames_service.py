@@ -1,126 +1,235 @@
 # app/services/exames_service.py
-import json
-import os
-from datetime import datetime
-from app.config import URL_AGENDAMENTOS_EXAMES, \
-    URL_EXAMES_AGENDADOS  # Importa a URL do arquivo JSON de exames e a nova URL de agendamentos
-from app.schemas import AgendarExamePayload  # Importa o schema
+import threading
+from array import array
+from datetime import date, datetime
+from app.lote import descrever_erro, relatorio
+from app.schemas import (AgendarExamePayload, HorarioExamePostPayload, ModeloExamePayload,  # Importa os schemas
+                         ModeloExameDeletePayload)
+from app.services.horarios import (contem_ordenado, fatiar, intervalo, janela, mesclar, mesclar_ordenado, nova_lista,
+                                   para_iso, para_minutos, remover_ordenado)
+from app.services.modelos_agenda import ModeloAgenda, janela_dos_modelos
+from app.storage import get_armazenamento
+from app.storage.base import Armazenamento
+from app.travas import TravasPorChave
+from app.versoes import VersoesDados
+
+CATALOGO = 'tipos'  # recurso do catálogo em VersoesDados; os demais são os tipos de exame em maiúsculas
 
 
 class ExamesService:
-    def __init__(self):
-        self.db_path = URL_AGENDAMENTOS_EXAMES
-        self.agendamentos_exames_path = URL_EXAMES_AGENDADOS  # Novo caminho para agendamentos
+    def __init__(self, armazenamento: Armazenamento | None = None):
+        self.armazenamento = armazenamento or get_armazenamento()
+        self.travas = TravasPorChave()  # Uma trava por (tipo de exame, local, horário)
+        # Índice: tipo de exame -> local -> horários disponíveis em minutos (array ordenado, montado uma vez)
+        self._livres: dict[str, dict[str, array]] | None = None
+        self._chaves: dict[str, str] = {}  # TIPO DE EXAME -> nome como está na agenda
+        # Modelos recorrentes: tipo de exame -> local -> modelo; os horários gerados são
+        # filtrados pelos já agendados em _ocupados (TIPO DE EXAME, local, minutos)
+        self._modelos: dict[str, dict[str, ModeloAgenda]] = {}
+        self._ocupados: set[tuple[str, str, int]] = set()
+        self._lock = threading.RLock()
+        # Versão do catálogo e dos horários de cada tipo de exame, para os ETags das leituras
+        self.versoes = VersoesDados()
 
-    def _carregar_dados(self) -> dict:
-        """Carrega os dados do arquivo JSON de agendamentos de exames disponíveis."""
-        try:
-            if not os.path.exists(self.db_path) or os.path.getsize(self.db_path) == 0:
-                with open(self.db_path, 'w', encoding='utf-8') as f:
-                    json.dump({}, f)
-                return {}
-            with open(self.db_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Erro ao carregar o arquivo JSON de exames disponíveis: {e}")
-            return {}
-
-    def _carregar_agendamentos_exames(self) -> list[dict]:
-        """Carrega os agendamentos de exames."""
-        try:
-            if not os.path.exists(self.agendamentos_exames_path) or os.path.getsize(self.agendamentos_exames_path) == 0:
-                with open(self.agendamentos_exames_path, 'w', encoding='utf-8') as f:
-                    json.dump([], f)  # Lista vazia para agendamentos
-                return []
-            with open(self.agendamentos_exames_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Erro ao carregar o arquivo JSON de exames agendados: {e}")
-            return []
-
-    def _salvar_agendamentos_exames(self, agendamentos: list[dict]):
-        """Salva os agendamentos de exames no arquivo JSON."""
-        try:
-            with open(self.agendamentos_exames_path, 'w', encoding='utf-8') as f:
-                json.dump(agendamentos, f, indent=2, ensure_ascii=False)
-        except IOError as e:
-            print(f"Erro ao salvar o arquivo JSON de exames agendados: {e}")
+    def _garantir_indice(self):
+        """Monta o índice a partir do armazenamento, descartando horários em formato inválido."""
+        if self._livres is not None:
+            return
+        livres, chaves = {}, {}
+        for tipo_exame, locais in self.armazenamento.carregar_agenda_exames().items():
+            chaves.setdefault(tipo_exame.upper(), tipo_exame)
+            por_local = livres.setdefault(tipo_exame, {})
+            for local, horarios in locais.items():
+                validos = []
+                for h_str in horarios:
+                    try:
+                        validos.append(para_minutos(h_str))
+                    except (TypeError, ValueError):
+                        continue
+                por_local[local] = nova_lista(validos)
+
+        modelos = {}
+        for tipo_exame, por_local in self.armazenamento.carregar_modelos_agenda('exames').items():
+            for local, modelo in por_local.items():
+                try:
+                    modelos.setdefault(tipo_exame, {})[local] = ModeloAgenda(modelo)
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Aviso: modelo de agenda de exame inválido ignorado ({tipo_exame}/{local}): {e}")
+                    continue
+                chaves.setdefault(tipo_exame.upper(), tipo_exame)
+
+        ocupados = set()
+        for agendamento in self.armazenamento.listar_exames_agendados():
+            try:
+                minutos = para_minutos(agendamento['data_hora'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            ocupados.add((str(agendamento.get('tipo_exame')).upper(), agendamento.get('local_exame'), minutos))
+
+        self._livres, self._chaves, self._modelos, self._ocupados = livres, chaves, modelos, ocupados
+
+    def etag_tipos_exames(self) -> str:
+        return self.versoes.etag(CATALOGO)
+
+    def etag_horarios(self, tipo_exame: str) -> str:
+        return self.versoes.etag(tipo_exame.upper(), por_minuto=True)
 
     def listar_tipos_exames(self) -> list[str]:
         """Lista todos os tipos de exames disponíveis."""
-        dados = self._carregar_dados()
-        return list(dados.keys()) if dados else []
+        with self._lock:
+            self._garantir_indice()
+            return list(self._livres) + [tipo for tipo in self._modelos if tipo not in self._livres]
 
-    def listar_horarios_exame_por_local(self, tipo_exame: str) -> dict | None:
+    def listar_horarios_exame_por_local(self, tipo_exame: str, data: date | None = None, de: datetime | None = None,
+                                        ate: datetime | None = None, local: str | None = None,
+                                        limite: int | None = None) -> dict | None:
         """Lista os horários disponíveis para um tipo de exame, por local, filtrando horários passados."""
-        todos_exames = self._carregar_dados()
+        inicio, fim = janela(data=data, de=de, ate=ate, depois_de=datetime.now())
+        with self._lock:
+            self._garantir_indice()
 
-        # Busca o tipo de exame de forma case-insensitive
-        tipo_exame_encontrado = next((k for k in todos_exames if k.upper() == tipo_exame.upper()), None)
+            # Busca o tipo de exame de forma case-insensitive
+            tipo_exame_encontrado = self._chaves.get(tipo_exame.upper())
+            if not tipo_exame_encontrado:
+                return None
 
-        if not tipo_exame_encontrado:
-            return None
+            avulsos = self._livres.get(tipo_exame_encontrado, {})
+            modelos = self._modelos.get(tipo_exame_encontrado, {})
+            horarios_disponiveis = {}
+            for nome_local in list(avulsos) + [l for l in modelos if l not in avulsos]:
+                if local and nome_local.upper() != local.upper():
+                    continue
+                modelo = modelos.get(nome_local)
+                if modelo is None:
+                    horarios_futuros = fatiar(avulsos[nome_local], inicio, fim, limite)
+                else:
+                    horarios_futuros = mesclar(
+                        [intervalo(avulsos.get(nome_local, nova_lista([])), inicio, fim),
+                         self._gerar_livres(tipo_exame_encontrado, nome_local, modelo, inicio, fim)], limite)
+                if horarios_futuros:
+                    horarios_disponiveis[nome_local] = horarios_futuros
 
-        horarios_do_exame = todos_exames[tipo_exame_encontrado]
-        horarios_disponiveis = {}
+            return horarios_disponiveis if horarios_disponiveis else None
 
-        agora = datetime.now()
+    def adicionar_horarios_em_lote(self, registros: list[tuple[int, dict | None, str | None]]) -> dict:
+        """
+        Valida e deduplica os horários de exame de um lote (ver app/lote.py), grava todos numa
+        única operação do armazenamento e mescla os novos no índice, uma passada por local.
+        """
+        resultados, pendentes = [], []  # pendentes: (resultado, tipo de exame, local, minutos)
+        with self._lock:
+            self._garantir_indice()
+            novos_tipos, vistos = {}, set()  # novos_tipos: TIPO DE EXAME -> nome, para tipos que surgem no lote
+            for numero, registro, erro in registros:
+                resultado = {'linha': numero}
+                resultados.append(resultado)
+                if erro is None:
+                    try:
+                        payload = HorarioExamePostPayload.model_validate(registro)
+                        minutos = para_minutos(payload.data_hora)
+                    except ValueError as e:
+                        erro = descrever_erro(e)
+                if erro is not None:
+                    resultado.update(status='invalido', detalhe=erro)
+                    continue
 
-        for local, horarios in horarios_do_exame.items():
-            horarios_futuros = []
-            for h_str in horarios:
-                try:
-                    h_dt = datetime.fromisoformat(h_str)
-                    if h_dt > agora:
-                        horarios_futuros.append(h_str)
-                except ValueError:
+                chave_tipo = payload.tipo_exame.upper()
+                tipo_exame = self._chaves.get(chave_tipo) or novos_tipos.setdefault(chave_tipo, payload.tipo_exame)
+                chave = (chave_tipo, payload.local_exame, minutos)
+                if chave in self._ocupados:
+                    resultado.update(status='duplicado', detalhe="Horário já agendado.")
+                    continue
+                if chave in vistos:
+                    resultado.update(status='duplicado', detalhe="Horário repetido no lote.")
                     continue
+                vistos.add(chave)
+                pendentes.append((resultado, tipo_exame, payload.local_exame, minutos))
 
-            if horarios_futuros:
-                horarios_disponiveis[local] = sorted(horarios_futuros)
+            gravados = self.armazenamento.adicionar_horarios_exame(
+                [(tipo_exame, local, para_iso(minutos)) for _, tipo_exame, local, minutos in pendentes])
+
+            novos_por_local: dict[tuple[str, str], list[int]] = {}
+            for (resultado, tipo_exame, local, minutos), gravado in zip(pendentes, gravados):
+                if not gravado:
+                    resultado.update(status='duplicado', detalhe="Horário já existe.")
+                    continue
+                resultado['status'] = 'adicionado'
+                self.versoes.tocar(tipo_exame.upper(), *(() if tipo_exame.upper() in self._chaves else (CATALOGO,)))
+                self._chaves.setdefault(tipo_exame.upper(), tipo_exame)
+                novos_por_local.setdefault((tipo_exame, local), []).append(minutos)
+            for (tipo_exame, local), novos in novos_por_local.items():
+                por_local = self._livres.setdefault(tipo_exame, {})
+                por_local[local] = mesclar_ordenado(por_local.get(local, nova_lista([])), novos)
+        return relatorio(resultados)
 
-        return horarios_disponiveis if horarios_disponiveis else None
+    def _gerar_livres(self, tipo_exame: str, local: str, modelo: ModeloAgenda, inicio: int | None, fim: int | None):
+        """Horários do modelo na janela (limitada ao futuro e ao horizonte) que ainda não foram agendados."""
+        inicio, fim = janela_dos_modelos(inicio, fim)
+        chave = tipo_exame.upper()
+        return (m for m in modelo.gerar(inicio, fim) if (chave, local, m) not in self._ocupados)
 
     def agendar_novo_exame(self, payload: AgendarExamePayload) -> bool:
         """Agenda um novo exame, removendo o horário disponível e salvando o agendamento."""
-        todos_exames = self._carregar_dados()
-        tipo_exame_normalizado = next((k for k in todos_exames if k.upper() == payload.tipo_exame.upper()), None)
+        # Uma única forma do horário para a trava, o armazenamento e o registro: '...T10:00:00+00:00'
+        # e o mesmo instante sem fuso disputam a mesma trava e casam com a mesma linha da agenda
+        try:
+            minutos = para_minutos(payload.data_hora)
+        except ValueError:
+            print(f"Erro de agendamento: Horário '{payload.data_hora.isoformat()}' deve estar em minuto cheio.")
+            return False
+        horario = para_iso(minutos)
+        chave_horario = ('exame', payload.tipo_exame.upper(), payload.local_exame, horario)
+        with self.travas.travar(chave_horario):
+            return self._agendar_novo_exame(payload, minutos, horario)
+
+    def _agendar_novo_exame(self, payload: AgendarExamePayload, minutos: int, horario_para_agendar_str: str) -> bool:
+        with self._lock:
+            self._garantir_indice()
+            tipo_exame_normalizado = self._chaves.get(payload.tipo_exame.upper())
+            horarios_do_local = self._livres.get(tipo_exame_normalizado, {}).get(payload.local_exame)
+            modelo = self._modelos.get(tipo_exame_normalizado, {}).get(payload.local_exame)
 
         if not tipo_exame_normalizado:
             print(f"Erro de agendamento: Tipo de exame '{payload.tipo_exame}' não encontrado.")
             return False
 
         # Verifica se o local existe para o tipo de exame
-        if payload.local_exame not in todos_exames[tipo_exame_normalizado]:
+        if horarios_do_local is None and modelo is None:
             print(
                 f"Erro de agendamento: Local '{payload.local_exame}' não encontrado para o exame '{payload.tipo_exame}'.")
             return False
 
-        horarios_do_local = todos_exames[tipo_exame_normalizado][payload.local_exame]
-        horario_para_agendar_str = payload.data_hora.isoformat()  # JÁ ESTÁ EM STRING AQUI
+        with self._lock:
+            avulso = horarios_do_local is not None and contem_ordenado(horarios_do_local, minutos)
+            do_modelo = not avulso and modelo is not None and self._modelo_oferece(
+                tipo_exame_normalizado, payload.local_exame, modelo, minutos)
 
-        if horario_para_agendar_str in horarios_do_local:
-            # Remove o horário da lista de disponíveis
-            horarios_do_local.remove(horario_para_agendar_str)
+        if avulso or do_modelo:
+            # Converte o Pydantic model para dict, com o horário na forma canônica
+            agendamento_dict = payload.model_dump()
+            agendamento_dict['data_hora'] = horario_para_agendar_str
+            agendamento_dict['tipo_exame'] = tipo_exame_normalizado  # grava com o nome como está na agenda
 
-            # Atualiza os dados de exames disponíveis
+            # Ocupa o horário e registra o agendamento numa única operação do armazenamento
+            # (horário de modelo não tem linha na agenda: só o agendamento é gravado)
+            agendar = self.armazenamento.agendar_exame if avulso else self.armazenamento.agendar_exame_do_modelo
             try:
-                with open(self.db_path, 'w', encoding='utf-8') as f:
-                    json.dump(todos_exames, f, indent=2, ensure_ascii=False)
-            except IOError as e:
-                print(f"Erro ao salvar o arquivo JSON de exames disponíveis após agendamento: {e}")
+                if not agendar(tipo_exame_normalizado, payload.local_exame, horario_para_agendar_str, agendamento_dict):
+                    print(f"Erro de agendamento: Horário '{horario_para_agendar_str}' acabou de ser ocupado.")
+                    return False
+            except Exception as e:
+                print(f"Erro ao salvar o agendamento de exame: {e}")
                 return False
 
-            # Salva o agendamento em um novo arquivo
-            agendamentos = self._carregar_agendamentos_exames()
-
-            # CONVERSÃO AQUI: converte o Pydantic model para dict e o datetime para string ISO
-            agendamento_dict = payload.dict()
-            agendamento_dict['data_hora'] = agendamento_dict[
-                'data_hora'].isoformat()  # CONVERTE DATETIME PARA STRING ISO
-
-            agendamentos.append(agendamento_dict)
-            self._salvar_agendamentos_exames(agendamentos)
+            with self._lock:
+                # O índice pode ter sido remontado ou o local recriado durante a gravação:
+                # remove do array atual, não do que foi lido antes
+                if avulso and self._livres is not None:
+                    horarios_atuais = self._livres.get(tipo_exame_normalizado, {}).get(payload.local_exame)
+                    if horarios_atuais is not None:
+                        remover_ordenado(horarios_atuais, minutos)
+                self._ocupados.add((tipo_exame_normalizado.upper(), payload.local_exame, minutos))
+                self.versoes.tocar(tipo_exame_normalizado.upper())
 
             print(f"Exame de '{payload.tipo_exame}' agendado para {horario_para_agendar_str} em {payload.local_exame}.")
             return True
@@ -129,13 +238,41 @@ class ExamesService:
                 f"Erro de agendamento: Horário '{horario_para_agendar_str}' não disponível para '{payload.tipo_exame}' em '{payload.local_exame}'.")
             return False
 
+    def _modelo_oferece(self, tipo_exame: str, local: str, modelo: ModeloAgenda, minutos: int) -> bool:
+        """O horário é gerado pelo modelo, está no futuro/horizonte e ainda não foi agendado."""
+        inicio, fim = janela_dos_modelos(None, None)
+        return (inicio <= minutos < fim and modelo.oferece(minutos)
+                and (tipo_exame.upper(), local, minutos) not in self._ocupados)
+
+    def definir_modelo(self, payload: ModeloExamePayload):
+        """Cria ou substitui o modelo recorrente do local; ValueError se alguma regra for inválida."""
+        modelo = ModeloAgenda(payload.model_dump(mode='json', include={'regras', 'excecoes'}))
+        with self._lock:
+            self._garantir_indice()
+            tipo_exame = self._chaves.get(payload.tipo_exame.upper(), payload.tipo_exame)
+            self.armazenamento.salvar_modelo_agenda('exames', tipo_exame, payload.local_exame, modelo.modelo)
+            self.versoes.tocar(tipo_exame.upper(), CATALOGO)
+            self._chaves.setdefault(tipo_exame.upper(), tipo_exame)
+            self._modelos.setdefault(tipo_exame, {})[payload.local_exame] = modelo
+
+    def remover_modelo(self, payload: ModeloExameDeletePayload) -> bool:
+        with self._lock:
+            self._garantir_indice()
+            tipo_exame = self._chaves.get(payload.tipo_exame.upper())
+            if not tipo_exame or payload.local_exame not in self._modelos.get(tipo_exame, {}):
+                return False
+            self.armazenamento.salvar_modelo_agenda('exames', tipo_exame, payload.local_exame, None)
+            self.versoes.tocar(tipo_exame.upper(), CATALOGO)
+            del self._modelos[tipo_exame][payload.local_exame]
+            if not self._modelos[tipo_exame]:
+                del self._modelos[tipo_exame]
+                if tipo_exame not in self._livres:
+                    del self._chaves[tipo_exame.upper()]
+            return True
+
     def buscar_exames_agendados_por_cpf(self, cpf: str) -> list[dict]:
         """Busca e retorna os exames agendados para um CPF específico."""
-        agendamentos = self._carregar_agendamentos_exames()
-        exames_do_paciente = [
-            ag for ag in agendamentos if ag['cpf_paciente'] == cpf
-        ]
-        return exames_do_paciente
+        return self.armazenamento.buscar_exames_por_cpf(cpf)
 
 
 # Singleton: Garante que haja apenas uma instância do serviço
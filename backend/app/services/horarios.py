@@ -0,0 +1,139 @@
+# app/services/horarios.py
+"""
+Representação compacta dos horários em memória.
+
+Os horários são guardados como minutos desde 1970-01-01T00:00 (hora local, sem
+fuso) em `array('i')` ordenados: 4 bytes por horário em vez de um objeto str, e
+filtros por data viram busca binária sobre inteiros. A conversão para ISO 8601
+acontece só na borda da API.
+"""
+import bisect
+import heapq
+from array import array
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+EPOCA = datetime(1970, 1, 1)
+_UM_MINUTO = timedelta(minutes=1)
+
+
+def _sem_fuso(valor: datetime) -> datetime:
+    # Horários da agenda são locais e sem fuso; datetimes com fuso são convertidos para a hora local
+    return valor.astimezone().replace(tzinfo=None) if valor.tzinfo else valor
+
+
+def para_minutos(valor: str | datetime) -> int:
+    """Converte um horário ISO (ou datetime) em minutos; ValueError se inválido ou fora do minuto cheio."""
+    dt = _sem_fuso(datetime.fromisoformat(valor) if isinstance(valor, str) else valor)
+    if dt.second or dt.microsecond:
+        raise ValueError(f"Horário '{valor}' deve estar em minuto cheio.")
+    return (dt - EPOCA) // _UM_MINUTO
+
+
+@lru_cache(maxsize=16384)
+def para_iso(minutos: int) -> str:
+    return (EPOCA + timedelta(minutes=minutos)).isoformat()
+
+
+def _piso(dt: datetime) -> int:
+    return (_sem_fuso(dt) - EPOCA) // _UM_MINUTO
+
+
+def _teto(dt: datetime) -> int:
+    dt = _sem_fuso(dt)
+    minutos = (dt - EPOCA) // _UM_MINUTO
+    return minutos + 1 if dt.second or dt.microsecond else minutos
+
+
+def nova_lista(minutos: Iterable[int]) -> array:
+    """Array compacto e ordenado de horários em minutos."""
+    return array('i', sorted(minutos))
+
+
+def janela(data: date | None = None, de: datetime | None = None, ate: datetime | None = None,
+           depois_de: datetime | None = None) -> tuple[int | None, int | None]:
+    """
+    Converte os filtros de consulta em uma janela [inicio, fim) em minutos.
+
+    - data: somente os horários daquele dia
+    - de / ate: intervalo inclusivo
+    - depois_de: somente horários estritamente posteriores (ex.: agora)
+    Os filtros são combinados (interseção).
+    """
+    inicios, fins = [], []
+    if data is not None:
+        inicios.append(_piso(datetime.combine(data, time.min)))
+        fins.append(_piso(datetime.combine(data + timedelta(days=1), time.min)))
+    if de is not None:
+        inicios.append(_teto(de))
+    if ate is not None:
+        fins.append(_piso(ate) + 1)
+    if depois_de is not None:
+        inicios.append(_piso(depois_de) + 1)
+    inicio = max(inicios) if inicios else None
+    fim = min(fins) if fins else None
+    return inicio, fim
+
+
+def intervalo(horarios: array, inicio: int | None = None, fim: int | None = None) -> array:
+    """Recorte de um array ORDENADO para a janela [inicio, fim), por busca binária."""
+    lo = bisect.bisect_left(horarios, inicio) if inicio is not None else 0
+    hi = bisect.bisect_left(horarios, fim) if fim is not None else len(horarios)
+    return horarios[lo:hi]
+
+
+def fatiar(horarios: array, inicio: int | None = None, fim: int | None = None,
+           limite: int | None = None) -> list[str]:
+    """Recorta um array ORDENADO para a janela [inicio, fim) e devolve em ISO."""
+    recorte = intervalo(horarios, inicio, fim)
+    if limite is not None:
+        recorte = recorte[:limite]
+    return [para_iso(m) for m in recorte]
+
+
+def mesclar(fontes: Iterable[Iterable[int]], limite: int | None = None) -> list[str]:
+    """Junta fontes já ordenadas de minutos (sem repetir) e devolve em ISO, parando em `limite`."""
+    resultado, ultimo = [], None
+    for minutos in heapq.merge(*fontes):
+        if minutos == ultimo:
+            continue
+        if limite is not None and len(resultado) >= limite:
+            break
+        resultado.append(para_iso(minutos))
+        ultimo = minutos
+    return resultado
+
+
+def mesclar_ordenado(horarios: array, novos: Iterable[int]) -> array:
+    """Novo array com `horarios` (ordenado) e `novos` numa única passada de merge, sem repetir."""
+    resultado, ultimo = array('i'), None
+    for minutos in heapq.merge(horarios, sorted(novos)):
+        if minutos != ultimo:
+            resultado.append(minutos)
+            ultimo = minutos
+    return resultado
+
+
+def contem_ordenado(horarios: array, minutos: int) -> bool:
+    """Busca binária de `minutos` em um array ordenado."""
+    i = bisect.bisect_left(horarios, minutos)
+    return i < len(horarios) and horarios[i] == minutos
+
+
+def inserir_ordenado(horarios: array, minutos: int) -> bool:
+    """Insere mantendo a ordem; False se já estiver presente."""
+    i = bisect.bisect_left(horarios, minutos)
+    if i < len(horarios) and horarios[i] == minutos:
+        return False
+    horarios.insert(i, minutos)
+    return True
+
+
+def remover_ordenado(horarios: array, minutos: int) -> bool:
+    """Remove `minutos` de um array ordenado por busca binária; False se não estiver nele."""
+    i = bisect.bisect_left(horarios, minutos)
+    if i < len(horarios) and horarios[i] == minutos:
+        del horarios[i]
+        return True
+    return False
@@ -0,0 +1,129 @@
+# app/services/modelos_agenda.py
+"""
+Modelos de agenda recorrentes.
+
+Em vez de gravar cada horário, grava-se a regra (dias da semana, início e fim do
+expediente, duração de cada horário) e as exceções (feriados, folgas, horários
+bloqueados). Os horários concretos são gerados sob demanda, só para a janela
+consultada, então o armazenamento cresce com o número de regras e não com o tempo.
+
+Formato persistido de um modelo:
+    {'regras': [{'dias_semana': [0, 2], 'inicio': '08:00', 'fim': '12:00', 'duracao_minutos': 30,
+                 'vigencia_inicio': '2030-01-01' | None, 'vigencia_fim': None}],
+     'excecoes': ['2030-12-25', '2030-01-02T09:00:00']}
+onde dias_semana segue datetime.weekday() (0 = segunda ... 6 = domingo) e cada
+exceção é uma data inteira sem atendimento ou um horário específico bloqueado.
+"""
+from collections.abc import Iterator
+from datetime import date, datetime, time, timedelta
+from app.config import HORIZONTE_MODELOS_DIAS
+from app.services.horarios import EPOCA, janela, para_iso, para_minutos
+
+MINUTOS_POR_DIA = 24 * 60
+_DIA_SEMANA_EPOCA = EPOCA.weekday()  # 1970-01-01 foi uma quinta-feira
+
+
+def _minuto_do_dia(valor: str) -> int:
+    hora = time.fromisoformat(valor)
+    if hora.second or hora.microsecond:
+        raise ValueError(f"Hora '{valor}' deve estar em minuto cheio.")
+    return hora.hour * 60 + hora.minute
+
+
+def _numero_do_dia(valor: str | date) -> int:
+    dia = date.fromisoformat(valor) if isinstance(valor, str) else valor
+    return (dia - EPOCA.date()).days
+
+
+def janela_dos_modelos(inicio: int | None, fim: int | None) -> tuple[int, int]:
+    """Restringe a janela consultada aos horários futuros dentro do horizonte (HORIZONTE_MODELOS_DIAS)."""
+    agora = datetime.now()
+    proximo, horizonte = janela(depois_de=agora, ate=agora + timedelta(days=HORIZONTE_MODELOS_DIAS))
+    return max(proximo, inicio) if inicio is not None else proximo, min(horizonte, fim) if fim is not None else horizonte
+
+
+class ModeloAgenda:
+    """Modelo validado e pré-calculado; ValueError se alguma regra ou exceção for inválida."""
+
+    def __init__(self, modelo: dict):
+        regras = modelo.get('regras') or []
+        if not regras:
+            raise ValueError("O modelo de agenda precisa de pelo menos uma regra.")
+
+        # dia da semana -> [(minutos do dia ordenados, mesmos minutos em set, primeiro dia, último dia)]
+        self._regras_por_dia: list[list[tuple]] = [[] for _ in range(7)]
+        regras_normalizadas = []
+        for regra in regras:
+            inicio, fim = _minuto_do_dia(regra['inicio']), _minuto_do_dia(regra['fim'])
+            duracao = int(regra['duracao_minutos'])
+            if duracao < 1:
+                raise ValueError("A duração de cada horário deve ser de pelo menos 1 minuto.")
+            if inicio + duracao > fim:
+                raise ValueError(f"O expediente {regra['inicio']}-{regra['fim']} não comporta um horário de {duracao} minutos.")
+            dias_semana = sorted(set(regra['dias_semana']))
+            if not dias_semana or any(d not in range(7) for d in dias_semana):
+                raise ValueError("dias_semana deve conter valores de 0 (segunda) a 6 (domingo).")
+            vigencia_inicio, vigencia_fim = regra.get('vigencia_inicio'), regra.get('vigencia_fim')
+            primeiro = _numero_do_dia(vigencia_inicio) if vigencia_inicio else None
+            ultimo = _numero_do_dia(vigencia_fim) if vigencia_fim else None
+            if primeiro is not None and ultimo is not None and primeiro > ultimo:
+                raise ValueError("vigencia_inicio deve ser anterior a vigencia_fim.")
+
+            minutos_do_dia = tuple(range(inicio, fim - duracao + 1, duracao))
+            for dia_semana in dias_semana:
+                self._regras_por_dia[dia_semana].append((minutos_do_dia, frozenset(minutos_do_dia), primeiro, ultimo))
+            regras_normalizadas.append({
+                'dias_semana': dias_semana, 'inicio': regra['inicio'], 'fim': regra['fim'],
+                'duracao_minutos': duracao,
+                'vigencia_inicio': str(vigencia_inicio) if vigencia_inicio else None,
+                'vigencia_fim': str(vigencia_fim) if vigencia_fim else None,
+            })
+
+        self._dias_bloqueados: set[int] = set()
+        self._horarios_bloqueados: set[int] = set()
+        excecoes = []
+        for excecao in modelo.get('excecoes') or []:
+            excecao = str(excecao)
+            if len(excecao) == 10:  # AAAA-MM-DD: o dia inteiro sem atendimento
+                self._dias_bloqueados.add(_numero_do_dia(excecao))
+                excecoes.append(excecao)
+            else:
+                minutos = para_minutos(excecao)
+                self._horarios_bloqueados.add(minutos)
+                excecoes.append(para_iso(minutos))
+
+        # Forma normalizada, é o que vai para o armazenamento
+        self.modelo = {'regras': regras_normalizadas, 'excecoes': sorted(set(excecoes))}
+
+    def _regras_do_dia(self, dia: int) -> list[tuple]:
+        if dia in self._dias_bloqueados:
+            return []
+        return [regra for regra in self._regras_por_dia[(dia + _DIA_SEMANA_EPOCA) % 7]
+                if (regra[2] is None or dia >= regra[2]) and (regra[3] is None or dia <= regra[3])]
+
+    def gerar(self, inicio: int, fim: int) -> Iterator[int]:
+        """Horários (em minutos, em ordem crescente) que o modelo oferece na janela [inicio, fim)."""
+        for dia in range(inicio // MINUTOS_POR_DIA, (fim - 1) // MINUTOS_POR_DIA + 1):
+            regras = self._regras_do_dia(dia)
+            if not regras:
+                continue
+            minutos_do_dia = regras[0][0] if len(regras) == 1 else sorted(set().union(*(r[1] for r in regras)))
+            base = dia * MINUTOS_POR_DIA
+            for minuto in minutos_do_dia:
+                minutos = base + minuto
+                if minutos < inicio or minutos in self._horarios_bloqueados:
+                    continue
+                if minutos >= fim:
+                    break
+                yield minutos
+
+    def oferece(self, minutos: int) -> bool:
+        """True se o horário é gerado pelo modelo (sem olhar se já foi agendado)."""
+        if minutos in self._horarios_bloqueados:
+            return False
+        dia, minuto = divmod(minutos, MINUTOS_POR_DIA)
+        return any(minuto in regra[1] for regra in self._regras_do_dia(dia))
+
+    def com_excecao(self, excecao: str) -> 'ModeloAgenda':
+        """Novo modelo com mais uma data ou horário bloqueado."""
+        return ModeloAgenda({'regras': self.modelo['regras'], 'excecoes': self.modelo['excecoes'] + [excecao]})
@@ -1,126 +1,154 @@
-import csv
-import os
-from app.config import URL_CONSULTAS, URL_CADASTROS, CABECALHO_CADASTROS, CABECALHO_CONSULTAS
+from datetime import datetime
+from app.lote import descrever_erro, relatorio
 from app.schemas import CadastroPessoaPayload, ConsultaPayload
+from app.services.agenda_service import AgendaService, get_agenda_service
+from app.services.horarios import para_iso, para_minutos
+from app.storage import get_armazenamento
+from app.storage.base import Armazenamento
+from app.storage.csv_indexado import normalizar_cpf
+from app.travas import TravasPorChave
 
 class PessoasService:
-    def __init__(self):
-        self.csv_path_cadastros = URL_CADASTROS
-        self.csv_path_consultas = URL_CONSULTAS
+    def __init__(self, armazenamento: Armazenamento | None = None, agenda: AgendaService | None = None):
+        self.armazenamento = armazenamento or get_armazenamento()
+        self.agenda = agenda or get_agenda_service()  # Mantém o índice de horários livres em dia
+        # Travas por horário do médico e por horário do paciente: agendamentos que não
+        # disputam o mesmo horário seguem em paralelo
+        self.travas = TravasPorChave()
 
-    def _carregar_pessoas(self) -> list[dict]:
-        try:
-            if not os.path.exists(self.csv_path_cadastros) or os.path.getsize(self.csv_path_cadastros) == 0:
-                with open(self.csv_path_cadastros, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(CABECALHO_CADASTROS)
-                return []
-            with open(self.csv_path_cadastros, mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                return list(reader)
-        except Exception as e:
-            print(f"Erro ao carregar o arquivo CSV de cadastros: {e}")
-            return []
+    def buscar_por_cpf(self, cpf: str) -> dict | None:
+        return self.armazenamento.buscar_pessoa(cpf)
 
-    def _carregar_consultas(self) -> list[dict]:
-        try:
-            if not os.path.exists(self.csv_path_consultas) or os.path.getsize(self.csv_path_consultas) == 0:
-                with open(self.csv_path_consultas, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(CABECALHO_CONSULTAS)
-                return []
-            with open(self.csv_path_consultas, mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                return list(reader)
-        except Exception as e:
-            print(f"Erro ao carregar o arquivo CSV de consultas: {e}")
-            return []
+    def resumo(self, cpf: str, agora: datetime | None = None) -> dict | None:
+        """
+        Cadastro, próximas consultas e próximos exames do CPF, ordenados por data, numa só
+        resposta (tela "Meus Agendamentos"). Cada parte vem da busca por CPF do armazenamento,
+        sem percorrer os demais registros. None se o CPF não estiver cadastrado.
+        """
+        pessoa = self.buscar_por_cpf(cpf)
+        if not pessoa:
+            return None
+        agora = agora or datetime.now()
+        return {
+            'pessoa': pessoa,
+            'consultas': self._proximos(self.buscar_consultas_por_cpf(cpf), agora),
+            'exames': self._proximos(self.armazenamento.buscar_exames_por_cpf(cpf), agora),
+        }
 
-    def buscar_por_cpf(self, cpf: str) -> dict | None:
-        cpf_limpo = ''.join(filter(str.isdigit, cpf))
-        pessoas = self._carregar_pessoas()
-        for pessoa in pessoas:
-            cpf_arquivo_limpo = ''.join(filter(str.isdigit, pessoa.get('cpf', '')))
-            if cpf_arquivo_limpo == cpf_limpo:
-                return pessoa
-        return None
+    @staticmethod
+    def _proximos(agendamentos: list[dict], agora: datetime) -> list[dict]:
+        """Agendamentos a partir de `agora`, do mais cedo para o mais tarde; datas inválidas ficam de fora."""
+        com_data = []
+        for agendamento in agendamentos:
+            try:
+                data_hora = datetime.fromisoformat(str(agendamento.get('data_hora')))
+            except ValueError:
+                continue
+            if data_hora.tzinfo:  # compara em hora local, como os horários da agenda
+                data_hora = data_hora.astimezone().replace(tzinfo=None)
+            if data_hora >= agora:
+                com_data.append((data_hora, agendamento))
+        com_data.sort(key=lambda item: item[0])
+        return [agendamento for _, agendamento in com_data]
 
     def buscar_consultas_por_cpf(self, cpf: str) -> list[dict]:
-        cpf_limpo = ''.join(filter(str.isdigit, cpf))
-        consultas_agendadas = self._carregar_consultas()
         consultas_do_paciente = []
-        for consulta in consultas_agendadas:
-            cpf_consulta_limpo = ''.join(filter(str.isdigit, consulta.get('cpf', '')))
-            if cpf_consulta_limpo == cpf_limpo:
-                consultas_do_paciente.append({
-                    "cpf_paciente": consulta.get('cpf'),
-                    "especialidade": consulta.get('especialidade'),
-                    "doutor": consulta.get('doutor'),
-                    "data_hora": consulta.get('horario'),
-                    "id_medico": 0 
-                })
+        for consulta in self.armazenamento.buscar_consultas_por_cpf(cpf):
+            consultas_do_paciente.append({
+                "cpf_paciente": consulta.get('cpf'),
+                "especialidade": consulta.get('especialidade'),
+                "doutor": consulta.get('doutor'),
+                "data_hora": consulta.get('horario'),
+                "id_medico": 0 
+            })
         return consultas_do_paciente
 
     def cadastrar(self, payload: CadastroPessoaPayload) -> bool:
-        if self.buscar_por_cpf(payload.cpf):
-            return False
         try:
-            with open(self.csv_path_cadastros, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=CABECALHO_CADASTROS)
-                writer.writerow(payload.model_dump())
-            return True
+            return self.armazenamento.inserir_pessoa(payload.model_dump())
         except Exception as e:
-            print(f"ERRO ao salvar cadastro no CSV: {e}")
+            print(f"ERRO ao salvar cadastro: {e}")
             return False
 
+    def cadastrar_em_lote(self, registros: list[tuple[int, dict | None, str | None]]) -> dict:
+        """
+        Valida as linhas de um lote (ver app/lote.py) e grava as válidas numa única escrita;
+        CPFs já cadastrados ou repetidos no lote são rejeitados. O relatório lista só as rejeitadas.
+        """
+        resultados, validos = [], []  # validos: (resultado, pessoa)
+        for numero, registro, erro in registros:
+            resultado = {'linha': numero}
+            resultados.append(resultado)
+            if erro is None:
+                try:
+                    pessoa = CadastroPessoaPayload.model_validate(registro).model_dump()
+                    if not normalizar_cpf(pessoa['cpf']):
+                        raise ValueError("cpf: deve conter dígitos")
+                except ValueError as e:
+                    erro = descrever_erro(e)
+            if erro is not None:
+                resultado.update(status='rejeitado', detalhe=erro)
+                continue
+            validos.append((resultado, pessoa))
+
+        gravados = self.armazenamento.inserir_pessoas([pessoa for _, pessoa in validos])
+        for (resultado, _), gravado in zip(validos, gravados):
+            if gravado:
+                resultado['status'] = 'aceito'
+            else:
+                resultado.update(status='rejeitado', detalhe="CPF já cadastrado.")
+        return relatorio(resultados, omitir='aceito')
+
     def agendar_consulta(self, payload: ConsultaPayload):
+        # Trava e gravação usam a forma canônica do horário: 'cardiologia' e 'Cardiologia',
+        # '...T09:00' e '...T09:00:00' disputam a mesma chave
         try:
-            consultas_agendadas = self._carregar_consultas()
-            for consulta in consultas_agendadas:
-                if consulta['cpf'] == payload.cpf_paciente and consulta['horario'] == payload.data_hora:
-                    raise ValueError("O paciente já possui uma consulta agendada para este mesmo horário.")
-            
-            header = CABECALHO_CONSULTAS
-            file_exists = os.path.exists(self.csv_path_consultas) and os.path.getsize(self.csv_path_consultas) > 0
-            
-            with open(self.csv_path_consultas, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=header)
-                if not file_exists:
-                    writer.writeheader()
+            minutos = para_minutos(payload.data_hora)
+        except (TypeError, ValueError):
+            raise ValueError("Data/hora inválida: use o formato ISO em minuto cheio (ex.: 2025-08-10T09:00:00).")
+        especialidade = self.agenda.chave_especialidade(payload.especialidade)
+        if not especialidade:
+            raise ValueError(f"Especialidade '{payload.especialidade}' não encontrada.")
+        data_hora = para_iso(minutos)
+
+        chave_horario = ('consulta', especialidade.upper(), payload.doutor, data_hora)
+        chave_paciente = ('paciente', normalizar_cpf(payload.cpf_paciente), data_hora)
+        with self.travas.travar(chave_horario, chave_paciente):
+            try:
+                if not self.agenda.horario_livre(especialidade, payload.doutor, minutos):
+                    raise ValueError("Este horário não está disponível para este médico.")
+                for consulta in self.armazenamento.buscar_consultas_por_cpf(payload.cpf_paciente):
+                    if self._minutos_ou_none(consulta['horario']) == minutos:
+                        raise ValueError("O paciente já possui uma consulta agendada para este mesmo horário.")
+
                 new_row = {
                     'cpf': payload.cpf_paciente,
-                    'especialidade': payload.especialidade,
+                    'especialidade': especialidade,
                     'doutor': payload.doutor,
-                    'horario': payload.data_hora
+                    'horario': data_hora
                 }
-                writer.writerow(new_row)
-            return True
-        except ValueError:
-            raise
-        except Exception as e:
-            print(f"ERRO CRÍTICO ao salvar a consulta no CSV: {e}")
-            raise ValueError("Ocorreu um erro interno ao tentar salvar a consulta.")
+                if not self.armazenamento.inserir_consulta(new_row):
+                    raise ValueError("Este horário já foi reservado por outro paciente.")
+                self.agenda.marcar_ocupado(especialidade, payload.doutor, data_hora)
+                return True
+            except ValueError:
+                raise
+            except Exception as e:
+                print(f"ERRO CRÍTICO ao salvar a consulta: {e}")
+                raise ValueError("Ocorreu um erro interno ao tentar salvar a consulta.")
+
+    @staticmethod
+    def _minutos_ou_none(horario: str) -> int | None:
+        try:
+            return para_minutos(horario)
+        except (TypeError, ValueError):
+            return None
 
     def deletar_por_cpf(self, cpf: str) -> bool:
-        cpf_limpo = ''.join(filter(str.isdigit, cpf))
-        pessoas = self._carregar_pessoas()
-        pessoa_encontrada = False
-        pessoas_mantidas = []
-        for pessoa in pessoas:
-            if ''.join(filter(str.isdigit, pessoa.get('cpf', ''))) == cpf_limpo:
-                pessoa_encontrada = True
-            else:
-                pessoas_mantidas.append(pessoa)
-        if not pessoa_encontrada:
-            return False
         try:
-            with open(self.csv_path_cadastros, mode='w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=CABECALHO_CADASTROS)
-                writer.writeheader()
-                writer.writerows(pessoas_mantidas)
-            return True
+            return self.armazenamento.remover_pessoa(cpf)
         except Exception as e:
-            print(f"ERRO ao reescrever o CSV de cadastros após deleção: {e}")
+            print(f"ERRO ao remover o cadastro: {e}")
             return False
 
 pessoas_service_instance = PessoasService()
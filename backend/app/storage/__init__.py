@@ -0,0 +1,28 @@
+# app/storage/__init__.py
+import threading
+from app.config import STORAGE_BACKEND
+from app.storage.base import Armazenamento
+
+_armazenamento: Armazenamento | None = None
+_lock = threading.Lock()
+
+
+def criar_armazenamento(backend: str = STORAGE_BACKEND) -> Armazenamento:
+    """Cria a implementação de armazenamento configurada ('arquivos' ou 'sqlite')."""
+    if backend == 'arquivos':
+        from app.storage.arquivos import ArmazenamentoArquivos
+        return ArmazenamentoArquivos()
+    if backend == 'sqlite':
+        from app.storage.sqlite import ArmazenamentoSQLite
+        return ArmazenamentoSQLite()
+    raise ValueError(f"STORAGE_BACKEND desconhecido: '{backend}'. Use 'arquivos' ou 'sqlite'.")
+
+
+# Singleton: todos os serviços compartilham a mesma instância
+def get_armazenamento() -> Armazenamento:
+    global _armazenamento
+    if _armazenamento is None:
+        with _lock:
+            if _armazenamento is None:
+                _armazenamento = criar_armazenamento()
+    return _armazenamento
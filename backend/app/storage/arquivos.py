@@ -0,0 +1,351 @@
+# app/storage/arquivos.py
+import copy
+import csv
+import json
+import os
+import threading
+from app.config import (URL_AGENDAMENTOS, URL_CONSULTAS, URL_CADASTROS, URL_AGENDAMENTOS_EXAMES,
+                        URL_EXAMES_AGENDADOS, URL_LOG_EXAMES_AGENDADOS, URL_MODELOS_AGENDA, CABECALHO_CONSULTAS,
+                        CABECALHO_CADASTROS, COMPACTACAO_INTERVALO_SEGUNDOS, COMPACTACAO_MAX_REGISTROS)
+from app.services.horarios import para_minutos
+from app.storage.base import Armazenamento
+from app.storage.csv_indexado import CsvIndexado, assinatura_arquivo, normalizar_cpf
+from app.storage.log_append import LogAppendOnly
+
+
+class ArmazenamentoArquivos(Armazenamento):
+    """
+    Implementação sobre os arquivos JSON/CSV da pasta data/ (comportamento original).
+
+    Os agendamentos de exames não reescrevem mais os JSON a cada reserva: cada
+    reserva vira uma linha no log NDJSON e uma thread em segundo plano
+    periodicamente incorpora o log aos snapshots JSON (compactação). Na
+    inicialização o log pendente é reaplicado sobre os snapshots.
+    """
+
+    def __init__(self):
+        self.agendamentos_path = URL_AGENDAMENTOS
+        self.agendamentos_exames_path = URL_AGENDAMENTOS_EXAMES
+        self.exames_agendados_path = URL_EXAMES_AGENDADOS
+        self.cadastros = CsvIndexado(URL_CADASTROS, CABECALHO_CADASTROS, campo_cpf='cpf')
+        self.consultas = CsvIndexado(URL_CONSULTAS, CABECALHO_CONSULTAS, campo_cpf='cpf',
+                                     indices={'horario': self._chave_horario_consulta})
+        # agendamentos.json é reescrito por inteiro: gravações nele não podem se intercalar
+        self._lock_agenda = threading.Lock()
+        self.modelos_path = URL_MODELOS_AGENDA
+        self._lock_modelos = threading.Lock()
+
+        # Estado dos exames em memória: snapshot JSON + registros do log
+        self.log_exames = LogAppendOnly(URL_LOG_EXAMES_AGENDADOS)
+        self._agenda_exames: dict | None = None
+        self._exames_agendados: list[dict] = []
+        self._exames_por_cpf: dict[str, list[dict]] = {}  # CPF normalizado -> agendamentos (mesmos objetos)
+        self._chaves_agendadas: set[tuple] = set()
+        self._horarios_agendados: set[tuple] = set()  # (TIPO_EXAME, local, data_hora) já reservados
+        self._assinatura_exames = None
+        self._lock_exames = threading.RLock()
+        self._lock_compactacao = threading.Lock()
+        self._pedir_compactacao = threading.Event()
+        self._parar = threading.Event()
+        self._thread_compactacao: threading.Thread | None = None
+
+    def inicializar(self):
+        print("Verificando e inicializando arquivos de dados...")
+        for caminho, cabecalho in ((self.cadastros.caminho, CABECALHO_CADASTROS),
+                                   (self.consultas.caminho, CABECALHO_CONSULTAS)):
+            if not os.path.exists(caminho):
+                with open(caminho, 'w', newline='', encoding='utf-8') as f:
+                    csv.writer(f).writerow(cabecalho)
+                print(f"Arquivo '{caminho}' criado.")
+
+        for caminho, vazio in ((self.agendamentos_path, {}),
+                               (self.agendamentos_exames_path, {}),
+                               (self.exames_agendados_path, []),
+                               (self.modelos_path, {'consultas': {}, 'exames': {}})):
+            if not os.path.exists(caminho):
+                self._salvar_json(caminho, vazio)
+                print(f"Arquivo '{caminho}' criado.")
+
+        # Recuperação: reaplica o log pendente e incorpora-o logo aos snapshots
+        with self._lock_exames:
+            self._carregar_estado_exames()
+        self.compactar_exames()
+        if self._thread_compactacao is None:
+            self._parar.clear()
+            self._thread_compactacao = threading.Thread(
+                target=self._laco_compactacao, name='compactacao-exames', daemon=True)
+            self._thread_compactacao.start()
+
+    def encerrar(self):
+        if self._thread_compactacao is not None:
+            self._parar.set()
+            self._pedir_compactacao.set()
+            self._thread_compactacao.join()
+            self._thread_compactacao = None
+        self.compactar_exames()
+        self.log_exames.fechar()
+
+    # --- Utilitários JSON ---
+    def _carregar_json(self, caminho: str, padrao):
+        try:
+            if not os.path.exists(caminho) or os.path.getsize(caminho) == 0:
+                return padrao
+            with open(caminho, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"Erro ao carregar o arquivo JSON '{caminho}': {e}")
+            return padrao
+
+    def _salvar_json(self, caminho: str, dados, indent: int = 2):
+        # Grava em arquivo temporário e troca atomicamente: nunca deixa um JSON pela metade
+        temporario = caminho + '.tmp'
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dados, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+
+    # --- Agenda de consultas ---
+    def carregar_agenda_consultas(self) -> dict[str, dict[str, list[str]]]:
+        return self._carregar_json(self.agendamentos_path, {})
+
+    def adicionar_horario_consulta(self, especialidade: str, medico: str, horario: str) -> bool:
+        with self._lock_agenda:
+            agendamentos = self.carregar_agenda_consultas()
+            horarios = agendamentos.setdefault(especialidade, {}).setdefault(medico, [])
+            if horario in horarios:
+                return False
+            horarios.append(horario)
+            horarios.sort()
+            self._salvar_json(self.agendamentos_path, agendamentos, indent=4)
+            return True
+
+    def adicionar_horarios_consulta(self, horarios: list[tuple[str, str, str]]) -> list[bool]:
+        with self._lock_agenda:
+            agendamentos = self.carregar_agenda_consultas()
+            resultado = self._mesclar_horarios(agendamentos, horarios)
+            if any(resultado):
+                self._salvar_json(self.agendamentos_path, agendamentos, indent=4)
+            return resultado
+
+    @staticmethod
+    def _mesclar_horarios(agenda: dict, horarios: list[tuple[str, str, str]]) -> list[bool]:
+        """Acrescenta os horários novos à agenda em memória (dedup por set) e reordena cada lista alterada uma vez."""
+        existentes: dict[tuple[str, str], set[str]] = {}
+        alterados, resultado = set(), []
+        for grupo, nome, horario in horarios:
+            chave = (grupo, nome)
+            if chave not in existentes:
+                existentes[chave] = set(agenda.get(grupo, {}).get(nome, []))
+            if horario in existentes[chave]:
+                resultado.append(False)
+                continue
+            existentes[chave].add(horario)
+            agenda.setdefault(grupo, {}).setdefault(nome, []).append(horario)
+            alterados.add(chave)
+            resultado.append(True)
+        for grupo, nome in alterados:
+            agenda[grupo][nome].sort()
+        return resultado
+
+    def remover_horario_consulta(self, especialidade: str, medico: str, horario: str) -> bool:
+        with self._lock_agenda:
+            agendamentos = self.carregar_agenda_consultas()
+            horarios = agendamentos.get(especialidade, {}).get(medico)
+            if not horarios or horario not in horarios:
+                return False
+            horarios.remove(horario)
+            if not horarios:
+                del agendamentos[especialidade][medico]
+            if not agendamentos[especialidade]:
+                del agendamentos[especialidade]
+            self._salvar_json(self.agendamentos_path, agendamentos, indent=4)
+            return True
+
+    # --- Consultas marcadas ---
+    def listar_consultas(self) -> list[dict]:
+        return self.consultas.linhas()
+
+    def buscar_consultas_por_cpf(self, cpf: str) -> list[dict]:
+        return self.consultas.buscar(cpf)
+
+    @staticmethod
+    def _chave_horario_consulta(consulta: dict) -> tuple:
+        # Mesma normalização do serviço: especialidade sem caixa e horário em minutos, para que
+        # linhas antigas gravadas em outra grafia também ocupem o horário
+        horario = consulta.get('horario')
+        try:
+            horario = para_minutos(horario)
+        except (TypeError, ValueError):
+            pass
+        return (str(consulta.get('especialidade', '')).upper(), consulta.get('doutor'), horario)
+
+    def inserir_consulta(self, consulta: dict) -> bool:
+        return self.consultas.anexar_se_ausente(consulta, 'horario')
+
+    # --- Pessoas ---
+    def listar_pessoas(self) -> list[dict]:
+        return self.cadastros.linhas()
+
+    def buscar_pessoa(self, cpf: str) -> dict | None:
+        return self.cadastros.buscar_primeiro(cpf)
+
+    def inserir_pessoa(self, pessoa: dict) -> bool:
+        # Verificação e escrita sob a mesma trava: dois cadastros simultâneos do mesmo CPF não passam os dois
+        return self.cadastros.anexar_se_ausente(pessoa, 'cpf')
+
+    def inserir_pessoas(self, pessoas: list[dict]) -> list[bool]:
+        return self.cadastros.anexar_ausentes(pessoas)
+
+    def remover_pessoa(self, cpf: str) -> bool:
+        if not self.cadastros.contem(cpf):
+            return False
+        cpf_limpo = normalizar_cpf(cpf)
+        pessoas_mantidas = [
+            pessoa for pessoa in self.cadastros.linhas()
+            if normalizar_cpf(pessoa.get('cpf')) != cpf_limpo
+        ]
+        self.cadastros.reescrever(pessoas_mantidas)
+        return True
+
+    # --- Exames (snapshot JSON + log de agendamentos) ---
+    def _assinatura_snapshots(self):
+        return (assinatura_arquivo(self.agendamentos_exames_path), assinatura_arquivo(self.exames_agendados_path))
+
+    @staticmethod
+    def _chave_agendamento(agendamento: dict) -> tuple:
+        return (normalizar_cpf(agendamento.get('cpf_paciente')), agendamento.get('tipo_exame'),
+                agendamento.get('local_exame'), agendamento.get('data_hora'))
+
+    @staticmethod
+    def _chave_horario_exame(tipo_exame: str, local_exame: str, horario: str) -> tuple:
+        return ((tipo_exame or '').upper(), local_exame, horario)
+
+    def _aplicar_registro_exame(self, registro: dict):
+        # Idempotente: reaplicar um registro já incorporado ao snapshot não muda nada
+        tipo_exame, local_exame, horario = registro['horario']
+        horarios = self._agenda_exames.get(tipo_exame, {}).get(local_exame)
+        if horarios and horario in horarios:
+            horarios.remove(horario)
+        self._horarios_agendados.add(self._chave_horario_exame(tipo_exame, local_exame, horario))
+        agendamento = registro['agendamento']
+        chave = self._chave_agendamento(agendamento)
+        if chave not in self._chaves_agendadas:
+            self._chaves_agendadas.add(chave)
+            self._exames_agendados.append(agendamento)
+            self._exames_por_cpf.setdefault(chave[0], []).append(agendamento)
+
+    def _carregar_estado_exames(self):
+        self._assinatura_exames = self._assinatura_snapshots()
+        self._agenda_exames = self._carregar_json(self.agendamentos_exames_path, {})
+        self._exames_agendados = self._carregar_json(self.exames_agendados_path, [])
+        self._chaves_agendadas = {self._chave_agendamento(ag) for ag in self._exames_agendados}
+        self._exames_por_cpf = {}
+        for ag in self._exames_agendados:
+            self._exames_por_cpf.setdefault(normalizar_cpf(ag.get('cpf_paciente')), []).append(ag)
+        self._horarios_agendados = {
+            self._chave_horario_exame(ag.get('tipo_exame'), ag.get('local_exame'), ag.get('data_hora'))
+            for ag in self._exames_agendados}
+        for registro in self.log_exames.recuperar():
+            self._aplicar_registro_exame(registro)
+
+    def _sincronizar_exames(self):
+        """Recarrega snapshot + log se os JSON foram editados por fora."""
+        if self._agenda_exames is None or self._assinatura_snapshots() != self._assinatura_exames:
+            self._carregar_estado_exames()
+
+    def carregar_agenda_exames(self) -> dict[str, dict[str, list[str]]]:
+        with self._lock_exames:
+            self._sincronizar_exames()
+            return copy.deepcopy(self._agenda_exames)
+
+    def adicionar_horarios_exame(self, horarios: list[tuple[str, str, str]]) -> list[bool]:
+        # Com o lock de compactação: uma compactação em andamento não pode sobrescrever o snapshot com a agenda antiga
+        with self._lock_compactacao, self._lock_exames:
+            self._sincronizar_exames()
+            resultado = self._mesclar_horarios(self._agenda_exames, horarios)
+            if any(resultado):
+                self._salvar_json(self.agendamentos_exames_path, self._agenda_exames)
+                self._assinatura_exames = self._assinatura_snapshots()
+            return resultado
+
+    def agendar_exame(self, tipo_exame: str, local_exame: str, horario: str, agendamento: dict) -> bool:
+        with self._lock_exames:
+            self._sincronizar_exames()
+            horarios = self._agenda_exames.get(tipo_exame, {}).get(local_exame)
+            if not horarios or horario not in horarios:
+                return False
+            self._registrar_exame(tipo_exame, local_exame, horario, agendamento)
+        return True
+
+    def agendar_exame_do_modelo(self, tipo_exame: str, local_exame: str, horario: str, agendamento: dict) -> bool:
+        with self._lock_exames:
+            self._sincronizar_exames()
+            if self._chave_horario_exame(tipo_exame, local_exame, horario) in self._horarios_agendados:
+                return False
+            self._registrar_exame(tipo_exame, local_exame, horario, agendamento)
+        return True
+
+    def _registrar_exame(self, tipo_exame: str, local_exame: str, horario: str, agendamento: dict):
+        registro = {'horario': [tipo_exame, local_exame, horario], 'agendamento': agendamento}
+        self.log_exames.anexar(registro)
+        self._aplicar_registro_exame(registro)
+        if self.log_exames.total_registros >= COMPACTACAO_MAX_REGISTROS:
+            self._pedir_compactacao.set()
+
+    def listar_exames_agendados(self) -> list[dict]:
+        with self._lock_exames:
+            self._sincronizar_exames()
+            return [dict(ag) for ag in self._exames_agendados]
+
+    def buscar_exames_por_cpf(self, cpf: str) -> list[dict]:
+        with self._lock_exames:
+            self._sincronizar_exames()
+            return [dict(ag) for ag in self._exames_por_cpf.get(normalizar_cpf(cpf), [])]
+
+    # --- Modelos de agenda ---
+    def carregar_modelos_agenda(self, recurso: str) -> dict[str, dict[str, dict]]:
+        return self._carregar_json(self.modelos_path, {}).get(recurso, {})
+
+    def salvar_modelo_agenda(self, recurso: str, grupo: str, nome: str, modelo: dict | None):
+        with self._lock_modelos:
+            modelos = self._carregar_json(self.modelos_path, {})
+            por_grupo = modelos.setdefault(recurso, {}).setdefault(grupo, {})
+            if modelo is None:
+                por_grupo.pop(nome, None)
+                if not por_grupo:
+                    del modelos[recurso][grupo]
+            else:
+                por_grupo[nome] = modelo
+            self._salvar_json(self.modelos_path, modelos)
+
+    # --- Compactação ---
+    def compactar_exames(self):
+        """Incorpora o log de agendamentos aos snapshots JSON e descarta o log incorporado."""
+        with self._lock_compactacao:
+            with self._lock_exames:
+                self._sincronizar_exames()
+                pendente = os.path.exists(self.log_exames.caminho_rotacionado)
+                if self.log_exames.total_registros == 0 and not pendente:
+                    return
+                agenda = copy.deepcopy(self._agenda_exames)
+                agendados = list(self._exames_agendados)
+                self.log_exames.rotacionar()
+
+            # Fora do lock de exames: novas reservas seguem para o log novo enquanto o snapshot é gravado
+            self._salvar_json(self.agendamentos_exames_path, agenda)
+            self._salvar_json(self.exames_agendados_path, agendados)
+            self.log_exames.descartar_rotacionado()
+            with self._lock_exames:
+                self._assinatura_exames = self._assinatura_snapshots()
+
+    def _laco_compactacao(self):
+        while not self._parar.is_set():
+            self._pedir_compactacao.wait(COMPACTACAO_INTERVALO_SEGUNDOS)
+            self._pedir_compactacao.clear()
+            if self._parar.is_set():
+                break
+            try:
+                self.compactar_exames()
+            except Exception as e:
+                print(f"Erro na compactação do log de exames agendados: {e}")
@@ -0,0 +1,95 @@
+# app/storage/base.py
+from abc import ABC, abstractmethod
+
+
+class Armazenamento(ABC):
+    """
+    Contrato de persistência usado pelos serviços.
+
+    Formatos trocados com os serviços (iguais aos arquivos originais):
+    - agenda de consultas: {especialidade: {medico: [horario_iso, ...]}}
+    - agenda de exames:    {tipo_exame: {local_exame: [horario_iso, ...]}}
+    - consulta:            {'cpf', 'especialidade', 'doutor', 'horario'}
+    - pessoa:              {'nome', 'idade', 'sexo', 'cpf', 'telefone', 'email'}
+    - exame agendado:      {'cpf_paciente', 'tipo_exame', 'local_exame', 'data_hora'}
+    - modelos de agenda:   {grupo: {nome: modelo}} por recurso ('consultas': especialidade -> médico,
+                           'exames': tipo_exame -> local); formato do modelo em app/services/modelos_agenda.py
+    """
+
+    def inicializar(self):
+        """Cria a estrutura de armazenamento (arquivos, tabelas) se ainda não existir."""
+
+    def encerrar(self):
+        """Grava o que estiver pendente e libera recursos no desligamento da API."""
+
+    # --- Agenda de consultas (horários ofertados pelos médicos) ---
+    @abstractmethod
+    def carregar_agenda_consultas(self) -> dict[str, dict[str, list[str]]]: ...
+
+    @abstractmethod
+    def adicionar_horario_consulta(self, especialidade: str, medico: str, horario: str) -> bool: ...
+
+    @abstractmethod
+    def adicionar_horarios_consulta(self, horarios: list[tuple[str, str, str]]) -> list[bool]:
+        """Adiciona vários (especialidade, medico, horario) numa única gravação; False para os que já existiam."""
+
+    @abstractmethod
+    def remover_horario_consulta(self, especialidade: str, medico: str, horario: str) -> bool: ...
+
+    # --- Consultas marcadas ---
+    @abstractmethod
+    def listar_consultas(self) -> list[dict]: ...
+
+    @abstractmethod
+    def buscar_consultas_por_cpf(self, cpf: str) -> list[dict]: ...
+
+    @abstractmethod
+    def inserir_consulta(self, consulta: dict) -> bool:
+        """Registra a consulta; False se o horário (especialidade, doutor, horario) já estiver ocupado."""
+
+    # --- Pessoas ---
+    @abstractmethod
+    def listar_pessoas(self) -> list[dict]: ...
+
+    @abstractmethod
+    def buscar_pessoa(self, cpf: str) -> dict | None: ...
+
+    @abstractmethod
+    def inserir_pessoa(self, pessoa: dict) -> bool: ...
+
+    @abstractmethod
+    def inserir_pessoas(self, pessoas: list[dict]) -> list[bool]:
+        """Insere várias pessoas numa única gravação; False para CPFs já cadastrados ou repetidos no lote."""
+
+    @abstractmethod
+    def remover_pessoa(self, cpf: str) -> bool: ...
+
+    # --- Agenda de exames e exames marcados ---
+    @abstractmethod
+    def carregar_agenda_exames(self) -> dict[str, dict[str, list[str]]]: ...
+
+    @abstractmethod
+    def adicionar_horarios_exame(self, horarios: list[tuple[str, str, str]]) -> list[bool]:
+        """Adiciona vários (tipo_exame, local_exame, horario) numa única gravação; False para os que já existiam."""
+
+    @abstractmethod
+    def agendar_exame(self, tipo_exame: str, local_exame: str, horario: str, agendamento: dict) -> bool:
+        """Ocupa o horário (tipo_exame, local_exame, horario) e registra o agendamento; False se o horário não estiver livre."""
+
+    @abstractmethod
+    def agendar_exame_do_modelo(self, tipo_exame: str, local_exame: str, horario: str, agendamento: dict) -> bool:
+        """Registra o agendamento de um horário gerado por modelo (não há linha na agenda a ocupar); False se já agendado."""
+
+    @abstractmethod
+    def listar_exames_agendados(self) -> list[dict]: ...
+
+    @abstractmethod
+    def buscar_exames_por_cpf(self, cpf: str) -> list[dict]: ...
+
+    # --- Modelos de agenda recorrentes ---
+    @abstractmethod
+    def carregar_modelos_agenda(self, recurso: str) -> dict[str, dict[str, dict]]: ...
+
+    @abstractmethod
+    def salvar_modelo_agenda(self, recurso: str, grupo: str, nome: str, modelo: dict | None):
+        """Grava (ou, com modelo=None, remove) o modelo de um médico/local."""
@@ -0,0 +1,163 @@
+# app/storage/csv_indexado.py
+import csv
+import os
+import threading
+from collections.abc import Callable, Hashable
+
+
+def normalizar_cpf(cpf: str | None) -> str:
+    """Remove tudo que não for dígito do CPF."""
+    return ''.join(filter(str.isdigit, cpf or ''))
+
+
+def assinatura_arquivo(caminho: str) -> tuple[int, int] | None:
+    """(mtime, tamanho) do arquivo; muda sempre que alguém o reescreve."""
+    try:
+        st = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class CsvIndexado:
+    """
+    Mantém um arquivo CSV carregado em memória com um índice por CPF normalizado.
+
+    O arquivo é lido uma única vez e só é relido quando o mtime ou o tamanho mudam
+    (edição externa). Linhas anexadas por este processo atualizam o índice
+    diretamente, sem reler o arquivo. Índices extras podem ser declarados em
+    `indices` ({nome: função que extrai a chave da linha}).
+    """
+
+    def __init__(self, caminho: str, cabecalho: list[str], campo_cpf: str = 'cpf',
+                 indices: dict[str, Callable[[dict], Hashable]] | None = None):
+        self.caminho = caminho
+        self.cabecalho = cabecalho
+        self.campo_cpf = campo_cpf
+        self._linhas: list[dict] = []
+        self._por_cpf: dict[str, list[dict]] = {}
+        self._funcoes_indice = indices or {}
+        self._indices: dict[str, dict[Hashable, list[dict]]] = {nome: {} for nome in self._funcoes_indice}
+        self._assinatura: tuple[int, int] | None = None
+        self._lock = threading.RLock()
+
+    def _garantir_arquivo(self):
+        if not os.path.exists(self.caminho) or os.path.getsize(self.caminho) == 0:
+            with open(self.caminho, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.cabecalho)
+
+    def _indexar(self, linha: dict):
+        cpf = normalizar_cpf(linha.get(self.campo_cpf))
+        self._por_cpf.setdefault(cpf, []).append(linha)
+        for nome, funcao in self._funcoes_indice.items():
+            self._indices[nome].setdefault(funcao(linha), []).append(linha)
+
+    def _recarregar(self):
+        linhas = []
+        try:
+            self._garantir_arquivo()
+            with open(self.caminho, mode='r', encoding='utf-8') as f:
+                linhas = list(csv.DictReader(f))
+        except Exception as e:
+            print(f"Erro ao carregar o arquivo CSV '{self.caminho}': {e}")
+        self._linhas = linhas
+        self._por_cpf = {}
+        self._indices = {nome: {} for nome in self._funcoes_indice}
+        for linha in linhas:
+            self._indexar(linha)
+        self._assinatura = assinatura_arquivo(self.caminho)
+
+    def _sincronizar(self):
+        """Relê o arquivo apenas se ele mudou desde a última leitura/escrita."""
+        if self._assinatura is None or assinatura_arquivo(self.caminho) != self._assinatura:
+            self._recarregar()
+
+    def linhas(self) -> list[dict]:
+        with self._lock:
+            self._sincronizar()
+            return [dict(linha) for linha in self._linhas]
+
+    def buscar(self, cpf: str) -> list[dict]:
+        with self._lock:
+            self._sincronizar()
+            return [dict(linha) for linha in self._por_cpf.get(normalizar_cpf(cpf), [])]
+
+    def buscar_primeiro(self, cpf: str) -> dict | None:
+        with self._lock:
+            self._sincronizar()
+            linhas = self._por_cpf.get(normalizar_cpf(cpf))
+            return dict(linhas[0]) if linhas else None
+
+    def contem(self, cpf: str) -> bool:
+        with self._lock:
+            self._sincronizar()
+            return normalizar_cpf(cpf) in self._por_cpf
+
+    def contem_chave(self, indice: str, chave: Hashable) -> bool:
+        with self._lock:
+            self._sincronizar()
+            return chave in self._indices[indice]
+
+    def anexar_se_ausente(self, linha: dict, indice: str) -> bool:
+        """
+        Compare-and-swap: anexa a linha só se a chave dela ainda não existir no índice.
+        `indice` é um dos índices extras ou `campo_cpf` (o índice por CPF normalizado).
+        """
+        with self._lock:
+            self._sincronizar()
+            if indice == self.campo_cpf:
+                existe = normalizar_cpf(linha.get(self.campo_cpf)) in self._por_cpf
+            else:
+                existe = self._funcoes_indice[indice](linha) in self._indices[indice]
+            if existe:
+                return False
+            self.anexar(linha)
+            return True
+
+    def anexar(self, linha: dict):
+        """Anexa uma linha ao final do arquivo e atualiza o índice incrementalmente."""
+        with self._lock:
+            self._sincronizar()
+            with open(self.caminho, mode='a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.cabecalho)
+                writer.writerow(linha)
+            linha = {campo: str(linha.get(campo, '')) for campo in self.cabecalho}
+            self._linhas.append(linha)
+            self._indexar(linha)
+            self._assinatura = assinatura_arquivo(self.caminho)
+
+    def anexar_ausentes(self, linhas: list[dict]) -> list[bool]:
+        """
+        Anexa, numa única escrita, as linhas cujo CPF ainda não está no arquivo nem
+        apareceu antes no próprio lote (um único set de CPFs); False para as demais.
+        """
+        with self._lock:
+            self._sincronizar()
+            cpfs = set(self._por_cpf)
+            aceitas, resultado = [], []
+            for linha in linhas:
+                cpf = normalizar_cpf(linha.get(self.campo_cpf))
+                if cpf in cpfs:
+                    resultado.append(False)
+                    continue
+                cpfs.add(cpf)
+                aceitas.append({campo: str(linha.get(campo, '')) for campo in self.cabecalho})
+                resultado.append(True)
+            if aceitas:
+                with open(self.caminho, mode='a', newline='', encoding='utf-8') as f:
+                    csv.DictWriter(f, fieldnames=self.cabecalho).writerows(aceitas)
+                for linha in aceitas:
+                    self._linhas.append(linha)
+                    self._indexar(linha)
+                self._assinatura = assinatura_arquivo(self.caminho)
+            return resultado
+
+    def reescrever(self, linhas: list[dict]):
+        """Substitui todo o conteúdo do arquivo e reconstrói o índice."""
+        with self._lock:
+            with open(self.caminho, mode='w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.cabecalho)
+                writer.writeheader()
+                writer.writerows(linhas)
+            self._recarregar()
@@ -0,0 +1,97 @@
+# app/storage/log_append.py
+import json
+import os
+import threading
+
+
+class LogAppendOnly:
+    """
+    Log de registros JSON, um por linha (NDJSON), gravado só por anexação.
+
+    Cada registro é gravado com flush + fsync antes de retornar, então o custo de
+    uma gravação é constante e não depende do tamanho do histórico. Na compactação
+    o log é rotacionado para '<caminho>.compactando' e novos registros continuam
+    no log principal enquanto o snapshot é gravado.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.caminho_rotacionado = caminho + '.compactando'
+        self.total_registros = 0
+        self._arquivo = None
+        self._lock = threading.Lock()
+
+    def _abrir(self):
+        if self._arquivo is None:
+            self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+
+    def _fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    @staticmethod
+    def _ler_arquivo(caminho: str, reparar: bool = False) -> list[dict]:
+        """Lê os registros completos; uma última linha truncada (queda no meio da escrita) é descartada."""
+        if not os.path.exists(caminho):
+            return []
+        registros = []
+        fim_valido = 0
+        with open(caminho, 'rb') as f:
+            for linha in f:
+                if not linha.endswith(b'\n'):
+                    break
+                try:
+                    registros.append(json.loads(linha))
+                except json.JSONDecodeError:
+                    break
+                fim_valido += len(linha)
+            tamanho = f.seek(0, os.SEEK_END)
+        if reparar and fim_valido < tamanho:
+            print(f"Aviso: descartando {tamanho - fim_valido} bytes incompletos no fim de '{caminho}'.")
+            with open(caminho, 'r+b') as f:
+                f.truncate(fim_valido)
+        return registros
+
+    def recuperar(self) -> list[dict]:
+        """Retorna os registros pendentes (de uma compactação interrompida e do log atual), em ordem."""
+        with self._lock:
+            self._fechar()
+            registros = self._ler_arquivo(self.caminho_rotacionado) + self._ler_arquivo(self.caminho, reparar=True)
+            self.total_registros = len(registros)
+            return registros
+
+    def anexar(self, registro: dict):
+        linha = json.dumps(registro, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._abrir()
+            self._arquivo.write(linha)
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self.total_registros += 1
+
+    def rotacionar(self):
+        """Move o log atual para o arquivo de compactação e recomeça um log vazio."""
+        with self._lock:
+            self._fechar()
+            if os.path.exists(self.caminho):
+                if os.path.exists(self.caminho_rotacionado):
+                    # Sobra de uma compactação interrompida: junta os dois em ordem
+                    with open(self.caminho, 'rb') as origem, open(self.caminho_rotacionado, 'ab') as destino:
+                        destino.write(origem.read())
+                        destino.flush()
+                        os.fsync(destino.fileno())
+                    os.remove(self.caminho)
+                else:
+                    os.replace(self.caminho, self.caminho_rotacionado)
+            self.total_registros = 0
+
+    def descartar_rotacionado(self):
+        """Chamado depois que o snapshot com os registros rotacionados foi gravado."""
+        with self._lock:
+            if os.path.exists(self.caminho_rotacionado):
+                os.remove(self.caminho_rotacionado)
+
+    def fechar(self):
+        with self._lock:
+            self._fechar()
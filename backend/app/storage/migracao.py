@@ -0,0 +1,66 @@
+# app/storage/migracao.py
+"""
+Importa os arquivos da pasta data/ para o banco SQLite.
+
+Uso (a partir da pasta backend/):
+    python -m app.storage.migracao [--destino caminho/para/clinica.db]
+"""
+import argparse
+import os
+from app.config import URL_SQLITE
+from app.storage.arquivos import ArmazenamentoArquivos
+from app.storage.sqlite import ArmazenamentoSQLite
+
+
+def migrar(destino: str = URL_SQLITE) -> dict[str, int]:
+    origem = ArmazenamentoArquivos()
+    if os.path.exists(destino):
+        raise FileExistsError(f"O banco '{destino}' já existe. Remova-o antes de migrar novamente.")
+    banco = ArmazenamentoSQLite(destino)
+
+    agenda_consultas = origem.carregar_agenda_consultas()
+    agenda_exames = origem.carregar_agenda_exames()
+    horarios_consulta, horarios_exame = banco.importar_agendas(agenda_consultas, agenda_exames)
+    total_modelos = 0
+    for recurso in ('consultas', 'exames'):
+        for grupo, modelos in origem.carregar_modelos_agenda(recurso).items():
+            for nome, modelo in modelos.items():
+                banco.salvar_modelo_agenda(recurso, grupo, nome, modelo)
+                total_modelos += 1
+
+    pessoas = origem.listar_pessoas()
+    pessoas_importadas = sum(1 for pessoa in pessoas if banco.inserir_pessoa(pessoa))
+    consultas = origem.listar_consultas()
+    consultas_importadas = banco.inserir_consultas(consultas)
+    exames = origem.listar_exames_agendados()
+    banco.inserir_exames_agendados(exames)
+
+    # Linhas repetidas (mesmo CPF, mesmo horário) são ignoradas pelo banco; o relatório conta o que entrou
+    total_horarios_consulta = sum(len(h) for medicos in agenda_consultas.values() for h in medicos.values())
+    total_horarios_exame = sum(len(h) for locais in agenda_exames.values() for h in locais.values())
+    return {
+        'horarios_consulta': horarios_consulta,
+        'horarios_consulta_ignorados': total_horarios_consulta - horarios_consulta,
+        'horarios_exame': horarios_exame,
+        'horarios_exame_ignorados': total_horarios_exame - horarios_exame,
+        'modelos_agenda': total_modelos,
+        'pessoas': pessoas_importadas,
+        'pessoas_ignoradas': len(pessoas) - pessoas_importadas,
+        'consultas': consultas_importadas,
+        'consultas_ignoradas': len(consultas) - consultas_importadas,
+        'exames_agendados': len(exames),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa os arquivos de data/ para o SQLite.")
+    parser.add_argument('--destino', default=URL_SQLITE, help="Caminho do banco SQLite a ser criado.")
+    args = parser.parse_args()
+
+    totais = migrar(args.destino)
+    print(f"Migração concluída para '{args.destino}':")
+    for tabela, total in totais.items():
+        print(f"  {tabela}: {total}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+# app/storage/sqlite.py
+import json
+import sqlite3
+import threading
+from app.config import URL_SQLITE
+from app.storage.base import Armazenamento
+from app.storage.csv_indexado import normalizar_cpf
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pessoas (
+    cpf_norm TEXT PRIMARY KEY,
+    cpf TEXT NOT NULL,
+    nome TEXT,
+    idade INTEGER,
+    sexo TEXT,
+    telefone TEXT,
+    email TEXT
+);
+
+CREATE TABLE IF NOT EXISTS horarios_consulta (
+    id INTEGER PRIMARY KEY,
+    especialidade TEXT NOT NULL,
+    medico TEXT NOT NULL,
+    data_hora TEXT NOT NULL,
+    UNIQUE (especialidade, medico, data_hora)
+);
+CREATE INDEX IF NOT EXISTS idx_horarios_consulta_data_hora ON horarios_consulta (data_hora);
+
+CREATE TABLE IF NOT EXISTS consultas (
+    id INTEGER PRIMARY KEY,
+    cpf_norm TEXT NOT NULL,
+    cpf TEXT NOT NULL,
+    especialidade TEXT NOT NULL,
+    medico TEXT NOT NULL,
+    data_hora TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_consultas_cpf ON consultas (cpf_norm);
+
+CREATE TABLE IF NOT EXISTS horarios_exame (
+    id INTEGER PRIMARY KEY,
+    tipo_exame TEXT NOT NULL,
+    local_exame TEXT NOT NULL,
+    data_hora TEXT NOT NULL,
+    UNIQUE (tipo_exame, local_exame, data_hora)
+);
+CREATE INDEX IF NOT EXISTS idx_horarios_exame_data_hora ON horarios_exame (data_hora);
+
+CREATE TABLE IF NOT EXISTS exames_agendados (
+    id INTEGER PRIMARY KEY,
+    cpf_norm TEXT NOT NULL,
+    cpf_paciente TEXT NOT NULL,
+    tipo_exame TEXT NOT NULL,
+    local_exame TEXT NOT NULL,
+    data_hora TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_exames_agendados_cpf ON exames_agendados (cpf_norm);
+CREATE INDEX IF NOT EXISTS idx_exames_agendados_slot ON exames_agendados (tipo_exame, local_exame, data_hora);
+
+-- Regras recorrentes: uma linha por médico/local, com o modelo em JSON
+CREATE TABLE IF NOT EXISTS modelos_agenda (
+    recurso TEXT NOT NULL,
+    grupo TEXT NOT NULL,
+    nome TEXT NOT NULL,
+    modelo TEXT NOT NULL,
+    PRIMARY KEY (recurso, grupo, nome)
+);
+"""
+
+# Um horário de médico só pode ser ocupado uma vez (compare-and-swap pelo INSERT). A chave é
+# normalizada como no serviço (especialidade sem caixa, horário pelo valor e não pela grafia),
+# então '...T09:00' e '...T09:00:00' colidem. Criado à parte do ESQUEMA para que um banco que já
+# tenha consultas duplicadas falhe com uma mensagem clara.
+CHAVE_HORARIO_CONSULTA = "UPPER(especialidade), medico, COALESCE(datetime(data_hora), data_hora)"
+INDICE_HORARIO_CONSULTA = f"CREATE UNIQUE INDEX IF NOT EXISTS uq_consultas_horario ON consultas ({CHAVE_HORARIO_CONSULTA})"
+
+
+class ArmazenamentoSQLite(Armazenamento):
+    """
+    Implementação sobre um banco SQLite embutido em modo WAL.
+
+    Cada thread usa a sua própria conexão: no modo WAL vários leitores convivem
+    com um escritor, então as leituras das rotas não esperam pelas gravações.
+    """
+
+    def __init__(self, caminho: str = URL_SQLITE):
+        self.caminho = caminho
+        self._local = threading.local()
+        self.inicializar()
+
+    def _conexao(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def inicializar(self):
+        conn = self._conexao()
+        conn.executescript(ESQUEMA)
+        try:
+            conn.execute(INDICE_HORARIO_CONSULTA)
+        except sqlite3.IntegrityError:
+            duplicadas = conn.execute(
+                f"SELECT especialidade, medico, data_hora, COUNT(*) AS total FROM consultas "
+                f"GROUP BY {CHAVE_HORARIO_CONSULTA} HAVING COUNT(*) > 1").fetchall()
+            descricao = '; '.join(f"{d['especialidade']}/{d['medico']} em {d['data_hora']} ({d['total']}x)"
+                                  for d in duplicadas)
+            raise RuntimeError(
+                f"O banco '{self.caminho}' tem consultas duplicadas no mesmo horário, o que impede criar o "
+                f"índice único uq_consultas_horario. Remova as duplicadas da tabela consultas e reinicie: {descricao}")
+        conn.commit()
+
+    def _agrupar(self, linhas, chave1: str, chave2: str) -> dict[str, dict[str, list[str]]]:
+        # Mantém a ordem de inserção das chaves (ordem do JSON original) e ordena os horários
+        agrupado: dict[str, dict[str, list[str]]] = {}
+        for linha in linhas:
+            agrupado.setdefault(linha[chave1], {}).setdefault(linha[chave2], []).append(linha['data_hora'])
+        for por_recurso in agrupado.values():
+            for horarios in por_recurso.values():
+                horarios.sort()
+        return agrupado
+
+    # --- Agenda de consultas ---
+    def carregar_agenda_consultas(self) -> dict[str, dict[str, list[str]]]:
+        linhas = self._conexao().execute(
+            "SELECT especialidade, medico, data_hora FROM horarios_consulta ORDER BY id").fetchall()
+        return self._agrupar(linhas, 'especialidade', 'medico')
+
+    def adicionar_horario_consulta(self, especialidade: str, medico: str, horario: str) -> bool:
+        with self._conexao() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO horarios_consulta (especialidade, medico, data_hora) VALUES (?, ?, ?)",
+                (especialidade, medico, horario))
+            return cursor.rowcount == 1
+
+    def adicionar_horarios_consulta(self, horarios: list[tuple[str, str, str]]) -> list[bool]:
+        return self._inserir_horarios(
+            "INSERT OR IGNORE INTO horarios_consulta (especialidade, medico, data_hora) VALUES (?, ?, ?)", horarios)
+
+    def _inserir_horarios(self, sql: str, horarios: list[tuple[str, str, str]]) -> list[bool]:
+        # Uma transação para o lote inteiro; o rowcount de cada INSERT OR IGNORE diz se a linha era nova
+        with self._conexao() as conn:
+            return [conn.execute(sql, horario).rowcount == 1 for horario in horarios]
+
+    def remover_horario_consulta(self, especialidade: str, medico: str, horario: str) -> bool:
+        with self._conexao() as conn:
+            cursor = conn.execute(
+                "DELETE FROM horarios_consulta WHERE especialidade = ? AND medico = ? AND data_hora = ?",
+                (especialidade, medico, horario))
+            return cursor.rowcount > 0
+
+    # --- Consultas marcadas ---
+    def _consulta_para_dict(self, linha) -> dict:
+        return {'cpf': linha['cpf'], 'especialidade': linha['especialidade'],
+                'doutor': linha['medico'], 'horario': linha['data_hora']}
+
+    def listar_consultas(self) -> list[dict]:
+        linhas = self._conexao().execute(
+            "SELECT cpf, especialidade, medico, data_hora FROM consultas ORDER BY id").fetchall()
+        return [self._consulta_para_dict(linha) for linha in linhas]
+
+    def buscar_consultas_por_cpf(self, cpf: str) -> list[dict]:
+        linhas = self._conexao().execute(
+            "SELECT cpf, especialidade, medico, data_hora FROM consultas WHERE cpf_norm = ? ORDER BY id",
+            (normalizar_cpf(cpf),)).fetchall()
+        return [self._consulta_para_dict(linha) for linha in linhas]
+
+    def inserir_consulta(self, consulta: dict) -> bool:
+        try:
+            with self._conexao() as conn:
+                conn.execute(
+                    "INSERT INTO consultas (cpf_norm, cpf, especialidade, medico, data_hora) VALUES (?, ?, ?, ?, ?)",
+                    (normalizar_cpf(consulta['cpf']), consulta['cpf'], consulta['especialidade'],
+                     consulta['doutor'], consulta['horario']))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def inserir_consultas(self, consultas: list[dict]) -> int:
+        """Importa as consultas; as que repetem um horário já ocupado são ignoradas. Devolve quantas entraram."""
+        with self._conexao() as conn:
+            return conn.executemany(
+                "INSERT OR IGNORE INTO consultas (cpf_norm, cpf, especialidade, medico, data_hora) VALUES (?, ?, ?, ?, ?)",
+                [(normalizar_cpf(c['cpf']), c['cpf'], c['especialidade'], c['doutor'], c['horario'])
+                 for c in consultas]).rowcount
+
+    # --- Pessoas ---
+    def _pessoa_para_dict(self, linha) -> dict:
+        return {campo: linha[campo] for campo in ('nome', 'idade', 'sexo', 'cpf', 'telefone', 'email')}
+
+    def listar_pessoas(self) -> list[dict]:
+        linhas = self._conexao().execute("SELECT * FROM pessoas ORDER BY rowid").fetchall()
+        return [self._pessoa_para_dict(linha) for linha in linhas]
+
+    def buscar_pessoa(self, cpf: str) -> dict | None:
+        linha = self._conexao().execute(
+            "SELECT * FROM pessoas WHERE cpf_norm = ?", (normalizar_cpf(cpf),)).fetchone()
+        return self._pessoa_para_dict(linha) if linha else None
+
+    def inserir_pessoa(self, pessoa: dict) -> bool:
+        with self._conexao() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO pessoas (cpf_norm, cpf, nome, idade, sexo, telefone, email) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalizar_cpf(pessoa['cpf']), pessoa['cpf'], pessoa.get('nome'), pessoa.get('idade'),
+                 pessoa.get('sexo'), pessoa.get('telefone'), pessoa.get('email')))
+            return cursor.rowcount == 1
+
+    def inserir_pessoas(self, pessoas: list[dict]) -> list[bool]:
+        # Uma transação para o lote; a chave primária cpf_norm descarta os repetidos (INSERT OR IGNORE)
+        with self._conexao() as conn:
+            return [conn.execute(
+                "INSERT OR IGNORE INTO pessoas (cpf_norm, cpf, nome, idade, sexo, telefone, email) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalizar_cpf(p['cpf']), p['cpf'], p.get('nome'), p.get('idade'), p.get('sexo'),
+                 p.get('telefone'), p.get('email'))).rowcount == 1 for p in pessoas]
+
+    def remover_pessoa(self, cpf: str) -> bool:
+        with self._conexao() as conn:
+            cursor = conn.execute("DELETE FROM pessoas WHERE cpf_norm = ?", (normalizar_cpf(cpf),))
+            return cursor.rowcount > 0
+
+    # --- Exames ---
+    def carregar_agenda_exames(self) -> dict[str, dict[str, list[str]]]:
+        linhas = self._conexao().execute(
+            "SELECT tipo_exame, local_exame, data_hora FROM horarios_exame ORDER BY id").fetchall()
+        return self._agrupar(linhas, 'tipo_exame', 'local_exame')
+
+    def adicionar_horarios_exame(self, horarios: list[tuple[str, str, str]]) -> list[bool]:
+        return self._inserir_horarios(
+            "INSERT OR IGNORE INTO horarios_exame (tipo_exame, local_exame, data_hora) VALUES (?, ?, ?)", horarios)
+
+    def agendar_exame(self, tipo_exame: str, local_exame: str, horario: str, agendamento: dict) -> bool:
+        with self._conexao() as conn:
+            cursor = conn.execute(
+                "DELETE FROM horarios_exame WHERE tipo_exame = ? AND local_exame = ? AND data_hora = ?",
+                (tipo_exame, local_exame, horario))
+            if cursor.rowcount == 0:
+                return False
+            self._inserir_exames_agendados(conn, [agendamento])
+            return True
+
+    def agendar_exame_do_modelo(self, tipo_exame: str, local_exame: str, horario: str, agendamento: dict) -> bool:
+        with self._conexao() as conn:
+            # BEGIN IMMEDIATE: a verificação e a inserção ficam na mesma transação de escrita
+            conn.execute("BEGIN IMMEDIATE")
+            # `tipo_exame` é o nome canônico (o serviço resolve a grafia e grava o agendamento com ele),
+            # então a comparação é direta e usa idx_exames_agendados_slot
+            ocupado = conn.execute(
+                "SELECT 1 FROM exames_agendados WHERE tipo_exame = ? AND local_exame = ? AND data_hora = ?",
+                (tipo_exame, local_exame, horario)).fetchone()
+            if ocupado:
+                return False
+            self._inserir_exames_agendados(conn, [agendamento])
+            return True
+
+    def _exame_para_dict(self, linha) -> dict:
+        return {campo: linha[campo] for campo in ('cpf_paciente', 'tipo_exame', 'local_exame', 'data_hora')}
+
+    def listar_exames_agendados(self) -> list[dict]:
+        linhas = self._conexao().execute("SELECT * FROM exames_agendados ORDER BY id").fetchall()
+        return [self._exame_para_dict(linha) for linha in linhas]
+
+    def buscar_exames_por_cpf(self, cpf: str) -> list[dict]:
+        linhas = self._conexao().execute(
+            "SELECT * FROM exames_agendados WHERE cpf_norm = ? ORDER BY id", (normalizar_cpf(cpf),)).fetchall()
+        return [self._exame_para_dict(linha) for linha in linhas]
+
+    def _inserir_exames_agendados(self, conn: sqlite3.Connection, agendamentos: list[dict]):
+        conn.executemany(
+            "INSERT INTO exames_agendados (cpf_norm, cpf_paciente, tipo_exame, local_exame, data_hora) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(normalizar_cpf(a['cpf_paciente']), a['cpf_paciente'], a['tipo_exame'], a['local_exame'],
+              a['data_hora']) for a in agendamentos])
+
+    def inserir_exames_agendados(self, agendamentos: list[dict]):
+        with self._conexao() as conn:
+            self._inserir_exames_agendados(conn, agendamentos)
+
+    # --- Modelos de agenda ---
+    def carregar_modelos_agenda(self, recurso: str) -> dict[str, dict[str, dict]]:
+        modelos: dict[str, dict[str, dict]] = {}
+        for linha in self._conexao().execute(
+                "SELECT grupo, nome, modelo FROM modelos_agenda WHERE recurso = ? ORDER BY rowid", (recurso,)):
+            modelos.setdefault(linha['grupo'], {})[linha['nome']] = json.loads(linha['modelo'])
+        return modelos
+
+    def salvar_modelo_agenda(self, recurso: str, grupo: str, nome: str, modelo: dict | None):
+        with self._conexao() as conn:
+            if modelo is None:
+                conn.execute("DELETE FROM modelos_agenda WHERE recurso = ? AND grupo = ? AND nome = ?",
+                             (recurso, grupo, nome))
+            else:
+                conn.execute("INSERT OR REPLACE INTO modelos_agenda (recurso, grupo, nome, modelo) VALUES (?, ?, ?, ?)",
+                             (recurso, grupo, nome, json.dumps(modelo, ensure_ascii=False)))
+
+    # --- Importação em lote (usada pela migração) ---
+    def importar_agendas(self, agenda_consultas: dict, agenda_exames: dict) -> tuple[int, int]:
+        """Importa as agendas, ignorando horários repetidos; devolve (horários de consulta, de exame) inseridos."""
+        with self._conexao() as conn:
+            consultas = conn.executemany(
+                "INSERT OR IGNORE INTO horarios_consulta (especialidade, medico, data_hora) VALUES (?, ?, ?)",
+                [(esp, medico, h) for esp, medicos in agenda_consultas.items()
+                 for medico, horarios in medicos.items() for h in horarios]).rowcount
+            exames = conn.executemany(
+                "INSERT OR IGNORE INTO horarios_exame (tipo_exame, local_exame, data_hora) VALUES (?, ?, ?)",
+                [(tipo, local, h) for tipo, locais in agenda_exames.items()
+                 for local, horarios in locais.items() for h in horarios]).rowcount
+            return consultas, exames
@@ -0,0 +1,99 @@
+# app/travas.py
+import threading
+from collections.abc import Callable, Hashable
+from contextlib import contextmanager
+from typing import Any
+
+
+class TravasPorChave:
+    """
+    Uma trava (lock) por chave, criada sob demanda e descartada quando ninguém mais a usa.
+
+    Usada para serializar apenas operações que disputam o mesmo recurso, ex.:
+    ('consulta', especialidade, medico, horario). Agendamentos de médicos ou
+    horários diferentes seguem em paralelo.
+    """
+
+    def __init__(self):
+        self._travas: dict[Hashable, list] = {}  # chave -> [Lock, quantidade de usuários]
+        self._mutex = threading.Lock()
+
+    def _obter(self, chave: Hashable) -> threading.Lock:
+        with self._mutex:
+            entrada = self._travas.get(chave)
+            if entrada is None:
+                entrada = self._travas[chave] = [threading.Lock(), 0]
+            entrada[1] += 1
+            return entrada[0]
+
+    def _liberar(self, chave: Hashable):
+        with self._mutex:
+            entrada = self._travas[chave]
+            entrada[0].release()
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                del self._travas[chave]
+
+    @contextmanager
+    def travar(self, *chaves: Hashable):
+        """Adquire as travas de todas as chaves, sempre na mesma ordem (evita deadlock)."""
+        adquiridas = []
+        try:
+            for chave in sorted(set(chaves)):
+                self._obter(chave).acquire()
+                adquiridas.append(chave)
+            yield
+        finally:
+            for chave in reversed(adquiridas):
+                self._liberar(chave)
+
+    def __len__(self) -> int:
+        with self._mutex:
+            return len(self._travas)
+
+
+class _Execucao:
+    __slots__ = ('pronta', 'resultado', 'erro')
+
+    def __init__(self):
+        self.pronta = threading.Event()
+        self.resultado = None
+        self.erro: BaseException | None = None
+
+
+class ExecucaoUnica:
+    """
+    Coalescência de leituras idênticas simultâneas (single-flight): enquanto `funcao` roda
+    para uma chave, quem chega com a mesma chave espera e recebe o mesmo resultado (ou a
+    mesma exceção), em vez de repetir o trabalho. Terminada a execução, a chave é liberada;
+    nada fica guardado. A chave deve identificar também a versão dos dados, para que uma
+    leitura iniciada depois de uma alteração não receba o resultado de antes dela.
+    """
+
+    def __init__(self):
+        self._em_andamento: dict[Hashable, _Execucao] = {}
+        self._mutex = threading.Lock()
+
+    def executar(self, chave: Hashable, funcao: Callable[[], Any]) -> Any:
+        with self._mutex:
+            execucao = self._em_andamento.get(chave)
+            lider = execucao is None
+            if lider:
+                execucao = self._em_andamento[chave] = _Execucao()
+
+        if not lider:
+            execucao.pronta.wait()
+            if execucao.erro is not None:
+                raise execucao.erro
+            return execucao.resultado
+
+        try:
+            execucao.resultado = funcao()
+            return execucao.resultado
+        except BaseException as e:
+            execucao.erro = e
+            raise
+        finally:
+            with self._mutex:
+                del self._em_andamento[chave]
+            execucao.pronta.set()
@@ -0,0 +1,81 @@
+# app/versoes.py
+"""
+Versões dos dados servidos pelas leituras de catálogo e disponibilidade, para GET condicional.
+
+Cada serviço mantém uma VersoesDados: um contador por recurso (ex.: o catálogo de
+especialidades ou a agenda de uma especialidade), incrementado a cada alteração. O
+ETag de uma resposta sai da versão, sem montar nem serializar o corpo; se o cliente já
+tem esse ETag (If-None-Match), a resposta é 304 sem corpo.
+
+O ETag também leva um identificador da instância (um por processo), para
+que versões de antes de um reinício nunca coincidam com as novas. Disponibilidade
+também muda com o passar do tempo (horários passados saem da lista); por isso esses
+ETags levam o minuto atual.
+"""
+import json
+import threading
+import uuid
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.travas import ExecucaoUnica
+
+# Cache-Control: catálogos mudam raramente; disponibilidade pode ser guardada pelo cliente,
+# mas deve ser revalidada a cada uso (a revalidação custa uma comparação de versão)
+CACHE_CATALOGO = 'public, max-age=60'
+CACHE_DISPONIBILIDADE = 'no-cache'
+
+# Leituras idênticas simultâneas (mesma rota, mesmos filtros, mesma versão) montam e serializam
+# o corpo uma vez só; ex.: muitos usuários abrindo a mesma especialidade depois de uma campanha
+leituras = ExecucaoUnica()
+
+
+class VersoesDados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._instancia = uuid.uuid4().hex[:12]
+        self._contador = 0
+        self._versoes: dict[str, int] = {}
+
+    def tocar(self, *recursos: str):
+        """Registra que os recursos mudaram."""
+        with self._lock:
+            self._contador += 1
+            for recurso in recursos:
+                self._versoes[recurso] = self._contador
+
+    def etag(self, recurso: str, por_minuto: bool = False) -> str:
+        with self._lock:
+            etag = f"{self._instancia}-{self._versoes.get(recurso, 0)}"
+        if por_minuto:
+            etag += f"-{datetime.now().strftime('%Y%m%d%H%M')}"
+        return f'"{etag}"'
+
+
+def _coincide(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Comparação fraca (RFC 9110): ignora o prefixo W/
+    candidatos = {c.strip().removeprefix('W/') for c in if_none_match.split(',')}
+    return etag in candidatos
+
+
+def resposta_condicional(request: Request, etag: str, cache_control: str, gerar: Callable[[], Any]) -> Response:
+    """
+    304 se o cliente já tem `etag`; senão o JSON de `gerar()` com ETag e Cache-Control,
+    montado uma vez para todas as requisições idênticas que chegarem enquanto ele é montado.
+    O ETag deve ser lido antes de `gerar()`: se os dados mudarem no meio, o corpo é mais
+    novo que o ETag e a próxima requisição simplesmente recebe o corpo de novo.
+    """
+    cabecalhos = {'ETag': etag, 'Cache-Control': cache_control}
+    if _coincide(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=cabecalhos)
+    corpo = leituras.executar((request.url.path, request.url.query, etag), lambda: _serializar(gerar()))
+    return Response(content=corpo, media_type='application/json', headers=cabecalhos)
+
+
+def _serializar(dados: Any) -> bytes:
+    # Mesmo formato do JSONResponse do FastAPI
+    return json.dumps(jsonable_encoder(dados), ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
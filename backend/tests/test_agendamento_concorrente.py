@@ -0,0 +1,167 @@
+# tests/test_agendamento_concorrente.py
+"""
+Agendamentos simultâneos de consultas e exames, nos dois armazenamentos: cada horário
+disputado tem exatamente um agendamento aceito e uma linha gravada.
+
+Os pedidos de um mesmo horário vêm de pacientes diferentes e variam a grafia do nome
+('Cardiologia', 'cardiologia', ...) e do horário ('...T09:00', '...T09:00:00.000000',
+com fuso, ...): todas as formas são o mesmo horário e disputam a mesma reserva. Cada
+pedido roda numa thread, como as rotas síncronas do FastAPI.
+"""
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.schemas import AgendarExamePayload, ConsultaPayload, HorarioPostPayload, ModeloExamePayload
+from app.services.agenda_service import AgendaService
+from app.services.exames_service import ExamesService
+from app.services.horarios import para_minutos
+from app.services.pessoas_service import PessoasService
+import app.storage.arquivos as arquivos
+from app.storage.sqlite import ArmazenamentoSQLite
+
+MEDICO = 'Dr. Concorrência'
+LOCAL = 'Laboratório Concorrência'
+ESPECIALIDADES = ('Cardiologia', 'cardiologia', 'CARDIOLOGIA')
+TIPOS_EXAME = ('Ultrassom', 'ultrassom', 'ULTRASSOM')
+PEDIDOS_POR_HORARIO = 16
+
+
+def _grafias(horario: datetime) -> list[str]:
+    """Formas diferentes de escrever o mesmo horário (hora local)."""
+    return [horario.strftime('%Y-%m-%dT%H:%M'), horario.isoformat(), horario.strftime('%Y-%m-%dT%H:%M:%S.%f'),
+            horario.strftime('%Y-%m-%d %H:%M'), horario.astimezone().isoformat(),
+            horario.astimezone(timezone.utc).isoformat()]
+
+
+@pytest.fixture(params=['arquivos', 'sqlite'])
+def armazenamento(request, tmp_path, monkeypatch):
+    if request.param == 'sqlite':
+        yield ArmazenamentoSQLite(str(tmp_path / 'clinica.db'))
+        return
+    # Os caminhos de ArmazenamentoArquivos vêm de app.config; aqui apontam para tmp_path
+    for nome in ('URL_AGENDAMENTOS', 'URL_CONSULTAS', 'URL_CADASTROS', 'URL_AGENDAMENTOS_EXAMES',
+                 'URL_EXAMES_AGENDADOS', 'URL_LOG_EXAMES_AGENDADOS', 'URL_MODELOS_AGENDA'):
+        monkeypatch.setattr(arquivos, nome, str(tmp_path / getattr(arquivos, nome).rsplit('/', 1)[-1]))
+    armazenamento = arquivos.ArmazenamentoArquivos()
+    armazenamento.inicializar()
+    yield armazenamento
+    armazenamento.encerrar()
+
+
+@pytest.fixture
+def horarios() -> list[datetime]:
+    """Oito horários de amanhã, dentro do horizonte dos modelos."""
+    amanha = (datetime.now() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+    return [amanha + timedelta(minutes=30 * i) for i in range(8)]
+
+
+def _disputar(pedidos: list) -> list[bool]:
+    """Executa os pedidos (funções sem argumento) ao mesmo tempo; False para os que lançam ValueError."""
+    largada = threading.Barrier(len(pedidos))
+
+    def executar(pedido) -> bool:
+        largada.wait()
+        try:
+            return pedido()
+        except ValueError:
+            return False
+
+    with ThreadPoolExecutor(max_workers=len(pedidos)) as executor:
+        return list(executor.map(executar, pedidos))
+
+
+def _pedidos_de_consulta(pessoas: PessoasService, horarios: list[datetime]) -> list[tuple[int, object]]:
+    """(índice do horário, pedido) para PEDIDOS_POR_HORARIO pacientes por horário, embaralhados."""
+    pedidos = []
+    for h, horario in enumerate(horarios):
+        grafias = _grafias(horario)
+        for i in range(PEDIDOS_POR_HORARIO):
+            payload = ConsultaPayload(cpf_paciente=f"{h:03d}{i:08d}", especialidade=ESPECIALIDADES[i % len(ESPECIALIDADES)],
+                                      id_medico=0, doutor=MEDICO, data_hora=grafias[i % len(grafias)])
+            pedidos.append((h, lambda payload=payload: pessoas.agendar_consulta(payload)))
+    random.Random(0).shuffle(pedidos)
+    return pedidos
+
+
+def _pedidos_de_exame(exames: ExamesService, horarios: list[datetime], local: str = LOCAL,
+                      primeiro: int = 0) -> list[tuple[int, object]]:
+    pedidos = []
+    for h, horario in enumerate(horarios, start=primeiro):
+        grafias = _grafias(horario)
+        for i in range(PEDIDOS_POR_HORARIO):
+            payload = AgendarExamePayload(cpf_paciente=f"{h:03d}{i:08d}", tipo_exame=TIPOS_EXAME[i % len(TIPOS_EXAME)],
+                                          local_exame=local, data_hora=grafias[i % len(grafias)])
+            pedidos.append((h, lambda payload=payload: exames.agendar_novo_exame(payload)))
+    random.Random(0).shuffle(pedidos)
+    return pedidos
+
+
+def _aceitos_por_horario(pedidos: list[tuple[int, object]]) -> Counter:
+    resultados = _disputar([pedido for _, pedido in pedidos])
+    return Counter(h for (h, _), aceito in zip(pedidos, resultados) if aceito)
+
+
+def _gravados_por_horario(agendamentos: list[dict], campo: str, horarios: list[datetime]) -> Counter:
+    indice = {para_minutos(horario): h for h, horario in enumerate(horarios)}
+    return Counter(indice[para_minutos(a[campo])] for a in agendamentos if para_minutos(a[campo]) in indice)
+
+
+def test_consulta_um_horario_muitas_grafias(armazenamento, horarios):
+    agenda = AgendaService(armazenamento)
+    pessoas = PessoasService(armazenamento, agenda)
+    agenda.adicionar_horario(HorarioPostPayload(especialidade='Cardiologia', medico=MEDICO, horario=horarios[0].isoformat()))
+
+    aceitos = _aceitos_por_horario(_pedidos_de_consulta(pessoas, horarios[:1]) * 4)
+
+    assert aceitos == Counter({0: 1})
+    assert _gravados_por_horario(armazenamento.listar_consultas(), 'horario', horarios) == Counter({0: 1})
+
+
+def test_consultas_muitos_horarios_em_paralelo(armazenamento, horarios):
+    agenda = AgendaService(armazenamento)
+    pessoas = PessoasService(armazenamento, agenda)
+    for horario in horarios:
+        agenda.adicionar_horario(HorarioPostPayload(especialidade='Cardiologia', medico=MEDICO, horario=horario.isoformat()))
+
+    aceitos = _aceitos_por_horario(_pedidos_de_consulta(pessoas, horarios))
+
+    um_por_horario = Counter({h: 1 for h in range(len(horarios))})
+    assert aceitos == um_por_horario
+    assert _gravados_por_horario(armazenamento.listar_consultas(), 'horario', horarios) == um_por_horario
+    assert agenda.listar_por_especialidade('Cardiologia', data=horarios[0].date(), medico=MEDICO) is None
+
+
+def test_exame_um_horario_muitas_grafias(armazenamento, horarios):
+    exames = ExamesService(armazenamento)
+    exames.adicionar_horarios_em_lote(
+        [(1, {'tipo_exame': 'Ultrassom', 'local_exame': LOCAL, 'data_hora': horarios[0].isoformat()}, None)])
+
+    aceitos = _aceitos_por_horario(_pedidos_de_exame(exames, horarios[:1]) * 4)
+
+    assert aceitos == Counter({0: 1})
+    assert _gravados_por_horario(armazenamento.listar_exames_agendados(), 'data_hora', horarios) == Counter({0: 1})
+
+
+def test_exames_muitos_horarios_em_paralelo(armazenamento, horarios):
+    """Metade dos horários é avulsa (agenda de exames) e metade vem de um modelo recorrente."""
+    exames = ExamesService(armazenamento)
+    avulsos, do_modelo = horarios[:4], horarios[4:]
+    exames.adicionar_horarios_em_lote(
+        [(n, {'tipo_exame': 'Ultrassom', 'local_exame': LOCAL, 'data_hora': h.isoformat()}, None)
+         for n, h in enumerate(avulsos, start=1)])
+    exames.definir_modelo(ModeloExamePayload(
+        tipo_exame='Ultrassom', local_exame=LOCAL + ' (modelo)',
+        regras=[{'dias_semana': [do_modelo[0].weekday()], 'inicio': do_modelo[0].strftime('%H:%M'),
+                 'fim': (do_modelo[-1] + timedelta(minutes=30)).strftime('%H:%M'), 'duracao_minutos': 30}]))
+
+    pedidos = _pedidos_de_exame(exames, avulsos) + _pedidos_de_exame(exames, do_modelo, LOCAL + ' (modelo)', len(avulsos))
+    random.Random(1).shuffle(pedidos)
+    aceitos = _aceitos_por_horario(pedidos)
+
+    um_por_horario = Counter({h: 1 for h in range(len(horarios))})
+    assert aceitos == um_por_horario
+    assert _gravados_por_horario(armazenamento.listar_exames_agendados(), 'data_hora', horarios) == um_por_horario
+    assert exames.listar_horarios_exame_por_local('ultrassom', data=horarios[0].date()) is None
@@ -0,0 +1,76 @@
+# frontend/benchmark_concorrencia.py
+"""
+Vazão do bot com 1, 10 e 100 usuários simultâneos, processando updates um por vez
+(o padrão do Application), com o SimpleUpdateProcessor do python-telegram-bot
+(concurrent_updates=N, sem ordem por chat) e com ProcessadorPorChat.
+
+Cada usuário manda algumas mensagens seguidas; o handler simula a espera por LLM/API
+com asyncio.sleep (entre 0,5x e 1,5x a espera informada). Os updates são entregues ao
+processador como o Application faz (uma tarefa por update, na ordem de chegada), sem
+rede. Também confere que as mensagens de cada chat foram tratadas na ordem em que chegaram.
+
+    python benchmark_concorrencia.py [--mensagens 5] [--espera 0.05] [--simultaneos 32]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+from telegram import Chat, Message, Update, User
+from telegram.ext import SimpleUpdateProcessor
+from processamento import ProcessadorPorChat
+
+
+def _updates(usuarios: int, mensagens: int) -> list[Update]:
+    """Mensagens intercaladas entre os usuários, como chegariam do Telegram."""
+    updates, numero = [], 0
+    for m in range(mensagens):
+        for u in range(usuarios):
+            numero += 1
+            chat = Chat(id=u + 1, type=Chat.PRIVATE)
+            usuario = User(id=u + 1, first_name=f"usuario{u + 1}", is_bot=False)
+            updates.append(Update(numero, message=Message(m, datetime.now(), chat, from_user=usuario, text=str(m))))
+    return updates
+
+
+async def _handler(update: Update, espera: float, tratados: dict[int, list[int]]):
+    await asyncio.sleep(espera * random.uniform(0.5, 1.5))
+    tratados.setdefault(update.effective_chat.id, []).append(int(update.message.text))
+
+
+async def _rodar(updates: list[Update], espera: float, processador) -> tuple[float, bool]:
+    tratados: dict[int, list[int]] = {}
+    inicio = time.perf_counter()
+    if processador is None:
+        for update in updates:
+            await _handler(update, espera, tratados)
+    else:
+        await asyncio.gather(*(asyncio.create_task(processador.process_update(u, _handler(u, espera, tratados)))
+                               for u in updates))
+    duracao = time.perf_counter() - inicio
+    em_ordem = all(v == sorted(v) for v in tratados.values())
+    return duracao, em_ordem
+
+
+async def main(mensagens: int, espera: float, simultaneos: int):
+    print(f"{mensagens} mensagens por usuário, {espera * 1000:.0f} ms de espera por handler")
+    random.seed(0)
+    print(f"{'usuários':>9} {'modo':<29} {'updates':>8} {'tempo (s)':>10} {'updates/s':>10} {'ordem ok':>9}")
+    for usuarios in (1, 10, 100):
+        updates = _updates(usuarios, mensagens)
+        modos = (('um por vez', None),
+                 (f'SimpleUpdateProcessor({simultaneos})', SimpleUpdateProcessor(simultaneos)),
+                 (f'ProcessadorPorChat({simultaneos})', ProcessadorPorChat(simultaneos)))
+        for nome, processador in modos:
+            duracao, em_ordem = await _rodar(updates, espera, processador)
+            print(f"{usuarios:>9} {nome:<29} {len(updates):>8} {duracao:>10.2f} {len(updates) / duracao:>10.1f} "
+                  f"{'sim' if em_ordem else 'NÃO':>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Vazão do processamento de updates do bot.")
+    parser.add_argument('--mensagens', type=int, default=5)
+    parser.add_argument('--espera', type=float, default=0.05, help="segundos de espera simulada por handler")
+    parser.add_argument('--simultaneos', type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.mensagens, args.espera, args.simultaneos))
@@ -0,0 +1,114 @@
+# frontend/cache_api.py
+"""
+Cache, no processo do bot, das leituras da API que servem a todos os chats: catálogos
+(especialidades, tipos de exame) e horários livres por especialidade/exame.
+
+Cada (caminho, parâmetros) guarda um retrato: a resposta já convertida de JSON e o ETag
+que veio com ela. Dentro da validade, o retrato é devolvido sem ir à API. Vencido, ainda
+é devolvido na hora por mais uma validade, enquanto uma tarefa em segundo plano o
+revalida com If-None-Match (a API responde 304 se nada mudou). Depois disso, quem pede
+espera a busca. Pedidos simultâneos da mesma chave esperam a mesma busca: uma
+requisição e um retrato para todos os chats. Os retratos são compartilhados, portanto
+não devem ser alterados por quem os recebe.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+import httpx
+from cachetools import LRUCache
+
+
+@dataclass
+class Retrato:
+    dados: Any
+    etag: str | None
+    obtido_em: float  # time.monotonic()
+
+
+class CacheLeituras:
+    def __init__(self, buscar: Callable[[str, dict, str | None], Awaitable[httpx.Response]],
+                 max_entradas: int = 1000):
+        """`buscar(caminho, params, etag)` faz o GET, com If-None-Match quando há `etag`."""
+        self._buscar = buscar
+        self._retratos: LRUCache = LRUCache(maxsize=max_entradas)
+        self._em_andamento: dict[tuple, asyncio.Task] = {}
+        self.acertos = 0
+        self.vencidos_servidos = 0
+        self.buscas = 0
+        self.nao_modificados = 0
+        self.esperas_compartilhadas = 0
+
+    @staticmethod
+    def _chave(caminho: str, params: dict | None) -> tuple:
+        return (caminho, tuple(sorted((params or {}).items())))
+
+    async def obter(self, caminho: str, params: dict | None = None, validade: float = 30.0) -> Any | None:
+        """
+        Resposta do GET `caminho` (já convertida de JSON), ou None se a API não respondeu 200.
+        Lança httpx.HTTPError se a busca falhar e não houver retrato para servir.
+        """
+        chave = self._chave(caminho, params)
+        retrato = self._retratos.get(chave)
+        if retrato is not None:
+            idade = time.monotonic() - retrato.obtido_em
+            if idade < validade:
+                self.acertos += 1
+                return retrato.dados
+            if idade < 2 * validade:
+                self.vencidos_servidos += 1
+                self._buscar_uma_vez(chave, params)  # revalida em segundo plano
+                return retrato.dados
+        tarefa = self._buscar_uma_vez(chave, params)
+        # shield: se quem espera for cancelado, a busca continua para os outros
+        retrato = await asyncio.shield(tarefa)
+        return retrato.dados if retrato is not None else None
+
+    def _buscar_uma_vez(self, chave: tuple, params: dict | None) -> asyncio.Task:
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is not None:
+            self.esperas_compartilhadas += 1
+            return tarefa
+        tarefa = asyncio.create_task(self._atualizar(chave, params))
+        self._em_andamento[chave] = tarefa
+        tarefa.add_done_callback(lambda t: self._finalizar(chave, t))
+        return tarefa
+
+    def _finalizar(self, chave: tuple, tarefa: asyncio.Task):
+        if self._em_andamento.get(chave) is tarefa:
+            del self._em_andamento[chave]
+        # A revalidação em segundo plano não tem quem receba a exceção: fica ao menos no log
+        if not tarefa.cancelled() and tarefa.exception() is not None:
+            logging.warning(f"Cache da API: falha ao atualizar {chave[0]}: {tarefa.exception()!r}")
+
+    async def _atualizar(self, chave: tuple, params: dict | None) -> Retrato | None:
+        caminho = chave[0]
+        anterior = self._retratos.get(chave)
+        self.buscas += 1
+        response = await self._buscar(caminho, params or {}, anterior.etag if anterior else None)
+        if response.status_code == 304 and anterior is not None:
+            self.nao_modificados += 1
+            anterior.obtido_em = time.monotonic()
+            return anterior
+        if response.status_code != 200:
+            self._retratos.pop(chave, None)
+            return None
+        retrato = Retrato(response.json(), response.headers.get('etag'), time.monotonic())
+        # Se o caminho foi esquecido durante a busca, a resposta pode ser anterior à mudança
+        if self._em_andamento.get(chave) is asyncio.current_task():
+            self._retratos[chave] = retrato
+        return retrato
+
+    def esquecer(self, caminho: str):
+        """Descarta os retratos de `caminho` (com quaisquer parâmetros), ex.: depois de um agendamento."""
+        for chave in [c for c in self._retratos if c[0] == caminho]:
+            self._retratos.pop(chave, None)
+        for chave in [c for c in self._em_andamento if c[0] == caminho]:
+            del self._em_andamento[chave]  # quem já espera recebe a resposta, mas ela não fica no cache
+
+    def estatisticas(self) -> dict:
+        return {'retratos': len(self._retratos), 'acertos': self.acertos, 'vencidos_servidos': self.vencidos_servidos,
+                'buscas': self.buscas, 'nao_modificados': self.nao_modificados,
+                'esperas_compartilhadas': self.esperas_compartilhadas}
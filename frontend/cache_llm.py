@@ -0,0 +1,121 @@
+# frontend/cache_llm.py
+"""
+Cache das respostas do LLM.
+
+A chave é (id do prompt, entradas normalizadas): o mesmo "amanhã" com a mesma
+data_atual ou a mesma situação no prompt5 não vão de novo ao Gemini. Em
+memória é um cachetools.TLRUCache (validade por entrada + descarte do menos usado),
+limitado em bytes e em número de entradas. Com `arquivo`, as entradas também são
+gravadas num SQLite local e recarregadas na inicialização, sobrevivendo a reinícios.
+"""
+import json
+import logging
+import sqlite3
+import time
+from cachetools import TLRUCache
+
+
+def normalizar_entrada(valor) -> str:
+    """Texto com espaços colapsados; dicts/listas como JSON de chaves ordenadas.
+
+    A caixa é mantida: nomes, e-mails e siglas digitados pelo usuário fazem parte da
+    resposta extraída, então 'Maria' e 'maria' não podem compartilhar a mesma entrada.
+    """
+    if isinstance(valor, str):
+        return ' '.join(valor.split())
+    return json.dumps(valor, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class _TLRUComDescarte(TLRUCache):
+    """TLRUCache que avisa quando uma entrada sai por falta de espaço (para apagá-la também do arquivo)."""
+
+    def __init__(self, *args, ao_descartar, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ao_descartar = ao_descartar
+
+    def popitem(self):
+        chave, valor = super().popitem()
+        self._ao_descartar(chave)
+        return chave, valor
+
+
+class CacheLLM:
+    def __init__(self, ttl_segundos: float = 86400, max_bytes: int = 5_000_000, max_entradas: int = 10_000,
+                 arquivo: str | None = None):
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        # valor = (texto, expira_em); o relógio é o de parede para a validade valer também no arquivo
+        self._memoria = _TLRUComDescarte(
+            maxsize=max_bytes, ttu=lambda _chave, valor, _agora: valor[1], timer=time.time,
+            getsizeof=lambda valor: len(valor[0].encode('utf-8')), ao_descartar=self._descartado)
+        self._conexao: sqlite3.Connection | None = None
+        if arquivo:
+            self._abrir(arquivo)
+
+    def _abrir(self, arquivo: str):
+        self._conexao = sqlite3.connect(arquivo, isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS cache_llm (chave TEXT PRIMARY KEY, texto TEXT NOT NULL, expira_em REAL NOT NULL)")
+        self._conexao.execute("DELETE FROM cache_llm WHERE expira_em <= ?", (time.time(),))
+        # As que expiram por último são as mais recentes: entram por último e ficam no topo do LRU
+        for chave, texto, expira_em in self._conexao.execute(
+                "SELECT chave, texto, expira_em FROM cache_llm ORDER BY expira_em").fetchall():
+            self._guardar_na_memoria(chave, (texto, expira_em))
+        logging.info(f"Cache do LLM: {len(self._memoria)} respostas carregadas de {arquivo}.")
+
+    @staticmethod
+    def chave(prompt_id: str, entradas: tuple) -> str:
+        return json.dumps([prompt_id, *map(normalizar_entrada, entradas)], ensure_ascii=False)
+
+    def obter(self, chave: str) -> str | None:
+        valor = self._memoria.get(chave)
+        if valor is None:
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        return valor[0]
+
+    def guardar(self, chave: str, texto: str):
+        expira_em = time.time() + self.ttl_segundos
+        if not self._guardar_na_memoria(chave, (texto, expira_em)):
+            return
+        if self._conexao is not None:
+            self._conexao.execute("INSERT OR REPLACE INTO cache_llm (chave, texto, expira_em) VALUES (?, ?, ?)",
+                                  (chave, texto, expira_em))
+
+    def _guardar_na_memoria(self, chave: str, valor: tuple) -> bool:
+        try:
+            self._memoria[chave] = valor
+        except ValueError:  # maior que o cache inteiro
+            return False
+        while len(self._memoria) > self.max_entradas:
+            self._memoria.popitem()
+        return True
+
+    def esquecer(self, chave: str):
+        """Remove uma resposta (ex.: o modelo devolveu algo que não pôde ser interpretado)."""
+        self._memoria.pop(chave, None)
+        if self._conexao is not None:
+            self._conexao.execute("DELETE FROM cache_llm WHERE chave = ?", (chave,))
+
+    def _descartado(self, chave: str):
+        self.descartes += 1
+        if self._conexao is not None:
+            self._conexao.execute("DELETE FROM cache_llm WHERE chave = ?", (chave,))
+
+    def fechar(self):
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
+    def estatisticas(self) -> dict:
+        consultas = self.acertos + self.falhas
+        return {
+            'acertos': self.acertos, 'falhas': self.falhas,
+            'taxa_acerto': round(self.acertos / consultas, 3) if consultas else 0.0,
+            'entradas': len(self._memoria), 'bytes': self._memoria.currsize, 'descartes': self.descartes,
+        }
@@ -0,0 +1,78 @@
+# frontend/extracao_llm.py
+"""
+Extração de intenção + entidades em uma única chamada ao Gemini (prompt7).
+
+O modelo responde em modo JSON (response_mime_type) obedecendo a ESQUEMA_EXTRACAO,
+então não há cercas de markdown para limpar nem campos faltando: a resposta é
+sempre um objeto com intencao, cpf, data e cadastro.
+"""
+import json
+import re
+from datetime import date, datetime
+import google.generativeai as genai
+
+INTENCOES = ['informar_cpf', 'informar_data', 'informar_cadastro', 'cancelar', 'outro']
+_DIAS_SEMANA = ['segunda-feira', 'terça-feira', 'quarta-feira', 'quinta-feira', 'sexta-feira', 'sábado', 'domingo']
+
+
+def _texto_ou_nulo(descricao: str) -> dict:
+    return {'type': 'string', 'nullable': True, 'description': descricao}
+
+
+ESQUEMA_EXTRACAO = {
+    'type': 'object',
+    'properties': {
+        'intencao': {'type': 'string', 'format': 'enum', 'enum': INTENCOES},
+        'cpf': _texto_ou_nulo('11 dígitos, sem pontuação'),
+        'data': _texto_ou_nulo('DD/MM/AAAA'),
+        'cadastro': {
+            'type': 'object', 'nullable': True,
+            'properties': {
+                'nome': _texto_ou_nulo('nome completo em title case'),
+                'idade': {'type': 'integer', 'nullable': True},
+                'sexo': {'type': 'string', 'nullable': True, 'format': 'enum', 'enum': ['Masculino', 'Feminino', 'Outro']},
+                'cpf': _texto_ou_nulo('11 dígitos, sem pontuação'),
+                'telefone': _texto_ou_nulo('10 ou 11 dígitos com DDD'),
+                'email': _texto_ou_nulo('usuario@dominio'),
+            },
+            'required': ['nome', 'idade', 'sexo', 'cpf', 'telefone', 'email'],
+        },
+    },
+    'required': ['intencao', 'cpf', 'data', 'cadastro'],
+}
+
+CONFIG_EXTRACAO = genai.GenerationConfig(response_mime_type='application/json', response_schema=ESQUEMA_EXTRACAO)
+
+
+def entradas_do_prompt(texto_usuario: str, esperado: str, hoje: date) -> dict:
+    """Valores para prompt7.format(...)."""
+    return {'texto_usuario': texto_usuario, 'esperado': esperado,
+            'data_atual': hoje.strftime('%d/%m/%Y'), 'dia_semana': _DIAS_SEMANA[hoje.weekday()]}
+
+
+def _so_digitos(valor, tamanhos: tuple[int, ...]) -> str | None:
+    digitos = re.sub(r'\D', '', str(valor)) if valor is not None else ''
+    return digitos if len(digitos) in tamanhos else None
+
+
+def interpretar(resposta_json: str) -> dict:
+    """
+    Resposta do modelo já conferida: {'intencao', 'cpf', 'data' (date | None), 'cadastro' (dict | None)}.
+    Valores fora do formato viram None. Lança ValueError se a resposta não for o JSON esperado.
+    """
+    bruto = json.loads(resposta_json)
+    if not isinstance(bruto, dict):
+        raise ValueError("A extração deve ser um objeto JSON.")
+    intencao = bruto.get('intencao') if bruto.get('intencao') in INTENCOES else 'outro'
+    try:
+        data = datetime.strptime(bruto['data'], '%d/%m/%Y').date() if bruto.get('data') else None
+    except (TypeError, ValueError):
+        data = None
+    cadastro = bruto.get('cadastro')
+    if isinstance(cadastro, dict):
+        cadastro = {campo: cadastro.get(campo) for campo in ('nome', 'idade', 'sexo', 'cpf', 'telefone', 'email')}
+        cadastro['cpf'] = _so_digitos(cadastro['cpf'], (11,))
+        cadastro['telefone'] = _so_digitos(cadastro['telefone'], (10, 11))
+    else:
+        cadastro = None
+    return {'intencao': intencao, 'cpf': _so_digitos(bruto.get('cpf'), (11,)), 'data': data, 'cadastro': cadastro}
@@ -0,0 +1,167 @@
+# frontend/extracao_local.py
+"""
+Extração local (sem LLM) de CPF, datas e dados de cadastro.
+
+Os handlers tentam estas funções antes de chamar o Gemini. Cada uma devolve None
+quando não tem confiança no resultado (texto ambíguo, mais de um candidato, dado
+inválido); aí o handler recorre ao LLM como antes. As taxas de acerto ficam em
+`metricas`.
+"""
+import re
+import unicodedata
+from datetime import date, timedelta
+
+
+class MetricasExtracao:
+    """Quantas entradas de cada tipo foram resolvidas localmente e quantas foram para o LLM."""
+
+    def __init__(self):
+        self.locais: dict[str, int] = {}
+        self.llm: dict[str, int] = {}
+
+    def registrar(self, tipo: str, resolvido_localmente: bool):
+        contador = self.locais if resolvido_localmente else self.llm
+        contador[tipo] = contador.get(tipo, 0) + 1
+
+    def resumo(self) -> dict:
+        resumo = {}
+        for tipo in sorted(self.locais.keys() | self.llm.keys()):
+            locais, llm = self.locais.get(tipo, 0), self.llm.get(tipo, 0)
+            resumo[tipo] = {'locais': locais, 'llm': llm, 'taxa_local': round(locais / (locais + llm), 3)}
+        return resumo
+
+
+metricas = MetricasExtracao()
+
+
+def _normalizar(texto: str) -> str:
+    """Minúsculas e sem acentos: 'Amanhã' -> 'amanha'."""
+    sem_acentos = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return sem_acentos.lower()
+
+
+# --- CPF ---
+_RE_CPF = re.compile(r'(?<![\d.-])(\d{3})[.\s]?(\d{3})[.\s]?(\d{3})[-.\s]?(\d{2})(?![\d.-])')
+
+
+def cpf_valido(cpf: str) -> bool:
+    """Confere os dois dígitos verificadores de um CPF de 11 dígitos."""
+    if len(cpf) != 11 or not cpf.isdigit() or cpf == cpf[0] * 11:
+        return False
+    for tamanho in (9, 10):
+        soma = sum(int(d) * peso for d, peso in zip(cpf[:tamanho], range(tamanho + 1, 1, -1)))
+        if (soma * 10) % 11 % 10 != int(cpf[tamanho]):
+            return False
+    return True
+
+
+def _cpf_no_texto(texto: str) -> str | None:
+    candidatos = {''.join(m.groups()) for m in _RE_CPF.finditer(texto)}
+    validos = [cpf for cpf in candidatos if cpf_valido(cpf)]
+    return validos[0] if len(validos) == 1 else None
+
+
+def extrair_cpf(texto: str) -> str | None:
+    """Os 11 dígitos do único CPF válido no texto; None se não houver nenhum ou houver mais de um."""
+    cpf = _cpf_no_texto(texto)
+    metricas.registrar('cpf', cpf is not None)
+    return cpf
+
+
+# --- Datas ---
+_DIAS_SEMANA = ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo']
+_RE_DATA_NUMERICA = re.compile(r'(?<![\d/])(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{4}|\d{2}))?(?![\d/])')
+_RE_RELATIVA = re.compile(r'\b(depois de amanha|hoje|amanha)\b')
+_RE_DIA_SEMANA = re.compile(r'\b(' + '|'.join(_DIAS_SEMANA) + r')(?:[- ]feira)?\b')
+# Expressões que mudam o sentido ("próxima sexta", "semana que vem", "não") ficam para o LLM
+_RE_AMBIGUO = re.compile(r'\b(proxim[oa]s?|que vem|semana|mes|nao|ou|depois|antes)\b')
+
+
+def _data_no_texto(texto: str, hoje: date) -> date | None:
+    texto = _normalizar(texto)
+    datas = set()
+
+    for m in _RE_DATA_NUMERICA.finditer(texto):
+        dia, mes, ano = int(m.group(1)), int(m.group(2)), m.group(3)
+        try:
+            if ano:
+                datas.add(date(int(ano) + (2000 if len(ano) == 2 else 0), mes, dia))
+            else:
+                # Sem ano: a próxima ocorrência daquele dia/mês
+                data = date(hoje.year, mes, dia)
+                datas.add(data if data >= hoje else date(hoje.year + 1, mes, dia))
+        except ValueError:
+            return None
+    texto = _RE_DATA_NUMERICA.sub(' ', texto)
+
+    for m in _RE_RELATIVA.finditer(texto):
+        datas.add(hoje + timedelta(days={'hoje': 0, 'amanha': 1, 'depois de amanha': 2}[m.group(1)]))
+    texto = _RE_RELATIVA.sub(' ', texto)
+
+    if _RE_AMBIGUO.search(texto):
+        return None
+
+    for m in _RE_DIA_SEMANA.finditer(texto):
+        # "sexta" = a próxima sexta-feira depois de hoje
+        dias_ate = (_DIAS_SEMANA.index(m.group(1)) - hoje.weekday()) % 7 or 7
+        datas.add(hoje + timedelta(days=dias_ate))
+
+    return datas.pop() if len(datas) == 1 else None
+
+
+def extrair_data(texto: str, hoje: date | None = None) -> date | None:
+    """
+    Data pedida pelo usuário: 'hoje', 'amanhã', 'depois de amanhã', dia da semana
+    ('sexta', 'sexta-feira'), dd/mm ou dd/mm/aaaa. None se não houver exatamente
+    uma data ou se o texto tiver modificadores como 'próxima' ou 'semana que vem'.
+    """
+    data = _data_no_texto(texto, hoje or date.today())
+    metricas.registrar('data', data is not None)
+    return data
+
+
+# --- Cadastro ---
+_RE_CAMPO = re.compile(r'([A-Za-zÀ-ÿ][A-Za-zÀ-ÿ\s-]*?)\s*:\s*([^,;\n]+)')
+_RE_EMAIL = re.compile(r'^[\w.+-]+@[\w-]+(\.[\w-]+)+$')
+_CHAVES_CADASTRO = {
+    'nome': 'nome', 'nome completo': 'nome', 'idade': 'idade', 'sexo': 'sexo', 'genero': 'sexo',
+    'cpf': 'cpf', 'telefone': 'telefone', 'celular': 'telefone', 'fone': 'telefone', 'tel': 'telefone',
+    'email': 'email', 'e-mail': 'email',
+}
+_SEXOS = {
+    'm': 'Masculino', 'masc': 'Masculino', 'masculino': 'Masculino', 'homem': 'Masculino',
+    'f': 'Feminino', 'fem': 'Feminino', 'feminino': 'Feminino', 'mulher': 'Feminino',
+    'outro': 'Outro', 'outros': 'Outro',
+}
+
+
+def _cadastro_no_texto(texto: str) -> dict | None:
+    campos = {}
+    for chave, valor in _RE_CAMPO.findall(texto):
+        campo = _CHAVES_CADASTRO.get(_normalizar(chave.strip()))
+        if campo is None or campo in campos:
+            return None  # campo desconhecido ou repetido: melhor deixar para o LLM
+        campos[campo] = valor.strip()
+    if set(campos) != set(_CHAVES_CADASTRO.values()):
+        return None
+
+    nome = ' '.join(campos['nome'].split()).title()
+    idade = campos['idade'].split()[0] if campos['idade'].split() else ''
+    sexo = _SEXOS.get(_normalizar(campos['sexo']))
+    cpf = re.sub(r'\D', '', campos['cpf'])
+    telefone = re.sub(r'\D', '', campos['telefone'])
+    email = campos['email'].lower()
+    if (not nome or not idade.isdigit() or not 0 < int(idade) < 130 or sexo is None or not cpf_valido(cpf)
+            or len(telefone) not in (10, 11) or not _RE_EMAIL.match(email)):
+        return None
+    return {'nome': nome, 'idade': int(idade), 'sexo': sexo, 'cpf': cpf, 'telefone': telefone, 'email': email}
+
+
+def extrair_cadastro(texto: str) -> dict | None:
+    """
+    Dados no formato 'Nome: ..., Idade: ..., Sexo: ..., CPF: ..., Telefone: ..., Email: ...',
+    já normalizados como na saída do prompt1. None se faltar campo ou algum valor for inválido.
+    """
+    dados = _cadastro_no_texto(texto)
+    metricas.registrar('cadastro', dados is not None)
+    return dados
@@ -0,0 +1,201 @@
+# frontend/gateway_llm.py
+"""
+Ponto único de acesso ao Gemini para o bot.
+
+As chamadas são assíncronas (generate_content_async), então uma resposta lenta do
+modelo não congela o event loop para os outros usuários. Um semáforo limita quantas
+chamadas ficam em andamento ao mesmo tempo; as demais aguardam na fila. Cada chamada
+tem um prazo total (fila + resposta) e o gateway mantém contadores de fila e latência.
+Com um CacheLLM, chamadas que informam `cache=(entradas...)` são respondidas do cache
+quando o mesmo prompt já foi gerado para as mesmas entradas. `gerar_em_partes` entrega
+o texto em pedaços (stream=True), à medida que o modelo os produz.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from app.prompts.registro import estimar_tokens
+from cache_llm import CacheLLM
+
+
+class ErroLLM(Exception):
+    """Falha ao obter resposta do modelo: prazo esgotado, erro da API ou resposta vazia."""
+
+
+@dataclass
+class MetricasLLM:
+    chamadas: int = 0
+    sucessos: int = 0
+    erros: int = 0
+    prazos_esgotados: int = 0
+    na_fila: int = 0  # aguardando uma vaga no semáforo agora
+    maior_fila: int = 0
+    em_andamento: int = 0
+    espera_total: float = 0.0  # segundos aguardando vaga, somados
+    latencia_total: float = 0.0  # segundos de resposta do modelo (só sucessos), somados
+    maior_latencia: float = 0.0
+    # prompt_id -> {'chamadas', 'tokens_entrada', 'tokens_saida', 'latencia_total'} (só sucessos)
+    por_prompt: dict[str, dict] = field(default_factory=dict)
+
+    def registrar_prompt(self, prompt_id: str, tokens_entrada: int, tokens_saida: int, latencia: float):
+        uso = self.por_prompt.setdefault(
+            prompt_id, {'chamadas': 0, 'tokens_entrada': 0, 'tokens_saida': 0, 'latencia_total': 0.0})
+        uso['chamadas'] += 1
+        uso['tokens_entrada'] += tokens_entrada
+        uso['tokens_saida'] += tokens_saida
+        uso['latencia_total'] += latencia
+
+    def resumo(self) -> dict:
+        concluidas = self.sucessos + self.erros + self.prazos_esgotados
+        return {
+            'chamadas': self.chamadas, 'sucessos': self.sucessos, 'erros': self.erros,
+            'prazos_esgotados': self.prazos_esgotados, 'na_fila': self.na_fila, 'maior_fila': self.maior_fila,
+            'em_andamento': self.em_andamento,
+            'espera_media_s': round(self.espera_total / concluidas, 3) if concluidas else 0.0,
+            'latencia_media_s': round(self.latencia_total / self.sucessos, 3) if self.sucessos else 0.0,
+            'maior_latencia_s': round(self.maior_latencia, 3),
+        }
+
+
+class GatewayLLM:
+    def __init__(self, modelo, max_simultaneas: int = 4, prazo_segundos: float = 20.0, cache: CacheLLM | None = None):
+        self.modelo = modelo
+        self.prazo_segundos = prazo_segundos
+        self.cache = cache
+        self._semaforo = asyncio.BoundedSemaphore(max_simultaneas)
+        self.metricas = MetricasLLM()
+
+    async def gerar(self, prompt: str, prompt_id: str = 'livre', prazo: float | None = None,
+                    cache: tuple | None = None, **opcoes) -> str:
+        """
+        Texto gerado para `prompt`. `prazo` (segundos) vale para a espera na fila mais a
+        resposta; `opcoes` são repassadas a generate_content_async. `cache` são as entradas
+        que determinam a resposta (o que foi formatado no prompt, incluindo a data quando
+        importa); sem ele a chamada sempre vai ao modelo. Lança ErroLLM.
+        """
+        chave = CacheLLM.chave(prompt_id, cache) if self.cache is not None and cache is not None else None
+        if chave is not None:
+            texto = self.cache.obter(chave)
+            if texto is not None:
+                return texto
+
+        metricas = self.metricas
+        metricas.chamadas += 1
+        inicio = time.monotonic()
+        try:
+            async with asyncio.timeout(prazo or self.prazo_segundos):
+                metricas.na_fila += 1
+                metricas.maior_fila = max(metricas.maior_fila, metricas.na_fila)
+                try:
+                    await self._semaforo.acquire()
+                finally:
+                    metricas.na_fila -= 1
+                    metricas.espera_total += time.monotonic() - inicio
+                metricas.em_andamento += 1
+                inicio_resposta = time.monotonic()
+                try:
+                    resposta = await self.modelo.generate_content_async(prompt, **opcoes)
+                    texto = resposta.text
+                    uso = getattr(resposta, 'usage_metadata', None)
+                finally:
+                    metricas.em_andamento -= 1
+                    self._semaforo.release()
+        except TimeoutError:
+            metricas.prazos_esgotados += 1
+            logging.warning(f"LLM: prazo esgotado para '{prompt_id}' após {time.monotonic() - inicio:.1f}s.")
+            raise ErroLLM(f"Prazo esgotado para '{prompt_id}'.")
+        except Exception as e:
+            metricas.erros += 1
+            logging.error(f"LLM: erro em '{prompt_id}': {e}")
+            raise ErroLLM(str(e)) from e
+
+        self._registrar_sucesso(prompt_id, prompt, texto, uso, time.monotonic() - inicio_resposta, chave)
+        return texto
+
+    async def gerar_em_partes(self, prompt: str, prompt_id: str = 'livre', prazo: float | None = None,
+                              cache: tuple | None = None, **opcoes) -> AsyncIterator[str]:
+        """
+        Como `gerar`, mas entrega o texto em pedaços, à medida que o modelo os gera. O prazo
+        conta até o último pedaço e é conferido a cada espera pelo modelo. Uma resposta que
+        já está no cache sai num pedaço só. Lança ErroLLM, inclusive depois de alguns pedaços.
+        """
+        chave = CacheLLM.chave(prompt_id, cache) if self.cache is not None and cache is not None else None
+        if chave is not None:
+            texto = self.cache.obter(chave)
+            if texto is not None:
+                yield texto
+                return
+
+        metricas = self.metricas
+        metricas.chamadas += 1
+        inicio = time.monotonic()
+        # Prazo absoluto, aplicado só enquanto se espera o modelo: entre um pedaço e outro
+        # quem está no controle é quem consome, e um timeout ali o cancelaria
+        limite = asyncio.get_running_loop().time() + (prazo or self.prazo_segundos)
+        partes, uso = [], None
+        try:
+            metricas.na_fila += 1
+            metricas.maior_fila = max(metricas.maior_fila, metricas.na_fila)
+            try:
+                async with asyncio.timeout_at(limite):
+                    await self._semaforo.acquire()
+            finally:
+                metricas.na_fila -= 1
+                metricas.espera_total += time.monotonic() - inicio
+            metricas.em_andamento += 1
+            inicio_resposta = time.monotonic()
+            try:
+                async with asyncio.timeout_at(limite):
+                    resposta = await self.modelo.generate_content_async(prompt, stream=True, **opcoes)
+                pedacos = aiter(resposta)
+                while True:
+                    try:
+                        async with asyncio.timeout_at(limite):
+                            pedaco = await anext(pedacos)
+                    except StopAsyncIteration:
+                        break
+                    uso = getattr(pedaco, 'usage_metadata', None) or uso
+                    try:
+                        texto_pedaco = pedaco.text
+                    except ValueError:  # pedaço sem texto (ex.: só o motivo de término)
+                        continue
+                    if texto_pedaco:
+                        partes.append(texto_pedaco)
+                        yield texto_pedaco
+            finally:
+                metricas.em_andamento -= 1
+                self._semaforo.release()
+        except TimeoutError:
+            metricas.prazos_esgotados += 1
+            logging.warning(f"LLM: prazo esgotado para '{prompt_id}' após {time.monotonic() - inicio:.1f}s.")
+            raise ErroLLM(f"Prazo esgotado para '{prompt_id}'.")
+        except Exception as e:
+            metricas.erros += 1
+            logging.error(f"LLM: erro em '{prompt_id}': {e}")
+            raise ErroLLM(str(e)) from e
+
+        self._registrar_sucesso(prompt_id, prompt, ''.join(partes), uso, time.monotonic() - inicio_resposta, chave)
+
+    def _registrar_sucesso(self, prompt_id: str, prompt: str, texto: str, uso, latencia: float, chave: str | None):
+        metricas = self.metricas
+        metricas.sucessos += 1
+        metricas.latencia_total += latencia
+        metricas.maior_latencia = max(metricas.maior_latencia, latencia)
+        # Contagem do próprio Gemini quando disponível; senão, a estimativa local
+        tokens_entrada = getattr(uso, 'prompt_token_count', 0) or estimar_tokens(prompt)
+        tokens_saida = getattr(uso, 'candidates_token_count', 0) or estimar_tokens(texto)
+        metricas.registrar_prompt(prompt_id, tokens_entrada, tokens_saida, latencia)
+        logging.info(f"LLM: '{prompt_id}' respondeu em {latencia:.2f}s "
+                     f"({tokens_entrada} tokens de entrada, {tokens_saida} de saída).")
+        if chave is not None and texto:
+            self.cache.guardar(chave, texto)
+
+    def do_cache(self, prompt_id: str, cache: tuple) -> str | None:
+        """Resposta já guardada para `prompt_id` com essas entradas, sem chamar o modelo."""
+        return self.cache.obter(CacheLLM.chave(prompt_id, cache)) if self.cache is not None else None
+
+    def esquecer(self, prompt_id: str, cache: tuple):
+        """Tira do cache a resposta de `prompt_id` para essas entradas (ex.: JSON que não pôde ser lido)."""
+        if self.cache is not None:
+            self.cache.esquecer(CacheLLM.chave(prompt_id, cache))
@@ -0,0 +1,258 @@
+# frontend/persistencia.py
+"""
+Estado das conversas fora da memória do processo, para vários workers do bot.
+
+Com o bot em modo webhook rodando em mais de um processo, cada update pode cair
+em qualquer worker. O estado do ConversationHandler e o user_data ficam então num
+SQLite compartilhado (ArmazemConversas): o worker lê o estado do chat antes de tratar
+o update e grava o que mudou logo depois. Uma trava por chat, também no SQLite,
+garante que dois workers não tratem updates do mesmo chat ao mesmo tempo.
+
+Em polling (um processo só) o mesmo armazém guarda o estado entre reinícios; as
+gravações são agrupadas pelo intervalo de persistência do python-telegram-bot, que
+grava só o que mudou, uma vez por usuário e por intervalo.
+
+O armazém guarda apenas referências pequenas (CPF, especialidade, dia escolhido), nunca
+cópias da agenda, e esquece conversas paradas há mais de `ttl_segundos`.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import asynccontextmanager
+import telegram
+from telegram import Update
+from telegram.ext import Application, BasePersistence, ConversationHandler, PersistenceInput
+
+ESPERA_ENTRE_TENTATIVAS = 0.02  # segundos, ao aguardar a trava de um chat ocupado por outro worker
+INTERVALO_EXPIRACAO = 60.0  # segundos entre limpezas das conversas abandonadas
+
+
+class ArmazemConversas:
+    def __init__(self, caminho: str, ttl_segundos: float | None = None):
+        self.caminho = caminho
+        self.ttl_segundos = ttl_segundos
+        self._proxima_expiracao = 0.0
+        self._conexao = sqlite3.connect(caminho, isolation_level=None, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA busy_timeout=5000")
+        self._conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS conversas (
+                nome TEXT NOT NULL, chave TEXT NOT NULL, estado INTEGER NOT NULL, PRIMARY KEY (nome, chave));
+            CREATE TABLE IF NOT EXISTS dados_usuario (user_id INTEGER PRIMARY KEY, dados TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS travas (chat_id INTEGER PRIMARY KEY, dono TEXT NOT NULL, expira_em REAL NOT NULL);
+        """)
+        for tabela in ('conversas', 'dados_usuario'):
+            colunas = {linha[1] for linha in self._conexao.execute(f"PRAGMA table_info({tabela})")}
+            if 'atualizado_em' not in colunas:  # arquivos criados antes da expiração
+                self._conexao.execute(f"ALTER TABLE {tabela} ADD COLUMN atualizado_em REAL NOT NULL DEFAULT 0")
+        self.expirar()
+
+    def _limite_validade(self) -> float:
+        """Registros atualizados antes deste instante são de conversas abandonadas."""
+        return time.time() - self.ttl_segundos if self.ttl_segundos else float('-inf')
+
+    def expirar(self) -> int:
+        """Apaga estados e dados de usuário parados há mais de `ttl_segundos`. Devolve quantos apagou."""
+        self._proxima_expiracao = time.monotonic() + INTERVALO_EXPIRACAO
+        if not self.ttl_segundos:
+            return 0
+        limite = self._limite_validade()
+        apagados = self._conexao.execute("DELETE FROM conversas WHERE atualizado_em < ?", (limite,)).rowcount
+        apagados += self._conexao.execute("DELETE FROM dados_usuario WHERE atualizado_em < ?", (limite,)).rowcount
+        return apagados
+
+    def _expirar_se_for_hora(self):
+        if time.monotonic() >= self._proxima_expiracao:
+            self.expirar()
+
+    @staticmethod
+    def _chave(chave: tuple) -> str:
+        return json.dumps(list(chave))
+
+    def estado(self, nome: str, chave: tuple) -> int | None:
+        linha = self._conexao.execute(
+            "SELECT estado FROM conversas WHERE nome = ? AND chave = ? AND atualizado_em >= ?",
+            (nome, self._chave(chave), self._limite_validade())).fetchone()
+        return linha[0] if linha else None
+
+    def estados(self, nome: str) -> dict[tuple, int]:
+        """Todos os estados válidos de uma conversa, para carregar na inicialização."""
+        linhas = self._conexao.execute("SELECT chave, estado FROM conversas WHERE nome = ? AND atualizado_em >= ?",
+                                       (nome, self._limite_validade())).fetchall()
+        return {tuple(json.loads(chave)): estado for chave, estado in linhas}
+
+    def salvar_estado(self, nome: str, chave: tuple, estado: int | None):
+        if estado is None:
+            self._conexao.execute("DELETE FROM conversas WHERE nome = ? AND chave = ?", (nome, self._chave(chave)))
+        else:
+            self._conexao.execute("INSERT OR REPLACE INTO conversas (nome, chave, estado, atualizado_em) VALUES (?, ?, ?, ?)",
+                                  (nome, self._chave(chave), estado, time.time()))
+        self._expirar_se_for_hora()
+
+    def dados_usuario(self, user_id: int) -> dict:
+        linha = self._conexao.execute("SELECT dados FROM dados_usuario WHERE user_id = ? AND atualizado_em >= ?",
+                                      (user_id, self._limite_validade())).fetchone()
+        return json.loads(linha[0]) if linha else {}
+
+    def salvar_dados_usuario(self, user_id: int, dados: dict):
+        self._conexao.execute("INSERT OR REPLACE INTO dados_usuario (user_id, dados, atualizado_em) VALUES (?, ?, ?)",
+                              (user_id, json.dumps(dados, ensure_ascii=False, separators=(',', ':')), time.time()))
+        self._expirar_se_for_hora()
+
+    def apagar_dados_usuario(self, user_id: int):
+        self._conexao.execute("DELETE FROM dados_usuario WHERE user_id = ?", (user_id,))
+
+    def _tentar_travar(self, chat_id: int, dono: str, validade: float) -> bool:
+        agora = time.time()
+        cursor = self._conexao.execute(
+            "INSERT INTO travas (chat_id, dono, expira_em) VALUES (?, ?, ?) "
+            "ON CONFLICT (chat_id) DO UPDATE SET dono = excluded.dono, expira_em = excluded.expira_em "
+            "WHERE travas.expira_em < ?", (chat_id, dono, agora + validade, agora))
+        return cursor.rowcount == 1
+
+    @asynccontextmanager
+    async def trava_do_chat(self, chat_id: int, espera_max: float = 30.0, validade: float = 120.0):
+        """
+        Exclusividade sobre o chat entre todos os workers. A trava expira após `validade`
+        segundos (worker que morreu no meio). Lança TimeoutError após `espera_max` segundos.
+        """
+        dono = uuid.uuid4().hex
+        limite = time.monotonic() + espera_max
+        while not self._tentar_travar(chat_id, dono, validade):
+            if time.monotonic() >= limite:
+                raise TimeoutError(f"Chat {chat_id} ocupado por outro worker.")
+            await asyncio.sleep(ESPERA_ENTRE_TENTATIVAS)
+        try:
+            yield
+        finally:
+            self._conexao.execute("DELETE FROM travas WHERE chat_id = ? AND dono = ?", (chat_id, dono))
+
+    def fechar(self):
+        self._conexao.close()
+
+
+class PersistenciaConversas(BasePersistence):
+    """
+    Persistência do python-telegram-bot sobre o ArmazemConversas: só user_data e estados
+    de conversa. O user_data de um usuário é lido do armazém quando não está em memória
+    (primeiro update, ou depois de liberado por quem trata o update).
+
+    Compartilhada (webhook): nada é carregado na inicialização, o estado da conversa é relido
+    por ConversacaoCompartilhada e as gravações são feitas por quem trata o update
+    (Application.update_persistence). Senão (polling): os estados são carregados ao iniciar e
+    gravados a cada `intervalo_gravacao` segundos.
+    """
+
+    def __init__(self, armazem: ArmazemConversas, compartilhada: bool = True, intervalo_gravacao: float = 5.0):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+                         update_interval=3600 if compartilhada else intervalo_gravacao)
+        self.armazem = armazem
+        self.compartilhada = compartilhada
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {} if self.compartilhada else self.armazem.estados(name)
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        self.armazem.salvar_estado(name, key, new_state)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self.armazem.salvar_dados_usuario(user_id, data)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # Com dados em memória, eles são a versão mais nova (em polling, ainda não gravada)
+        if not user_data:
+            user_data.update(self.armazem.dados_usuario(user_id))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        # Compartilhada: Application.drop_user_data só libera a memória do worker (ver
+        # liberar_memoria); o registro continua valendo para os outros e expira pelo TTL
+        if not self.compartilhada:
+            self.armazem.apagar_dados_usuario(user_id)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        pass
+
+
+async def liberar_memoria(application: Application, update: Update):
+    """
+    Descarta da memória do worker o user_data e os estados de conversa do update, depois de
+    gravados: a próxima mensagem do chat pode cair em outro worker, que os lê do armazém.
+    Deve ser chamada com a trava do chat, logo depois de Application.update_persistence.
+    """
+    if update.effective_user is None or update.effective_chat is None:
+        return
+    application.drop_user_data(update.effective_user.id)
+    # Application.drop_user_data deixa o usuário marcado para apagar, e enquanto estiver marcado
+    # o python-telegram-bot não grava o user_data dele; a marca é consumida já aqui (na
+    # persistência compartilhada, apagar é no-op) para não perder a gravação do próximo update
+    await application.update_persistence()
+    for grupo in application.handlers.values():
+        for handler in grupo:
+            if isinstance(handler, ConversacaoCompartilhada):
+                handler.esquecer(update)
+
+
+class ConversacaoCompartilhada(ConversationHandler):
+    """
+    ConversationHandler que relê do armazém o estado da conversa antes de cada update.
+
+    O python-telegram-bot não tem API pública para trocar o estado de uma conversa em
+    memória, então esta classe usa `_conversations` e `_get_key` do ConversationHandler,
+    como na versão fixada em requirements.txt (22.x). Todo acesso a esses internos fica
+    aqui; uma versão sem eles falha já na construção, com uma mensagem clara.
+    """
+
+    def __init__(self, *args, armazem: ArmazemConversas, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not (hasattr(self, '_conversations') and hasattr(self, '_get_key')):
+            raise RuntimeError(
+                "ConversacaoCompartilhada depende de internos do ConversationHandler do python-telegram-bot "
+                f"22.x (requirements.txt); a versão instalada ({telegram.__version__}) não os tem.")
+        self.armazem = armazem
+
+    def esquecer(self, update: Update):
+        """Tira da memória o estado da conversa do update (ele continua no armazém)."""
+        self._conversations.data.pop(self._get_key(update), None)
+
+    def check_update(self, update: object):
+        if isinstance(update, Update) and update.effective_chat and update.effective_user:
+            chave = self._get_key(update)
+            estado = self.armazem.estado(self.name, chave)
+            # Sem rastrear a escrita: o estado veio do armazém, não precisa voltar para ele
+            if estado is None:
+                self._conversations.data.pop(chave, None)
+            else:
+                self._conversations.update_no_track({chave: estado})
+        return super().check_update(update)
@@ -0,0 +1,59 @@
+# frontend/processamento.py
+"""
+Processamento simultâneo de updates, mantendo a ordem dentro de cada chat.
+
+Por padrão o Application do python-telegram-bot trata um update por vez: um handler
+esperando o LLM ou a API atrasa todos os outros chats. Com ProcessadorPorChat,
+updates de chats diferentes andam em paralelo (até `max_simultaneos` handlers ao mesmo
+tempo), enquanto os de um mesmo chat continuam em fila, na ordem de chegada — o que o
+ConversationHandler precisa para as transições de estado.
+"""
+import asyncio
+import inspect
+from collections.abc import Awaitable
+from typing import Any
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ProcessadorPorChat(BaseUpdateProcessor):
+    def __init__(self, max_simultaneos: int, max_pendentes: int | None = None):
+        # O semáforo da classe base só limita quantos updates ficam pendentes em memória; o
+        # limite de handlers rodando é o nosso, tomado depois da fila do chat, para que updates
+        # parados na fila de um chat não ocupem vagas dos outros chats
+        super().__init__(max_pendentes or max_simultaneos * 32)
+        self._limite = asyncio.BoundedSemaphore(max_simultaneos)
+        self._filas: dict[Any, list] = {}  # chat -> [trava, updates usando a trava]
+
+    @staticmethod
+    def _chave(update: object) -> Any:
+        if isinstance(update, Update) and update.effective_chat is not None:
+            return update.effective_chat.id
+        return None  # updates sem chat (ex.: polls) não precisam de ordem entre si
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chave = self._chave(update)
+        if chave is None:
+            async with self._limite:
+                await coroutine
+            return
+
+        fila = self._filas.setdefault(chave, [asyncio.Lock(), 0])
+        fila[1] += 1
+        try:
+            async with fila[0], self._limite:
+                await coroutine
+        except asyncio.CancelledError:
+            if inspect.iscoroutine(coroutine):
+                coroutine.close()  # cancelado ainda na fila: evita o aviso de corrotina nunca aguardada
+            raise
+        finally:
+            fila[1] -= 1
+            if not fila[1]:
+                del self._filas[chave]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
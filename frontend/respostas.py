@@ -0,0 +1,48 @@
+# frontend/respostas.py
+"""
+Respostas padrão do bot, por situação (as mesmas do prompt5), preenchidas
+localmente com os dados adicionais: a resposta sai na hora, sem chamar o LLM.
+
+Uma variante escrita pelo LLM pode substituir o modelo. Ela é pedida com os
+marcadores no lugar dos dados ("{doutor}", "{data_hora}"), então a mesma variante
+serve para qualquer paciente e é preenchida aqui, como o modelo.
+"""
+import string
+
+MODELOS_RESPOSTA = {
+    'cadastro_sucesso': "✅ Cadastro realizado com sucesso!",
+    'cadastro_falha': "❌ Desculpe, houve um erro no cadastro. Tente novamente ou /cancelar.",
+    'cpf_encontrado': "✅ Cadastro localizado, {nome_paciente}!",
+    'cpf_nao_encontrado': "❌ CPF não encontrado. Use /start para fazer um novo cadastro.",
+    'cpf_invalido': "Não consegui identificar um CPF válido. Tente novamente.",
+    'agendamento_sucesso': "✅ Consulta agendada com sucesso para {data_hora} com {doutor}!",
+    'exame_agendado': "✅ Exame agendado com sucesso para {data_hora} em {local_exame}!",
+    'agendamento_falha': "❌ Erro ao agendar: {mensagem_erro}",
+    'sem_horarios_disponiveis': "Desculpe, não há horários para {especialidade}.",
+    'formato_data_invalido': "Não entendi a data. Por favor, tente um formato como '30/07/2025'.",
+    'sem_horarios_no_dia': "Nenhum horário livre para {data}. Tente outra data.",
+}
+_PADROES = {'nome_paciente': 'Cliente'}
+
+
+def marcadores(texto: str) -> set[str]:
+    return {nome for _, nome, _, _ in string.Formatter().parse(texto) if nome}
+
+
+def preencher(texto: str, dados: dict) -> str:
+    """Troca cada {marcador} pelo valor em `dados` (ou o padrão do marcador, ou vazio)."""
+    return texto.format_map({nome: dados.get(nome, _PADROES.get(nome, '')) for nome in marcadores(texto)})
+
+
+def resposta_padrao(situacao: str, dados: dict) -> str | None:
+    """Modelo da situação preenchido; None se a situação não tiver modelo."""
+    modelo = MODELOS_RESPOSTA.get(situacao)
+    return preencher(modelo, dados) if modelo is not None else None
+
+
+def variante_valida(situacao: str, variante: str) -> bool:
+    """A variante do LLM só é usada se tiver exatamente os marcadores do modelo e puder ser preenchida."""
+    try:
+        return marcadores(variante) == marcadores(MODELOS_RESPOSTA[situacao])
+    except (ValueError, IndexError):  # chaves soltas ou marcadores posicionais
+        return False
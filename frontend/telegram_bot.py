@@ -1,15 +1,16 @@
 # frontend/telegram_bot.py
 
 import os
+import asyncio
 import logging
 import json
 import re
-from datetime import datetime
+from datetime import date, datetime
 from collections import defaultdict
 from dotenv import load_dotenv
 
 # Importações do Telegram
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Message, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -19,15 +20,25 @@ from telegram.ext import (
     ConversationHandler,
     CallbackQueryHandler,
 )
+from telegram.request import BaseRequest
 
 # Importações da sua lógica de backend
 import sys
 backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 sys.path.insert(0, backend_path)
 
-from app.prompts.prompts_cadastro import prompt1, prompt4, prompt5, prompt6
+from app.prompts.registro import acumular_metricas, registro as prompts
 import google.generativeai as genai
-import requests
+import httpx
+from cache_api import CacheLeituras
+from cache_llm import CacheLLM
+from gateway_llm import ErroLLM, GatewayLLM
+import extracao_local
+from extracao_llm import CONFIG_EXTRACAO, entradas_do_prompt, interpretar
+from transmissao import transmitir
+from processamento import ProcessadorPorChat
+from persistencia import ArmazemConversas, ConversacaoCompartilhada, PersistenciaConversas
+from respostas import MODELOS_RESPOSTA, marcadores, preencher, resposta_padrao, variante_valida
 
 # --- CONFIGURAÇÃO INICIAL ---
 logging.basicConfig(
@@ -37,7 +48,20 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 load_dotenv(dotenv_path=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.env')))
 
-API_URL_BASE = "http://127.0.0.1:8000"
+API_URL_BASE = os.getenv("API_URL_BASE", "http://127.0.0.1:8000")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))  # segundos, por chamada
+API_TENTATIVAS = int(os.getenv("API_TENTATIVAS", "3"))
+API_ESPERA_ENTRE_TENTATIVAS = 0.2  # segundos; dobra a cada nova tentativa
+API_MAX_CONEXOES = int(os.getenv("API_MAX_CONEXOES", "50"))
+# Leituras compartilhadas entre os chats (ver cache_api.py): segundos até revalidar com a API
+API_CACHE_CATALOGOS_SEGUNDOS = float(os.getenv("API_CACHE_CATALOGOS_SEGUNDOS", "300"))
+API_CACHE_HORARIOS_SEGUNDOS = float(os.getenv("API_CACHE_HORARIOS_SEGUNDOS", "15"))
+# Handlers rodando ao mesmo tempo (chats diferentes); dentro de um chat, um update por vez
+BOT_MAX_SIMULTANEOS = int(os.getenv("BOT_MAX_SIMULTANEOS", "32"))
+# Estado das conversas (SQLite), guardado entre reinícios e, em modo webhook, entre os workers
+ESTADO_ARQUIVO = os.getenv("ESTADO_ARQUIVO") or os.path.join(os.path.dirname(__file__), 'estado_conversas.db')
+ESTADO_TTL_SEGUNDOS = float(os.getenv("ESTADO_TTL_SEGUNDOS", "86400"))  # conversas paradas há mais tempo são esquecidas
+ESTADO_INTERVALO_GRAVACAO = float(os.getenv("ESTADO_INTERVALO_GRAVACAO", "5"))  # segundos, em polling
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 API_KEY = os.getenv("API_KEY")
 
@@ -49,112 +73,256 @@ if not API_KEY:
 genai.configure(api_key=API_KEY)
 MODEL_NAME = "gemini-1.5-flash"
 model = genai.GenerativeModel(MODEL_NAME)
+# Todas as chamadas ao modelo passam pelo gateway: assíncronas, limitadas e com prazo
+LLM_MAX_SIMULTANEAS = int(os.getenv("LLM_MAX_SIMULTANEAS", "4"))
+LLM_PRAZO_SEGUNDOS = float(os.getenv("LLM_PRAZO_SEGUNDOS", "20"))
+# Respostas repetidas (mesmo prompt, mesmas entradas) saem do cache; LLM_CACHE_ARQUIVO o mantém entre reinícios
+cache_llm = CacheLLM(
+    ttl_segundos=float(os.getenv("LLM_CACHE_TTL_SEGUNDOS", "86400")),
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", "5000000")),
+    max_entradas=int(os.getenv("LLM_CACHE_MAX_ENTRADAS", "10000")),
+    arquivo=os.getenv("LLM_CACHE_ARQUIVO") or None,
+)
+# Respostas padrão saem dos modelos locais; com 1, o LLM reescreve cada modelo em segundo plano
+# e a versão dele passa a ser usada quando estiver no cache
+LLM_RESPOSTAS_ENRIQUECIDAS = os.getenv("LLM_RESPOSTAS_ENRIQUECIDAS", "0") == "1"
+# Textos gerados pelo LLM aparecem aos poucos, editando uma mensagem provisória
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+LLM_STREAMING_INTERVALO = float(os.getenv("LLM_STREAMING_INTERVALO", "1.0"))  # segundos entre edições
+RESPOSTA_INDISPONIVEL = "Desculpe, não consegui responder agora. Tente novamente ou use /start."
+# Tokens e latência por prompt, somados entre execuções (relatório: python -m app.prompts.registro)
+LLM_METRICAS_ARQUIVO = os.getenv("LLM_METRICAS_ARQUIVO") or os.path.join(os.path.dirname(__file__), 'metricas_prompts.json')
+llm = GatewayLLM(model, max_simultaneas=LLM_MAX_SIMULTANEAS, prazo_segundos=LLM_PRAZO_SEGUNDOS, cache=cache_llm)
+
+
+# --- CLIENTE HTTP DA API ---
+# Um único AsyncClient para o bot inteiro: as conexões com a API ficam abertas (keep-alive)
+# e as chamadas não bloqueiam o event loop, então os outros usuários continuam sendo atendidos.
+
+_cliente_api: httpx.AsyncClient | None = None
+
+def cliente_api() -> httpx.AsyncClient:
+    global _cliente_api
+    if _cliente_api is None or _cliente_api.is_closed:
+        _cliente_api = httpx.AsyncClient(
+            base_url=API_URL_BASE,
+            timeout=httpx.Timeout(API_TIMEOUT, connect=min(API_TIMEOUT, 3.0)),
+            limits=httpx.Limits(max_connections=API_MAX_CONEXOES, max_keepalive_connections=API_MAX_CONEXOES),
+        )
+    return _cliente_api
+
+async def fechar_cliente_api(application: Application | None = None) -> None:
+    global _cliente_api
+    if _cliente_api is not None:
+        await _cliente_api.aclose()
+        _cliente_api = None
+
+async def _encerrar(application: Application) -> None:
+    for tarefa in list(_frases_pendentes.values()):
+        tarefa.cancel()
+    await fechar_cliente_api(application)
+    logging.info(f"Cache da API: {cache_api.estatisticas()}")
+    logging.info(f"Métricas do LLM: {llm.metricas.resumo()}")
+    logging.info(f"Cache do LLM: {cache_llm.estatisticas()}")
+    if llm.metricas.por_prompt:
+        acumular_metricas(LLM_METRICAS_ARQUIVO, llm.metricas.por_prompt)
+    cache_llm.fechar()
+    logging.info(f"Extração local (sem LLM): {extracao_local.metricas.resumo()}")
+
+async def _chamar_api(metodo: str, caminho: str, **kwargs) -> httpx.Response:
+    """
+    Chama a API com o cliente compartilhado, tentando até API_TENTATIVAS vezes.
+    Falhas de conexão são repetidas em qualquer método (a requisição não chegou à API);
+    timeouts de leitura e respostas 5xx só em GET, que pode ser repetido sem efeito colateral.
+    Lança httpx.HTTPError quando as tentativas se esgotam. Aceita `timeout=` por chamada.
+    """
+    for tentativa in range(1, API_TENTATIVAS + 1):
+        ultima = tentativa == API_TENTATIVAS
+        try:
+            response = await cliente_api().request(metodo, caminho, **kwargs)
+            if response.status_code < 500 or metodo != "GET" or ultima:
+                return response
+            logging.warning(f"API respondeu {response.status_code} em {metodo} {caminho}; tentando de novo.")
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            if ultima: raise
+            logging.warning(f"Falha de conexão com a API ({e!r}); tentando de novo.")
+        except httpx.TimeoutException:
+            if metodo != "GET" or ultima: raise
+            logging.warning(f"Timeout em {metodo} {caminho}; tentando de novo.")
+        await asyncio.sleep(API_ESPERA_ENTRE_TENTATIVAS * 2 ** (tentativa - 1))
+
+async def _buscar_para_cache(caminho: str, params: dict, etag: str | None) -> httpx.Response:
+    return await _chamar_api("GET", caminho, params=params, headers={'If-None-Match': etag} if etag else None)
+
+# Catálogos e horários livres: uma busca e um retrato por chave para todos os chats
+cache_api = CacheLeituras(_buscar_para_cache)
 
 
 # --- FUNÇÕES DE LÓGICA DE NEGÓCIO (API) ---
 
-def gerar_resposta_amigavel(situacao: str, dados_adicionais: dict = None) -> str:
+# situação -> tarefa que está pedindo a variante ao LLM (uma por situação)
+_frases_pendentes: dict[str, asyncio.Task] = {}
+
+async def _frasear_com_llm(situacao: str, dados_adicionais: dict, destino: Message | None = None) -> str | None:
+    """
+    Texto do prompt5 para a situação. Com `destino` (e LLM_STREAMING), o texto já é enviado
+    como resposta a essa mensagem, aparecendo à medida que o modelo gera.
+    """
+    prompt = prompts.renderizar('prompt5', situacao=situacao, dados_adicionais=json.dumps(dados_adicionais, ensure_ascii=False))
+    cache = (situacao, dados_adicionais)
+    try:
+        if destino is not None and LLM_STREAMING:
+            partes = llm.gerar_em_partes(prompt, prompt_id='prompt5', cache=cache)
+            return (await transmitir(destino, partes, intervalo=LLM_STREAMING_INTERVALO,
+                                     texto_falha=RESPOSTA_INDISPONIVEL)).strip() or None
+        return (await llm.gerar(prompt, prompt_id='prompt5', cache=cache)).strip()
+    except ErroLLM:
+        return None
+
+def _frasear_em_segundo_plano(situacao: str, dados_adicionais: dict) -> None:
+    if situacao in _frases_pendentes:
+        return
+    tarefa = asyncio.create_task(_frasear_com_llm(situacao, dados_adicionais))
+    _frases_pendentes[situacao] = tarefa
+    tarefa.add_done_callback(lambda _: _frases_pendentes.pop(situacao, None))
+
+def _resposta_local(situacao: str, dados_adicionais: dict) -> str | None:
+    """
+    Resposta para a situação, na hora, a partir de MODELOS_RESPOSTA. Com LLM_RESPOSTAS_ENRIQUECIDAS,
+    usa a variante do LLM quando ela já está no cache; se não está, pede em segundo plano e responde
+    com o modelo. None se a situação não tem modelo.
+    """
+    texto = resposta_padrao(situacao, dados_adicionais)
+    if texto is not None and LLM_RESPOSTAS_ENRIQUECIDAS:
+        # A variante é pedida com os marcadores no lugar dos dados, para servir a qualquer usuário
+        com_marcadores = {nome: '{' + nome + '}' for nome in sorted(marcadores(MODELOS_RESPOSTA[situacao]))}
+        variante = llm.do_cache('prompt5', (situacao, com_marcadores))
+        if variante is None:
+            _frasear_em_segundo_plano(situacao, com_marcadores)
+        elif variante_valida(situacao, variante):
+            return preencher(variante, dados_adicionais)
+    return texto
+
+async def gerar_resposta_amigavel(situacao: str, dados_adicionais: dict = None) -> str | None:
+    """Resposta local da situação; só uma situação sem modelo espera pelo LLM."""
     if dados_adicionais is None: dados_adicionais = {}
-    prompt = prompt5.format(situacao=situacao, dados_adicionais=json.dumps(dados_adicionais, ensure_ascii=False))
-    return model.generate_content(prompt).text
+    return _resposta_local(situacao, dados_adicionais) or await _frasear_com_llm(situacao, dados_adicionais)
+
+async def enviar_resposta_amigavel(destino: Message, situacao: str, dados_adicionais: dict = None) -> None:
+    """Responde `destino` com a resposta da situação; texto gerado pelo LLM é transmitido aos poucos."""
+    if dados_adicionais is None: dados_adicionais = {}
+    texto = _resposta_local(situacao, dados_adicionais)
+    if texto is not None:
+        await destino.reply_text(texto)
+    elif LLM_STREAMING:
+        await _frasear_com_llm(situacao, dados_adicionais, destino)
+    else:
+        await destino.reply_text(await _frasear_com_llm(situacao, dados_adicionais) or RESPOSTA_INDISPONIVEL)
+
+async def extrair_com_llm(texto_usuario: str, esperado: str) -> dict | None:
+    """
+    Intenção, CPF, data e cadastro numa única chamada (prompt7, resposta em JSON pelo esquema).
+    `esperado` é o que o bot pediu: 'cpf', 'data' ou 'cadastro'. None se o LLM falhar.
+    """
+    entradas = entradas_do_prompt(texto_usuario, esperado, date.today())
+    # Cadastros trazem dados pessoais (nome, CPF, telefone, e-mail) e quase nunca se repetem:
+    # não entram no cache, nem na memória nem no arquivo
+    cache = None if esperado == 'cadastro' else (texto_usuario, esperado, entradas['data_atual'])
+    try:
+        resposta_json = await llm.gerar(prompts.renderizar('prompt7', **entradas), prompt_id='prompt7', cache=cache,
+                                        generation_config=CONFIG_EXTRACAO)
+        return interpretar(resposta_json)
+    except ErroLLM:
+        return None
+    except ValueError:  # inclui json.JSONDecodeError
+        logging.error(f"Extração do LLM fora do esquema: {resposta_json}")
+        if cache is not None:
+            llm.esquecer('prompt7', cache)
+        return None
 
-def processar_cadastro(texto_usuario: str) -> dict | None:
-    URL = API_URL_BASE + '/pessoas/cadastro'
-    prompt_dados = prompt1.format(entrada_usuario=texto_usuario)
-    resposta_gemini_json = model.generate_content(prompt_dados).text
+async def processar_cadastro(dados_dicionario: dict) -> dict | None:
     try:
-        string_limpa = resposta_gemini_json.strip().replace('```json', '').replace('```', '')
-        dados_dicionario = json.loads(string_limpa)
-    except json.JSONDecodeError:
-        logging.error(f"Erro de JSON retornado pela IA: {resposta_gemini_json}")
+        response = await _chamar_api("POST", "/pessoas/cadastro", json=dados_dicionario)
+    except httpx.HTTPError as e:
+        logging.error(f"Erro API processar_cadastro: {e}")
         return None
-    response = requests.post(URL, json=dados_dicionario)
     if response.status_code == 201:
         return dados_dicionario
     logging.error(f"Erro ao cadastrar na API: {response.status_code} - {response.text}")
     return None
 
-def buscar_pessoa_por_cpf(cpf: str) -> dict | None:
-    URL = f"{API_URL_BASE}/pessoas/{cpf}"
+async def buscar_pessoa_por_cpf(cpf: str) -> dict | None:
     try:
-        response = requests.get(URL)
+        response = await _chamar_api("GET", f"/pessoas/{cpf}")
         return response.json() if response.status_code == 200 else None
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logging.error(f"Erro API buscar_pessoa_por_cpf: {e}")
         return None
 
-def listar_especialidades_api() -> list[str] | None:
-    URL = f"{API_URL_BASE}/agendas/especialidades"
+async def listar_especialidades_api() -> list[str] | None:
     try:
-        response = requests.get(URL)
-        return response.json() if response.status_code == 200 else None
-    except requests.exceptions.RequestException as e:
+        return await cache_api.obter("/agendas/especialidades", validade=API_CACHE_CATALOGOS_SEGUNDOS)
+    except httpx.HTTPError as e:
         logging.error(f"Erro API listar_especialidades_api: {e}")
         return None
 
-def listar_horarios_disponiveis(especialidade: str) -> dict | None:
-    URL = f"{API_URL_BASE}/agendas/{especialidade}"
+def _filtros_horarios(data: date | None = None, limite: int | None = None) -> dict:
+    params = {}
+    if data is not None: params['data'] = data.isoformat()
+    if limite is not None: params['limit'] = limite
+    return params
+
+async def listar_horarios_disponiveis(especialidade: str, data: date | None = None, limite: int | None = None) -> dict | None:
     try:
-        response = requests.get(URL)
-        return response.json() if response.status_code == 200 else None
-    except requests.exceptions.RequestException as e:
+        return await cache_api.obter(f"/agendas/{especialidade}", _filtros_horarios(data, limite),
+                                     validade=API_CACHE_HORARIOS_SEGUNDOS)
+    except httpx.HTTPError as e:
         logging.error(f"Erro API listar_horarios_disponiveis: {e}")
         return None
 
-def agendar_consulta_api(payload: dict) -> tuple[bool, str | None]:
-    URL = f"{API_URL_BASE}/consultas"
+async def agendar_consulta_api(payload: dict) -> tuple[bool, str | None]:
     try:
-        response = requests.post(URL, json=payload)
+        response = await _chamar_api("POST", "/consultas", json=payload)
+        # Agendado ou recusado (horário já tomado), a disponibilidade em cache deixou de valer
+        cache_api.esquecer(f"/agendas/{payload['especialidade']}")
         if response.status_code == 201: return (True, None)
         return (False, response.json().get("detail", "Erro desconhecido."))
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logging.error(f"Erro API agendar_consulta_api: {e}")
         return (False, "Erro de conexão.")
 
-def buscar_consultas_agendadas_api(cpf: str) -> list[dict] | None:
-    URL = f"{API_URL_BASE}/pessoas/{cpf}/consultas_agendadas"
+async def listar_tipos_exames_api() -> list[str] | None:
     try:
-        response = requests.get(URL)
-        return response.json() if response.status_code == 200 else []
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Erro API buscar_consultas_agendadas_api: {e}")
-        return None
-
-def listar_tipos_exames_api() -> list[str] | None:
-    URL = f"{API_URL_BASE}/exames/tipos"
-    try:
-        response = requests.get(URL)
-        return response.json() if response.status_code == 200 else None
-    except requests.exceptions.RequestException as e:
+        return await cache_api.obter("/exames/tipos", validade=API_CACHE_CATALOGOS_SEGUNDOS)
+    except httpx.HTTPError as e:
         logging.error(f"Erro API listar_tipos_exames_api: {e}")
         return None
 
-def listar_horarios_exame_api(tipo_exame: str) -> dict | None:
-    URL = f"{API_URL_BASE}/exames/{tipo_exame}"
+async def listar_horarios_exame_api(tipo_exame: str, data: date | None = None, limite: int | None = None) -> dict | None:
     try:
-        response = requests.get(URL)
-        return response.json() if response.status_code == 200 else None
-    except requests.exceptions.RequestException as e:
+        return await cache_api.obter(f"/exames/{tipo_exame}", _filtros_horarios(data, limite),
+                                     validade=API_CACHE_HORARIOS_SEGUNDOS)
+    except httpx.HTTPError as e:
         logging.error(f"Erro API listar_horarios_exame_api: {e}")
         return None
 
-def agendar_exame_api(payload: dict) -> tuple[bool, str | None]:
-    URL = f"{API_URL_BASE}/exames/agendar"
+async def agendar_exame_api(payload: dict) -> tuple[bool, str | None]:
     try:
-        response = requests.post(URL, json=payload)
+        response = await _chamar_api("POST", "/exames/agendar", json=payload)
+        cache_api.esquecer(f"/exames/{payload['tipo_exame']}")
         if response.status_code == 201: return (True, None)
         return (False, response.json().get("detail", "Erro desconhecido."))
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logging.error(f"Erro API agendar_exame_api: {e}")
         return (False, "Erro de conexão.")
 
-def buscar_exames_agendados_api(cpf: str) -> list[dict] | None:
-    URL = f"{API_URL_BASE}/exames/{cpf}/exames_agendados"
+async def buscar_resumo_api(cpf: str) -> dict | None:
+    """Cadastro, próximas consultas e próximos exames do CPF, numa só chamada; None se não cadastrado."""
     try:
-        response = requests.get(URL)
-        return response.json() if response.status_code == 200 else []
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Erro API buscar_exames_agendados_api: {e}")
+        response = await _chamar_api("GET", f"/pessoas/{cpf}/resumo")
+        return response.json() if response.status_code == 200 else None
+    except httpx.HTTPError as e:
+        logging.error(f"Erro API buscar_resumo_api: {e}")
         return None
 
 # --- ESTADOS DA CONVERSA ---
@@ -203,7 +371,7 @@ async def handle_main_menu_decision(update: Update, context: ContextTypes.DEFAUL
     if choice in ["agendar_consulta", "agendar_exame"]:
         context.user_data['flow'] = choice
         if context.user_data.get('cpf'):
-            pessoa = buscar_pessoa_por_cpf(context.user_data['cpf'])
+            pessoa = await buscar_pessoa_por_cpf(context.user_data['cpf'])
             nome_pessoa = pessoa.get('nome', 'Cliente') if pessoa else 'Cliente'
             await query.message.reply_text(f"Olá novamente, {nome_pessoa}! Vamos prosseguir com o agendamento.")
             if choice == "agendar_consulta": return await ask_specialty(update, context, query)
@@ -252,50 +420,57 @@ async def handle_registration_decision(update: Update, context: ContextTypes.DEF
         return AWAITING_CPF
 
 async def handle_details(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    dados_cadastrados = processar_cadastro(update.message.text)
+    texto_usuario = update.message.text
+    # Texto no formato "Nome: ..., Idade: ..." é lido localmente; o resto vai para o LLM
+    dados = extracao_local.extrair_cadastro(texto_usuario)
+    if dados is None:
+        extracao = await extrair_com_llm(texto_usuario, 'cadastro')
+        if extracao and extracao['intencao'] == 'cancelar':
+            return await cancel(update, context)
+        dados = extracao['cadastro'] if extracao else None
+    dados_cadastrados = await processar_cadastro(dados) if dados else None
     if dados_cadastrados:
         context.user_data['cpf'] = dados_cadastrados.get('cpf')
-        await update.message.reply_text("✅ Cadastro realizado com sucesso!")
+        await enviar_resposta_amigavel(update.message, 'cadastro_sucesso')
         if context.user_data.get('flow') == 'agendar_consulta':
             return await ask_specialty(update, context)
         else:
             return await ask_exam_type(update, context)
     else:
-        await update.message.reply_text("❌ Desculpe, houve um erro no cadastro. Tente novamente ou /cancelar.")
+        await enviar_resposta_amigavel(update.message, 'cadastro_falha')
         return AWAITING_DETAILS
 
 async def handle_cpf(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     texto_usuario = update.message.text
-    prompt = prompt4.format(texto_usuario=texto_usuario)
-    resposta_json_str = model.generate_content(prompt).text
-    try:
-        cpf_extraido = json.loads(resposta_json_str).get("cpf")
-    except json.JSONDecodeError:
-        cpf_extraido = None
+    cpf_extraido = extracao_local.extrair_cpf(texto_usuario)
+    if not cpf_extraido:
+        extracao = await extrair_com_llm(texto_usuario, 'cpf')
+        if extracao and extracao['intencao'] == 'cancelar':
+            return await cancel(update, context)
+        cpf_extraido = extracao['cpf'] if extracao else None
     if not cpf_extraido:
-        await update.message.reply_text("Não consegui identificar um CPF válido. Tente novamente.")
+        await enviar_resposta_amigavel(update.message, 'cpf_invalido')
         return AWAITING_CPF
-    pessoa_encontrada = buscar_pessoa_por_cpf(cpf_extraido)
+    pessoa_encontrada = await buscar_pessoa_por_cpf(cpf_extraido)
     if pessoa_encontrada:
         context.user_data['cpf'] = pessoa_encontrada.get('cpf')
         nome_pessoa = pessoa_encontrada.get('nome', 'Cliente')
-        await update.message.reply_text(f"✅ Cadastro localizado, {nome_pessoa}!")
+        await enviar_resposta_amigavel(update.message, 'cpf_encontrado', {'nome_paciente': nome_pessoa})
         if context.user_data.get('flow') == 'agendar_consulta':
             return await ask_specialty(update, context)
         else:
             return await ask_exam_type(update, context)
     else:
-        await update.message.reply_text("❌ CPF não encontrado. Use /start para fazer um novo cadastro.")
+        await enviar_resposta_amigavel(update.message, 'cpf_nao_encontrado')
         return ConversationHandler.END
 
 async def _show_appointments(update: Update, context: ContextTypes.DEFAULT_TYPE, cpf: str) -> int:
     message_sender = update.message or update.callback_query.message
-    pessoa = buscar_pessoa_por_cpf(cpf)
+    # Cadastro e próximos agendamentos, já ordenados por data, numa só chamada à API
+    resumo = await buscar_resumo_api(cpf) or {}
+    pessoa, consultas, exames = resumo.get('pessoa'), resumo.get('consultas'), resumo.get('exames')
     nome_paciente = pessoa.get('nome', 'Cliente') if pessoa else 'Cliente'
     
-    consultas = buscar_consultas_agendadas_api(cpf)
-    exames = buscar_exames_agendados_api(cpf)
-    
     message = f"Olá, {nome_paciente}! Aqui estão seus agendamentos:\n"
     has_appointments = False
     
@@ -329,7 +504,7 @@ async def handle_cpf_for_appointments(update: Update, context: ContextTypes.DEFA
 
 async def ask_specialty(update: Update, context: ContextTypes.DEFAULT_TYPE, query=None) -> int:
     message_text = "Para qual especialidade você gostaria de agendar?"
-    especialidades = listar_especialidades_api()
+    especialidades = await listar_especialidades_api()
     if not especialidades:
         await (query.message if query else update.message).reply_text("Desculpe, não consegui carregar as especialidades.")
         return ConversationHandler.END
@@ -344,24 +519,23 @@ async def handle_specialty_selection(update: Update, context: ContextTypes.DEFAU
     especialidade = query.data
     context.user_data['especialidade'] = especialidade
     await query.edit_message_text(text=f"{query.message.text}\n\nEspecialidade: {especialidade}", reply_markup=None)
-    horarios_por_medico = listar_horarios_disponiveis(especialidade)
-    if not horarios_por_medico:
-        await query.message.reply_text(f"Desculpe, não há horários para {especialidade}.")
+    # Só verifica se há algum horário livre; os horários do dia escolhido são buscados depois
+    if not await listar_horarios_disponiveis(especialidade, limite=1):
+        await enviar_resposta_amigavel(query.message, 'sem_horarios_disponiveis', {'especialidade': especialidade})
         return await _send_main_menu(update, context)
-    context.user_data['agenda_completa'] = horarios_por_medico
     await query.message.reply_text("Para qual dia você gostaria de agendar? (ex: amanhã, 30/07/2025)")
     return AWAITING_DAY_INPUT
 
 async def handle_day_input(update: Update, context: ContextTypes.DEFAULT_TYPE, flow_key: str) -> int:
     texto_usuario = update.message.text
-    data_atual = datetime.now().strftime("%d/%m/%Y")
-    prompt = prompt6.format(texto_usuario=texto_usuario, data_atual=data_atual)
-    resposta_json_str = model.generate_content(prompt).text
-    try:
-        data_extraida_str = json.loads(resposta_json_str).get("data")
-        data_selecionada = datetime.strptime(data_extraida_str, "%d/%m/%Y").date()
-    except (json.JSONDecodeError, ValueError, TypeError):
-        await update.message.reply_text("Não entendi a data. Por favor, tente um formato como '30/07/2025'.")
+    data_selecionada = extracao_local.extrair_data(texto_usuario)
+    if data_selecionada is None:
+        extracao = await extrair_com_llm(texto_usuario, 'data')
+        if extracao and extracao['intencao'] == 'cancelar':
+            return await cancel(update, context)
+        data_selecionada = extracao['data'] if extracao else None
+    if data_selecionada is None:
+        await enviar_resposta_amigavel(update.message, 'formato_data_invalido')
         return AWAITING_DAY_INPUT if flow_key == 'consulta' else AWAITING_EXAM_DAY
     
     if data_selecionada < datetime.now().date():
@@ -370,78 +544,71 @@ async def handle_day_input(update: Update, context: ContextTypes.DEFAULT_TYPE, f
 
     await update.message.reply_text(f"Verificando horários para {data_selecionada.strftime('%d/%m/%Y')}...")
     
-    keyboard = []
-    context.user_data['callback_map'] = {}
-    map_counter = 0
-
+    # A API devolve apenas os horários livres do dia escolhido
     if flow_key == 'consulta':
-        agenda_completa = context.user_data.get('agenda_completa', {})
-        medico_id_map = {nome: i + 1 for i, nome in enumerate(agenda_completa.keys())}
-        for medico_nome, horarios_lista in agenda_completa.items():
-            for horario_str in horarios_lista:
-                if datetime.fromisoformat(horario_str).date() == data_selecionada:
-                    unique_id = str(map_counter)
-                    context.user_data['callback_map'][unique_id] = {
-                        'id_medico': medico_id_map[medico_nome],
-                        'medico_nome': medico_nome,
-                        'data_hora': horario_str
-                    }
-                    hora = datetime.fromisoformat(horario_str).time()
-                    texto_botao = f"{hora.strftime('%H:%M')} - {medico_nome}"
-                    keyboard.append([InlineKeyboardButton(texto_botao, callback_data=f"consulta_{unique_id}")])
-                    map_counter += 1
+        agenda_do_dia = await listar_horarios_disponiveis(context.user_data.get('especialidade'), data=data_selecionada) or {}
     else: # flow_key == 'exame'
-        agenda_completa = context.user_data.get('agenda_exame_completa', {})
-        for local, horarios_lista in agenda_completa.items():
-            for horario_str in horarios_lista:
-                if datetime.fromisoformat(horario_str).date() == data_selecionada:
-                    unique_id = str(map_counter)
-                    context.user_data['callback_map'][unique_id] = {
-                        'local_exame': local,
-                        'data_hora': horario_str
-                    }
-                    hora = datetime.fromisoformat(horario_str).time()
-                    texto_botao = f"{hora.strftime('%H:%M')} - {local}"
-                    keyboard.append([InlineKeyboardButton(texto_botao, callback_data=f"exame_{unique_id}")])
-                    map_counter += 1
+        agenda_do_dia = await listar_horarios_exame_api(context.user_data.get('tipo_exame'), data=data_selecionada) or {}
+
+    # O horário vai no próprio botão (índice do médico/local + hora); na conversa ficam só o dia
+    # e os nomes dos médicos/locais, não a lista de horários
+    context.user_data['dia'] = data_selecionada.isoformat()
+    context.user_data['opcoes_do_dia'] = list(agenda_do_dia.keys())
+    keyboard = []
+    for indice, (nome, horarios_lista) in enumerate(agenda_do_dia.items()):
+        for horario_str in horarios_lista:
+            hora = datetime.fromisoformat(horario_str).time()
+            texto_botao = f"{hora.strftime('%H:%M')} - {nome}"
+            keyboard.append([InlineKeyboardButton(texto_botao, callback_data=f"{flow_key}_{indice}_{hora.strftime('%H%M')}")])
 
     if not keyboard:
-        await update.message.reply_text(f"Nenhum horário livre para {data_selecionada.strftime('%d/%m/%Y')}. Tente outra data.")
+        await enviar_resposta_amigavel(update.message, 'sem_horarios_no_dia', {'data': data_selecionada.strftime('%d/%m/%Y')})
         return AWAITING_DAY_INPUT if flow_key == 'consulta' else AWAITING_EXAM_DAY
         
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text("Escolha um dos horários:", reply_markup=reply_markup)
     return SELECTING_TIME if flow_key == 'consulta' else SELECTING_EXAM_TIME
 
+def _horario_do_botao(callback_data: str, flow_key: str, user_data: dict) -> tuple[int, str, datetime] | None:
+    """(índice, médico ou local, data e hora) do botão "<flow_key>_<índice>_<HHMM>" montado em handle_day_input."""
+    try:
+        prefixo, indice, hora = callback_data.split('_')
+        indice = int(indice)
+        dia = date.fromisoformat(user_data['dia'])
+        nome = user_data['opcoes_do_dia'][indice]
+        data_hora = datetime.combine(dia, datetime.strptime(hora, '%H%M').time())
+    except (ValueError, KeyError, IndexError):
+        return None
+    return (indice, nome, data_hora) if prefixo == flow_key else None
+
 async def select_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     
-    unique_id = query.data.replace("consulta_", "")
-    horario_data = context.user_data.get('callback_map', {}).get(unique_id)
+    horario_data = _horario_do_botao(query.data, 'consulta', context.user_data)
 
     if not horario_data:
         await query.message.reply_text("❌ Ops! O horário selecionado não foi encontrado. Tente novamente com /start.")
         return ConversationHandler.END
 
-    id_medico = horario_data['id_medico']
-    medico_nome = horario_data['medico_nome']
-    data_hora = horario_data['data_hora']
+    indice, medico_nome, data_hora = horario_data
+    id_medico = indice + 1
+    data_hora = data_hora.isoformat()
     hora_formatada = datetime.fromisoformat(data_hora).strftime('%d/%m/%Y às %H:%M')
     
     await query.edit_message_text(text=f"{query.message.text}\n\nHorário: {hora_formatada.split(' às ')[1]} com {medico_nome}", reply_markup=None)
     
     payload = {"cpf_paciente": context.user_data['cpf'], "especialidade": context.user_data['especialidade'], "id_medico": int(id_medico), "doutor": medico_nome, "data_hora": data_hora}
-    sucesso, msg_erro = agendar_consulta_api(payload)
+    sucesso, msg_erro = await agendar_consulta_api(payload)
     
-    if sucesso: await query.message.reply_text(f"✅ Consulta agendada com sucesso para {hora_formatada} com {medico_nome}!")
-    else: await query.message.reply_text(f"❌ Erro ao agendar: {msg_erro}")
+    if sucesso: await enviar_resposta_amigavel(query.message, 'agendamento_sucesso', {'data_hora': hora_formatada, 'doutor': medico_nome})
+    else: await enviar_resposta_amigavel(query.message, 'agendamento_falha', {'mensagem_erro': msg_erro})
         
     await _send_main_menu(update, context)
     return MAIN_MENU
 
 async def ask_exam_type(update: Update, context: ContextTypes.DEFAULT_TYPE, query=None) -> int:
-    tipos_exames = listar_tipos_exames_api()
+    tipos_exames = await listar_tipos_exames_api()
     if not tipos_exames:
         await (query.message if query else update.message).reply_text("Desculpe, não há tipos de exames disponíveis.")
         return await _send_main_menu(update, context)
@@ -456,11 +623,9 @@ async def handle_exam_type_selection(update: Update, context: ContextTypes.DEFAU
     tipo_exame = query.data
     context.user_data['tipo_exame'] = tipo_exame
     await query.edit_message_text(text=f"{query.message.text}\n\nExame: {tipo_exame}", reply_markup=None)
-    horarios_por_local = listar_horarios_exame_api(tipo_exame)
-    if not horarios_por_local:
-        await query.message.reply_text(f"Desculpe, não há horários para {tipo_exame}.")
+    if not await listar_horarios_exame_api(tipo_exame, limite=1):
+        await enviar_resposta_amigavel(query.message, 'sem_horarios_disponiveis', {'especialidade': tipo_exame})
         return await _send_main_menu(update, context)
-    context.user_data['agenda_exame_completa'] = horarios_por_local
     await query.message.reply_text("Para qual dia você gostaria de agendar? (ex: amanhã, 01/08/2025)")
     return AWAITING_EXAM_DAY
 
@@ -471,22 +636,22 @@ async def select_exam_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     query = update.callback_query
     await query.answer()
     
-    unique_id = query.data.replace("exame_", "")
-    horario_data = context.user_data.get('callback_map', {}).get(unique_id)
+    horario_data = _horario_do_botao(query.data, 'exame', context.user_data)
 
     if not horario_data:
         await query.message.reply_text("❌ Ops! O horário selecionado não foi encontrado. Tente novamente com /start.")
         return ConversationHandler.END
 
-    local_exame = horario_data['local_exame']
-    data_hora_str = horario_data['data_hora']
-    data_hora = datetime.fromisoformat(data_hora_str)
-    
+    _, local_exame, data_hora = horario_data
+    hora_formatada = data_hora.strftime('%d/%m/%Y às %H:%M')
+
+    await query.edit_message_text(text=f"{query.message.text}\n\nHorário: {hora_formatada.split(' às ')[1]} em {local_exame}", reply_markup=None)
+
     payload = {"cpf_paciente": context.user_data['cpf'], "tipo_exame": context.user_data['tipo_exame'], "local_exame": local_exame, "data_hora": data_hora.isoformat()}
-    sucesso, msg_erro = agendar_exame_api(payload)
+    sucesso, msg_erro = await agendar_exame_api(payload)
     
-    if sucesso: await query.edit_message_text(f"✅ Exame agendado com sucesso para {data_hora.strftime('%d/%m/%Y às %H:%M')} em {local_exame}!")
-    else: await query.edit_message_text(f"❌ Erro ao agendar: {msg_erro}")
+    if sucesso: await enviar_resposta_amigavel(query.message, 'exame_agendado', {'data_hora': hora_formatada, 'local_exame': local_exame})
+    else: await enviar_resposta_amigavel(query.message, 'agendamento_falha', {'mensagem_erro': msg_erro})
 
     await _send_main_menu(update, context)
     return MAIN_MENU
@@ -495,29 +660,61 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.message.reply_text("Tudo bem, processo cancelado. Se precisar de algo, é só chamar com /start.")
     return ConversationHandler.END
 
-def main() -> None:
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
-    
-    conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
-        states={
-            MAIN_MENU: [CallbackQueryHandler(handle_main_menu_decision)],
-            ASKED_REGISTRATION: [CallbackQueryHandler(handle_registration_decision)],
-            AWAITING_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_details)],
-            AWAITING_CPF: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_cpf)],
-            AWAITING_SPECIALTY: [CallbackQueryHandler(handle_specialty_selection)],
-            AWAITING_DAY_INPUT: [MessageHandler(filters.TEXT & ~filters.COMMAND, lambda u, c: handle_day_input(u, c, 'consulta'))],
-            SELECTING_TIME: [CallbackQueryHandler(select_time)],
-            AWAITING_CPF_FOR_APPOINTMENTS: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_cpf_for_appointments)],
-            AWAITING_EXAM_TYPE: [CallbackQueryHandler(handle_exam_type_selection)],
-            AWAITING_EXAM_DAY: [MessageHandler(filters.TEXT & ~filters.COMMAND, lambda u, c: handle_day_input(u, c, 'exame'))],
-            SELECTING_EXAM_TIME: [CallbackQueryHandler(select_exam_time)],
-        },
-        fallbacks=[CommandHandler("cancelar", cancel)],
-    )
+def construir_aplicacao(armazem: ArmazemConversas | None = None, requisicao: BaseRequest | None = None,
+                        compartilhado: bool = True) -> Application:
+    """
+    Application com os handlers do bot. Sem `armazem`, o estado das conversas fica só em
+    memória. Com ele e `compartilhado` (webhook), o estado é lido e gravado no armazém a cada
+    update, pelos vários workers; sem `compartilhado` (polling), é carregado ao iniciar e
+    gravado a cada ESTADO_INTERVALO_GRAVACAO segundos.
+    `requisicao` substitui o cliente HTTP do Telegram (ex.: um Telegram local em testes).
+    """
+    compartilhado = armazem is not None and compartilhado
+    builder = Application.builder().token(TELEGRAM_TOKEN).post_shutdown(_encerrar)
+    if requisicao is not None:
+        builder = builder.request(requisicao)
+    if compartilhado:
+        # O servidor web entrega os updates (um worker por requisição); não há Updater
+        builder = builder.updater(None)
+    else:
+        builder = builder.concurrent_updates(ProcessadorPorChat(BOT_MAX_SIMULTANEOS))
+    if armazem is not None:
+        builder = builder.persistence(PersistenciaConversas(armazem, compartilhada=compartilhado,
+                                                            intervalo_gravacao=ESTADO_INTERVALO_GRAVACAO))
+    application = builder.build()
+
+    estados = {
+        MAIN_MENU: [CallbackQueryHandler(handle_main_menu_decision)],
+        ASKED_REGISTRATION: [CallbackQueryHandler(handle_registration_decision)],
+        AWAITING_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_details)],
+        AWAITING_CPF: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_cpf)],
+        AWAITING_SPECIALTY: [CallbackQueryHandler(handle_specialty_selection)],
+        AWAITING_DAY_INPUT: [MessageHandler(filters.TEXT & ~filters.COMMAND, lambda u, c: handle_day_input(u, c, 'consulta'))],
+        SELECTING_TIME: [CallbackQueryHandler(select_time)],
+        AWAITING_CPF_FOR_APPOINTMENTS: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_cpf_for_appointments)],
+        AWAITING_EXAM_TYPE: [CallbackQueryHandler(handle_exam_type_selection)],
+        AWAITING_EXAM_DAY: [MessageHandler(filters.TEXT & ~filters.COMMAND, lambda u, c: handle_day_input(u, c, 'exame'))],
+        SELECTING_EXAM_TIME: [CallbackQueryHandler(select_exam_time)],
+    }
+    entrada, saida = [CommandHandler("start", start)], [CommandHandler("cancelar", cancel)]
+    if armazem is None:
+        conv_handler = ConversationHandler(entry_points=entrada, states=estados, fallbacks=saida)
+    elif not compartilhado:
+        conv_handler = ConversationHandler(entry_points=entrada, states=estados, fallbacks=saida,
+                                           name="agendamento", persistent=True)
+    else:
+        conv_handler = ConversacaoCompartilhada(entry_points=entrada, states=estados, fallbacks=saida,
+                                                name="agendamento", persistent=True, armazem=armazem)
 
     application.add_handler(conv_handler)
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    return application
+
+def main() -> None:
+    armazem = ArmazemConversas(ESTADO_ARQUIVO, ttl_segundos=ESTADO_TTL_SEGUNDOS)
+    try:
+        construir_aplicacao(armazem, compartilhado=False).run_polling(allowed_updates=Update.ALL_TYPES)
+    finally:
+        armazem.fechar()
 
 if __name__ == "__main__":
     main()
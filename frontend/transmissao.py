@@ -0,0 +1,63 @@
+# frontend/transmissao.py
+"""
+Exibição progressiva de um texto gerado aos poucos.
+
+O bot responde com uma mensagem provisória e vai editando-a com o texto acumulado,
+no máximo uma edição a cada `intervalo` segundos: o Telegram limita edições por
+chat, e cada pedaço do modelo costuma ter só algumas palavras.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+
+LIMITE_MENSAGEM = 4096  # caracteres por mensagem no Telegram
+
+
+async def _editar(mensagem: Message, texto: str) -> bool:
+    """Edita a mensagem; espera e tenta de novo uma vez se o Telegram pedir. False se não editou."""
+    texto = texto[:LIMITE_MENSAGEM]
+    for tentativa in range(2):
+        try:
+            await mensagem.edit_text(texto)
+            return True
+        except RetryAfter as e:
+            if tentativa:
+                break
+            await asyncio.sleep(e.retry_after if isinstance(e.retry_after, (int, float)) else e.retry_after.total_seconds())
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                logging.warning(f"Não foi possível editar a mensagem: {e}")
+            break
+    return False
+
+
+async def transmitir(destino: Message, partes: AsyncIterator[str], intervalo: float = 1.0,
+                     provisorio: str = "✍️ ...", texto_falha: str | None = None) -> str:
+    """
+    Responde `destino` com `provisorio` e edita essa resposta com o texto de `partes`
+    conforme ele chega. Devolve o texto completo. Se nada chegar, a mensagem fica com
+    `texto_falha`; se `partes` falhar no meio, fica com o que já chegou e a exceção é relançada.
+    """
+    mensagem = await destino.reply_text(provisorio)
+    texto, exibido, ultima_edicao = '', provisorio, 0.0
+    try:
+        async with aclosing(partes):
+            async for parte in partes:
+                texto += parte
+                if time.monotonic() - ultima_edicao >= intervalo:
+                    if await _editar(mensagem, texto):
+                        exibido = texto
+                    ultima_edicao = time.monotonic()
+    except Exception:
+        final = texto or texto_falha
+        if final and final != exibido:
+            await _editar(mensagem, final)
+        raise
+    final = texto or texto_falha
+    if final and final != exibido:
+        await _editar(mensagem, final)
+    return texto
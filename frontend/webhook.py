@@ -0,0 +1,91 @@
+# frontend/webhook.py
+"""
+Bot em modo webhook: uma aplicação ASGI que recebe os updates do Telegram por HTTP.
+
+Vários processos podem servir a mesma aplicação (ex.: `uvicorn webhook:app --workers 4`,
+dentro de frontend/): cada requisição cai em um worker, que trata o update com o estado
+da conversa lido do armazém compartilhado (ESTADO_ARQUIVO) e grava o novo estado antes
+de responder. Uma trava por chat no armazém mantém os updates de um mesmo chat em série
+entre os workers; se ela não vier a tempo, o worker responde 503 e o Telegram reenvia.
+
+Variáveis de ambiente, além das do bot:
+    WEBHOOK_URL      URL pública do webhook; se definida, é registrada no Telegram ao iniciar.
+    WEBHOOK_SEGREDO  Segredo conferido no cabeçalho X-Telegram-Bot-Api-Secret-Token.
+    ESTADO_ARQUIVO, ESTADO_TTL_SEGUNDOS  Estado das conversas (ver telegram_bot.py).
+
+Também pode ser montada ao lado da API (`app.mount('/telegram', criar_app_webhook(...))`);
+nesse caso, como o Starlette não repassa o lifespan a aplicações montadas, a API deve
+chamar `iniciar_bot` e `encerrar_bot` no seu próprio lifespan.
+"""
+import logging
+import os
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+from persistencia import ArmazemConversas, liberar_memoria
+import telegram_bot
+
+CABECALHO_SEGREDO = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+async def iniciar_bot(application: Application, url: str | None = None, segredo: str | None = None):
+    await application.initialize()
+    await application.start()
+    if url:
+        await application.bot.set_webhook(url, secret_token=segredo, allowed_updates=Update.ALL_TYPES)
+
+
+async def encerrar_bot(application: Application):
+    await application.stop()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def criar_app_webhook(application: Application, armazem: ArmazemConversas, url: str | None = None,
+                      segredo: str | None = None) -> Starlette:
+    async def receber(request: Request) -> Response:
+        if segredo and request.headers.get(CABECALHO_SEGREDO) != segredo:
+            return Response(status_code=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except ValueError:
+            return Response(status_code=400)
+        chat = update.effective_chat
+        try:
+            if chat is None:
+                await application.process_update(update)
+            else:
+                async with armazem.trava_do_chat(chat.id):
+                    await application.process_update(update)
+                    # Grava o estado antes de soltar a trava: o próximo update do chat pode ir para outro worker
+                    await application.update_persistence()
+                    await liberar_memoria(application, update)
+        except TimeoutError:
+            logging.warning(f"Chat {chat.id} ocupado; update {update.update_id} devolvido para reenvio.")
+            return Response(status_code=503)
+        return Response()
+
+    @asynccontextmanager
+    async def ciclo_de_vida(_app):
+        await iniciar_bot(application, url, segredo)
+        try:
+            yield
+        finally:
+            await encerrar_bot(application)
+            armazem.fechar()
+
+    return Starlette(routes=[Route('/', receber, methods=['POST'])], lifespan=ciclo_de_vida)
+
+
+def _app_padrao() -> Starlette:
+    armazem = ArmazemConversas(telegram_bot.ESTADO_ARQUIVO, ttl_segundos=telegram_bot.ESTADO_TTL_SEGUNDOS)
+    return criar_app_webhook(telegram_bot.construir_aplicacao(armazem), armazem,
+                             url=os.getenv("WEBHOOK_URL") or None, segredo=os.getenv("WEBHOOK_SEGREDO") or None)
+
+
+app = _app_padrao()